@@ -0,0 +1,128 @@
+# accounts.py
+# Multi-conta: várias contas Bitrix, cada uma com perfil Firefox, saída e
+# calendário próprios. Scrape em pool de processos (um Firefox por worker)
+# e sync reaproveitando um client do Google por credencial.
+#
+# accounts.json:
+# [
+#   {"name": "davi", "user": "davi@empresa.com", "pass_env": "BITRIX_PASS_DAVI",
+#    "calendar_id": "primary", "token": "token.json", "credentials": "credentials.json"}
+# ]
+import os, json, time, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+
+ACCOUNTS_FILE      = os.getenv("ACCOUNTS_FILE", "accounts.json")
+ACCOUNTS_OUT_DIR   = os.path.join("out", "accounts")
+# Memória estimada por Firefox headless e teto de workers
+SCRAPE_WORKER_MB   = int(os.getenv("SCRAPE_WORKER_MB", "700"))
+SCRAPE_MAX_WORKERS = int(os.getenv("SCRAPE_MAX_WORKERS", "8"))
+
+def log(m):  print(f"[ACCTS] {m}", flush=True)
+def warn(m): print(f"[!]  {m}", flush=True)
+
+def load_accounts(path: str = ACCOUNTS_FILE) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list) or not data:
+        raise RuntimeError(f"{path}: esperado uma lista de contas.")
+    names = set()
+    for acc in data:
+        if not acc.get("name") or not acc.get("user"):
+            raise RuntimeError(f"{path}: cada conta precisa de 'name' e 'user'.")
+        if acc["name"] in names:
+            raise RuntimeError(f"{path}: conta repetida: {acc['name']}")
+        names.add(acc["name"])
+    return data
+
+def account_dir(acc) -> str:
+    return os.path.abspath(os.path.join(ACCOUNTS_OUT_DIR, acc["name"]))
+
+def account_password(acc) -> str:
+    if acc.get("pass_env"):
+        return os.getenv(acc["pass_env"], "").strip().strip('"')
+    return acc.get("pass", "")
+
+def pool_size(n_accounts: int) -> int:
+    """Quantos Firefox cabem na memória disponível (MemAvailable / SCRAPE_WORKER_MB)."""
+    avail_mb = 0
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    avail_mb = int(line.split()[1]) // 1024
+                    break
+    except Exception:
+        pass
+    by_mem = avail_mb // SCRAPE_WORKER_MB if avail_mb else (os.cpu_count() or 1)
+    return max(1, min(n_accounts, SCRAPE_MAX_WORKERS, by_mem))
+
+def write_status(acc, **fields):
+    path = os.path.join(account_dir(acc), "status.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cur = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cur = json.load(f)
+        except Exception:
+            cur = {}
+    cur.update(fields)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cur, f, ensure_ascii=False, indent=2)
+
+def _scrape_worker(acc, force_refresh):
+    """Roda em processo próprio: isola Firefox, perfil e globais do bot por conta."""
+    import bot
+    import metrics
+    metrics.start_run(f"scrape:{acc['name']}")
+    out = account_dir(acc)
+    bot.configure_account(acc["user"], account_password(acc), out, acc.get("profile_dir", ""))
+    t0 = time.time()
+    status = bot.main(force_refresh=force_refresh)
+    metrics.finish(status, out_dir=out)
+    write_status(acc, scrape_status=status, scrape_at=t0, scrape_seconds=round(time.time() - t0, 1))
+    return status
+
+def scrape_all(accounts, force_refresh=False) -> dict:
+    workers = pool_size(len(accounts))
+    log(f"Scrape de {len(accounts)} conta(s) com {workers} worker(s).")
+    results = {}
+    ctx = mp.get_context("spawn")  # processo limpo: nada de estado do Selenium herdado
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+        futs = {ex.submit(_scrape_worker, acc, force_refresh): acc for acc in accounts}
+        for fut in as_completed(futs):
+            acc = futs[fut]
+            try:
+                results[acc["name"]] = fut.result()
+            except Exception as e:
+                warn(f"[{acc['name']}] worker falhou: {e}")
+                write_status(acc, scrape_status="FAIL", scrape_error=str(e), scrape_at=time.time())
+                results[acc["name"]] = "FAIL"
+    for name, st in results.items():
+        log(f"[{name}] STATUS={st}")
+    return results
+
+def sync_all(accounts) -> dict:
+    import sync_gcal
+    services, results = {}, {}
+    for acc in accounts:
+        cred_key = (acc.get("token", "token.json"), acc.get("credentials", "credentials.json"))
+        try:
+            if cred_key not in services:
+                services[cred_key] = sync_gcal.get_service(*cred_key)
+            summary = sync_gcal.main(
+                svc=services[cred_key],
+                events_path=os.path.join(account_dir(acc), "events.json"),
+                cal_id=acc.get("calendar_id") or sync_gcal.CAL_ID,
+                cal_ids=acc.get("calendar_ids"),
+            )
+            write_status(acc, sync_status="OK", sync_at=time.time(), sync_summary=summary)
+            results[acc["name"]] = summary
+        except Exception as e:
+            warn(f"[{acc['name']}] sync falhou: {e}")
+            traceback.print_exc()
+            write_status(acc, sync_status="FAIL", sync_error=str(e), sync_at=time.time())
+            results[acc["name"]] = None
+    log(f"Sync concluído: {len(accounts)} conta(s), {len(services)} client(s) do Google.")
+    return results
@@ -0,0 +1,214 @@
+# bench/fake_bitrix.py
+# Portal Bitrix sintético para benchmark offline: login em duas etapas,
+# painel de notificações com N notificações de agenda (carregadas em páginas
+# conforme a rolagem) e slider de evento, tudo com os seletores de selectors.json.
+# A página completa do evento (backend HTTP/abas) traz antes do slider o JSON
+# de outro evento ("próximos eventos"), como o portal real.
+import json, threading
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+PAGE_SIZE = 20
+SESSION_COOKIE = "BX_BENCH_SESSION"
+TARGET_TEXT = "Você concordou em participar do evento"
+MONTHS = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho",
+          "agosto", "setembro", "outubro", "novembro", "dezembro"]
+
+def _cls(sel: str) -> str:
+    return sel.strip().lstrip(".").split(".")[0]
+
+def event_fields(i: int) -> dict:
+    """Dados determinísticos do evento i (para conferir o resultado do scrape)."""
+    day, month, hour = 1 + i % 28, 1 + (i // 28) % 12, 8 + i % 9
+    return {
+        "id": str(100000 + i),
+        "titulo": f"Evento benchmark {i}",
+        "dia": day, "mes": month, "ano": 2030,
+        "inicio": f"{hour:02d}:00", "termino": f"{hour:02d}:45",
+        "descricao": f"https://meet.example.test/ev-{i}" if i % 3 else "",
+    }
+
+def expected_record(i: int) -> dict:
+    """Registro que o scrape deve gravar no store para o evento i."""
+    ev = event_fields(i)
+    return {"id": ev["id"], "titulo": ev["titulo"], "data": f"{ev['dia']:02d}/{ev['mes']:02d}/{ev['ano']}",
+            "inicio": ev["inicio"], "termino": ev["termino"], "descricao": ev["descricao"]}
+
+def field_mismatches(saved: dict, n: int) -> list:
+    """Compara o store ({id: registro}) com o esperado; devolve 'id campo: obtido != esperado'."""
+    out = []
+    for i in range(n):
+        if not i % 4:
+            continue                          # 1 em 4 notificações não tem a frase-alvo
+        exp = expected_record(i)
+        got = saved.get(exp["id"])
+        if got is None:
+            out.append(f"{exp['id']}: ausente")
+            continue
+        for k, v in exp.items():
+            if (got.get(k) or "") != v:
+                out.append(f"{exp['id']} {k}: {got.get(k)!r} != {v!r}")
+    return out
+
+class FakeBitrix:
+    def __init__(self, selectors: dict, n_events: int, page_delay_ms: int = 50):
+        self.sel = selectors
+        self.n = n_events
+        self.page_delay_ms = page_delay_ms
+        self.requests = 0
+        self.httpd = None
+
+    # ---------- páginas ----------
+    def login_page(self) -> str:
+        s = self.sel["login"]
+        return f"""<!doctype html><html><body>
+<form id="email-step" onsubmit="return false">
+  <input id="{escape(s['user'].lstrip('#'))}" type="text">
+  <button class="{_cls(s['continue_btn'])}" type="button"
+    onclick="document.getElementById('pass-step').style.display='block'">Continuar</button>
+</form>
+<form id="pass-step" style="display:none" onsubmit="return false">
+  <input type="password">
+  <button class="{_cls(s['pass_continue_btn'])}" type="button"
+    onclick="document.cookie='{SESSION_COOKIE}=1; path=/'; location.reload()">Continuar</button>
+</form>
+</body></html>"""
+
+    def notification_html(self, i: int, base: str) -> str:
+        ev = event_fields(i)
+        item_cls = _cls(self.sel["notifications"]["item"])
+        prefix = TARGET_TEXT if i % 4 else "Você foi convidado para o evento"   # 1 em 4 não casa
+        when = f"Sexta-feira, {ev['dia']} de {MONTHS[ev['mes'] - 1]} de {ev['ano']} {ev['inicio']}"
+        return (f'<div class="{item_cls}" data-id="{900000 - i}"><span>{prefix} </span>'
+                f'<a href="{base}/calendar/?EVENT_ID={ev["id"]}">{escape(ev["titulo"])}</a>'
+                f'<span> a ser realizado em {when}</span></div>')
+
+    def portal_page(self, base: str) -> str:
+        n = self.sel["notifications"]
+        v = self.sel["event_view"]
+        icon_cls = " ".join(c for c in n["icon"].split(".") if c)
+        items = json.dumps([self.notification_html(i, base) for i in range(self.n)])
+        return f"""<!doctype html><html><body>
+<div id="bench-portal">Portal</div>
+<div class="{icon_cls}" id="notif-icon" style="width:20px;height:20px;background:#ccc">N</div>
+<div id="panel" style="display:none">
+  <div class="{_cls(n['root'])}" style="height:400px;overflow-y:auto"></div>
+</div>
+<script>
+const ITEMS = {items};
+const PAGE = {PAGE_SIZE}, DELAY = {self.page_delay_ms};
+let shown = 0, loading = false;
+const root = document.querySelector('.{_cls(n["root"])}');
+function loadPage() {{
+  if (loading || shown >= ITEMS.length) return;
+  loading = true;
+  setTimeout(() => {{
+    const frag = document.createElement('div');
+    frag.innerHTML = ITEMS.slice(shown, shown + PAGE).join('');
+    while (frag.firstChild) root.appendChild(frag.firstChild);
+    shown = Math.min(ITEMS.length, shown + PAGE);
+    loading = false;
+  }}, DELAY);
+}}
+document.getElementById('notif-icon').addEventListener('click', () => {{
+  document.getElementById('panel').style.display = 'block';
+  loadPage();
+}});
+root.addEventListener('scroll', () => {{
+  if (root.scrollTop + root.clientHeight >= root.scrollHeight - 5) loadPage();
+}});
+document.addEventListener('click', (e) => {{
+  const a = e.target.closest('a[href*="EVENT_ID="]');
+  if (!a) return;
+  e.preventDefault();
+  const id = new URL(a.href).searchParams.get('EVENT_ID');
+  fetch('/calendar/?EVENT_ID=' + id + '&fragment=1').then(r => r.text()).then(html => {{
+    const old = document.querySelector('.{_cls(v["slider_root"])}');
+    if (old) old.parentNode.remove();
+    const wrap = document.createElement('div');
+    wrap.innerHTML = html;
+    document.body.appendChild(wrap);
+    wrap.querySelector('.side-panel-close').addEventListener('click', () => wrap.remove());
+  }});
+}});
+</script>
+</body></html>"""
+
+    @staticmethod
+    def event_json(i: int) -> str:
+        ev = event_fields(i)
+        day = f"{ev['dia']:02d}.{ev['mes']:02d}.{ev['ano']}"
+        return json.dumps({"ID": ev["id"], "NAME": ev["titulo"],
+                           "DATE_FROM": f"{day} {ev['inicio']}:00", "DATE_TO": f"{day} {ev['termino']}:00"},
+                          ensure_ascii=False)
+
+    def slider_html(self, i: int) -> str:
+        ev = event_fields(i)
+        v = self.sel["event_view"]
+        title = f"{ev['dia']} de {MONTHS[ev['mes'] - 1]} de {ev['ano']}, {ev['inicio']} - {ev['termino']}"
+        desc = (f'<div id="calendar-slider-detail-description">Link: {escape(ev["descricao"])}</div>'
+                if ev["descricao"] else "")
+        return (f'<div class="{_cls(v["slider_root"])}"><button class="side-panel-close">x</button>'
+                f'<div class="{_cls(v["time_text"])}">{escape(title)}</div>{desc}'
+                f'<script type="application/json">{self.event_json(i)}</script>'
+                f'</div>')
+
+    def event_page(self, i: int) -> str:
+        """Página completa do evento: JSON de outro evento antes do slider."""
+        other = i + 1 if i + 1 < self.n else i - 1
+        upcoming = (f'<script type="application/json" id="upcoming">{{"items":[{self.event_json(other)}]}}</script>'
+                    if other >= 0 else "")
+        return f"<!doctype html><html><body>{upcoming}{self.slider_html(i)}</body></html>"
+
+    # ---------- servidor ----------
+    def handler(self):
+        fake = self
+
+        class H(BaseHTTPRequestHandler):
+            def log_message(self, *a):
+                pass
+
+            def _send(self, status: int, body: str, ctype="text/html; charset=utf-8"):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                fake.requests += 1
+                u = urlparse(self.path)
+                logged = f"{SESSION_COOKIE}=1" in (self.headers.get("Cookie") or "")
+                base = f"http://{self.headers.get('Host')}"
+                if u.path.startswith("/calendar/"):
+                    if not logged:
+                        return self._send(200, fake.login_page())
+                    q = parse_qs(u.query)
+                    i = int(q.get("EVENT_ID", ["0"])[0]) - 100000
+                    if not 0 <= i < fake.n:
+                        return self._send(404, "not found")
+                    return self._send(200, fake.slider_html(i) if "fragment" in q else fake.event_page(i))
+                if u.path == "/favicon.ico":
+                    return self._send(404, "")
+                return self._send(200, fake.portal_page(base) if logged else fake.login_page())
+
+        return H
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.httpd.server_port}/"
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+def bench_selectors(base_selectors: dict, url: str) -> dict:
+    """Cópia de selectors.json apontando para o portal falso."""
+    sel = json.loads(json.dumps(base_selectors))
+    sel["login"]["url"] = url
+    sel["login"]["logged_probe"] = "#bench-portal"
+    return sel
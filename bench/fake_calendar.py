@@ -0,0 +1,210 @@
+# bench/fake_calendar.py
+# Stand-in local dos endpoints da Calendar API v3 usados pelo sync:
+# events.list (janela, privateExtendedProperty, paginação, syncToken),
+# insert (com id do cliente → 409 se já existir), update, patch (If-Match),
+# delete e o endpoint de batch multipart.
+import json, threading, itertools, os
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+class FakeCalendar:
+    def __init__(self):
+        self.events = {}            # (cal_id, event_id) -> evento
+        self.version = 0            # contador global para syncToken
+        self.lock = threading.Lock()
+        self.http_calls = 0         # requisições HTTP recebidas (batch = 1)
+        self.api_calls = 0          # operações da API (cada parte do batch conta)
+        self._ids = itertools.count(1)
+        self.httpd = None
+
+    # ---------- operações ----------
+    def _bump(self, ev):
+        self.version += 1
+        ev["_v"] = self.version
+        ev["etag"] = f'"{self.version}"'
+        ev["updated"] = f"2030-01-01T00:00:{self.version % 60:02d}Z"
+
+    def _public(self, ev):
+        return {k: v for k, v in ev.items() if not k.startswith("_")}
+
+    def handle(self, method: str, path: str, query: dict, headers: dict, body: bytes):
+        """Despacha uma operação; devolve (status, dict)."""
+        self.api_calls += 1
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        # calendar/v3/calendars/{cal}/events[/{id}]
+        if len(parts) < 5 or parts[:3] != ["calendar", "v3", "calendars"] or parts[4] != "events":
+            return 404, {"error": {"code": 404, "message": "not found"}}
+        cal_id = parts[3]
+        event_id = parts[5] if len(parts) > 5 else None
+        q = {k: v[0] for k, v in query.items()}
+        with self.lock:
+            if method == "GET" and event_id is None:
+                return self._list(cal_id, q)
+            if method == "POST" and event_id is None:
+                ev = json.loads(body or b"{}")
+                if ev.get("id") and (cal_id, ev["id"]) in self.events:
+                    return 409, {"error": {"code": 409, "message": "The requested identifier already exists."}}
+                ev["id"] = ev.get("id") or f"ev{next(self._ids)}"
+                ev["status"] = "confirmed"
+                self._bump(ev)
+                self.events[(cal_id, ev["id"])] = ev
+                return 200, self._public(ev)
+            ev = self.events.get((cal_id, event_id))
+            if method == "PUT" and ev is not None:
+                # update substitui o evento (e pode restaurar um cancelado)
+                new = json.loads(body or b"{}")
+                new.update(id=event_id, status=new.get("status") or "confirmed")
+                ev.clear()
+                ev.update(new)
+                self._bump(ev)
+                return 200, self._public(ev)
+            if ev is None or (ev["status"] == "cancelled" and method != "GET"):
+                return 404, {"error": {"code": 404, "message": "Not Found"}}
+            if method == "GET":
+                return 200, self._public(ev)
+            if_match = headers.get("if-match")
+            if if_match and if_match != ev["etag"]:
+                return 412, {"error": {"code": 412, "message": "Precondition Failed"}}
+            if method == "PATCH":
+                for k, v in json.loads(body or b"{}").items():
+                    if v is None:
+                        ev.pop(k, None)
+                    else:
+                        ev[k] = v
+                self._bump(ev)
+                return 200, self._public(ev)
+            if method == "DELETE":
+                ev["status"] = "cancelled"
+                self._bump(ev)
+                return 204, None
+        return 405, {"error": {"code": 405, "message": "method not allowed"}}
+
+    def _list(self, cal_id, q):
+        items = [ev for (c, _), ev in self.events.items() if c == cal_id]
+        sync_token = q.get("syncToken")
+        if sync_token:
+            since = int(sync_token)
+            items = [ev for ev in items if ev["_v"] > since]
+        else:
+            if q.get("showDeleted", "false") != "true":
+                items = [ev for ev in items if ev["status"] != "cancelled"]
+            prop = q.get("privateExtendedProperty")
+            if prop:
+                k, v = prop.split("=", 1)
+                items = [ev for ev in items
+                         if ((ev.get("extendedProperties") or {}).get("private") or {}).get(k) == v]
+            t_min, t_max = q.get("timeMin"), q.get("timeMax")
+            if t_min or t_max:
+                from datetime import datetime
+                def _ts(s): return datetime.fromisoformat(s.replace("Z", "+00:00"))
+                keep = []
+                for ev in items:
+                    st = (ev.get("start") or {}).get("dateTime")
+                    if not st:
+                        continue
+                    t = _ts(st)
+                    if (not t_min or t >= _ts(t_min)) and (not t_max or t < _ts(t_max)):
+                        keep.append(ev)
+                items = keep
+        items.sort(key=lambda e: e["_v"])
+        start = int(q.get("pageToken") or 0)
+        size = int(q.get("maxResults") or 250)
+        page = items[start:start + size]
+        resp = {"items": [self._public(e) for e in page]}
+        if start + size < len(items):
+            resp["nextPageToken"] = str(start + size)
+        else:
+            resp["nextSyncToken"] = str(self.version)
+        return 200, resp
+
+    # ---------- batch multipart ----------
+    def handle_batch(self, content_type: str, body: bytes) -> (str, bytes):
+        boundary = content_type.split("boundary=", 1)[1].strip('"')
+        out_boundary = "batch_bench_boundary"
+        chunks = []
+        # o googleapiclient gera as partes com \n; normaliza antes de separar
+        for part in body.replace(b"\r\n", b"\n").split(f"--{boundary}".encode()):
+            part = part.strip(b"\n")
+            if not part or part == b"--":
+                continue
+            head, _, inner = part.partition(b"\n\n")
+            content_id = ""
+            for line in head.decode().split("\n"):
+                if line.lower().startswith("content-id:"):
+                    content_id = line.split(":", 1)[1].strip().strip("<>")
+            req_head, _, req_body = inner.partition(b"\n\n")
+            lines = req_head.decode().split("\n")
+            method, target, _ = lines[0].split(" ", 2)
+            hdrs = {l.split(":", 1)[0].strip().lower(): l.split(":", 1)[1].strip() for l in lines[1:] if ":" in l}
+            u = urlparse(target)
+            status, payload = self.handle(method, u.path, parse_qs(u.query), hdrs, req_body.strip())
+            reason = {200: "OK", 204: "No Content", 404: "Not Found", 409: "Conflict",
+                      412: "Precondition Failed"}.get(status, "Error")
+            data = json.dumps(payload) if payload is not None else ""
+            chunks.append(
+                f"--{out_boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{data}\r\n"
+            )
+        chunks.append(f"--{out_boundary}--\r\n")
+        return f"multipart/mixed; boundary={out_boundary}", "".join(chunks).encode()
+
+    # ---------- servidor ----------
+    def handler(self):
+        fake = self
+
+        class H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _reply(self, status, payload=None, ctype="application/json; charset=UTF-8", raw=None):
+                data = raw if raw is not None else (json.dumps(payload).encode() if payload is not None else b"")
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, method):
+                fake.http_calls += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                u = urlparse(self.path)
+                if u.path.startswith("/batch/"):
+                    ctype, data = fake.handle_batch(self.headers.get("Content-Type", ""), body)
+                    return self._reply(200, ctype=ctype, raw=data)
+                hdrs = {k.lower(): v for k, v in self.headers.items()}
+                status, payload = fake.handle(method, u.path, parse_qs(u.query), hdrs, body)
+                self._reply(status, payload)
+
+            def do_GET(self):    self._dispatch("GET")
+            def do_POST(self):   self._dispatch("POST")
+            def do_PATCH(self):  self._dispatch("PATCH")
+            def do_PUT(self):    self._dispatch("PUT")
+            def do_DELETE(self): self._dispatch("DELETE")
+
+        return H
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.httpd.server_port}/"
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+def build_service(root_url: str):
+    """Client googleapiclient apontando para o stand-in (discovery local, sem credenciais)."""
+    import httplib2
+    import googleapiclient
+    from googleapiclient.discovery import build_from_document
+    path = os.path.join(os.path.dirname(googleapiclient.__file__), "discovery_cache", "documents", "calendar.v3.json")
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    doc["rootUrl"] = root_url
+    doc["baseUrl"] = root_url + doc["servicePath"]
+    return build_from_document(doc, http=httplib2.Http())
@@ -0,0 +1,188 @@
+# bench/fake_webhook.py
+# Remetente sintético de webhooks de saída do Bitrix24 (agenda) + stand-in da
+# REST (calendar.event.getbyid) para testar o modo --webhook sem portal.
+#
+#   python bench/fake_webhook.py --self-test [--n 20]
+#       sobe o receptor em processo contra o stand-in da Calendar API e confere
+#       token inválido (401), inserts, update, delete, convite recusado,
+#       reprocessamento de uma falha da REST e o ledger
+#   python bench/fake_webhook.py --receiver http://127.0.0.1:8765/bitrix/webhook --token T [--n 20]
+#       só dispara contra um receptor já no ar (que precisa usar BITRIX_REST_URL
+#       com a URL da REST impressa aqui)
+import os, sys, json, time, argparse, threading, tempfile
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR  = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_bitrix import event_fields
+
+DOMAIN = "bench.bitrix24.com.br"
+
+def log(m):  print(f"[FAKEHOOK] {m}", flush=True)
+
+class FakeRest:
+    """
+    calendar.event.getbyid com os eventos de event_fields(i) (IDs 100000+i), a
+    partir de amanhã, aceitos; o ID 100000+n é um convite recusado.
+    """
+    def __init__(self, n: int):
+        self.entries = {}
+        base = datetime.now() + timedelta(days=1)
+        for i in range(n + 1):
+            f = event_fields(i)
+            day = (base + timedelta(days=i % 300)).strftime("%d.%m.%Y")   # dentro da janela do sync
+            self.entries[f["id"]] = {
+                "ID": f["id"], "NAME": f["titulo"], "DT_SKIP_TIME": "N",
+                "DATE_FROM": f"{day} {f['inicio']}:00", "DATE_TO": f"{day} {f['termino']}:00",
+                "DESCRIPTION": f"[URL]{f['descricao']}[/URL]" if f["descricao"] else "",
+                "IS_MEETING": "Y", "MEETING_STATUS": "Y" if i < n else "N",
+            }
+        self.calls = 0
+        self.fail_once = set()      # IDs cuja primeira busca devolve 503
+        self.httpd = None
+
+    def handler(self):
+        fake = self
+
+        class H(BaseHTTPRequestHandler):
+            def log_message(self, *a):
+                pass
+
+            def do_GET(self):
+                fake.calls += 1
+                u = urlparse(self.path)
+                if not u.path.endswith("/calendar.event.getbyid.json"):
+                    status, payload = 404, {"error": "ERROR_METHOD_NOT_FOUND"}
+                else:
+                    eid = parse_qs(u.query).get("id", [""])[0]
+                    if eid in fake.fail_once:
+                        fake.fail_once.discard(eid)
+                        status, payload = 503, {"error": "QUERY_LIMIT_EXCEEDED"}
+                    else:
+                        status, payload = 200, {"result": fake.entries.get(eid)}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return H
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.httpd.server_port}/rest/1/bench/"
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+def send(url: str, event: str, eid: str, token: str) -> int:
+    """Um POST no formato do Bitrix (form com chaves em colchetes)."""
+    form = {
+        "event": event, "data[FIELDS][ID]": eid, "ts": str(int(time.time())),
+        "auth[domain]": DOMAIN, "auth[application_token]": token,
+    }
+    r = requests.post(url, data=urlencode(form), timeout=10,
+                      headers={"Content-Type": "application/x-www-form-urlencoded"})
+    return r.status_code
+
+def fire(url: str, token: str, n: int) -> dict:
+    codes = {"bad_token": send(url, "ONCALENDARENTRYADD", "100000", token + "x")}
+    codes["adds"] = [send(url, "ONCALENDARENTRYADD", str(100000 + i), token) for i in range(n)]
+    codes["update"] = send(url, "ONCALENDARENTRYUPDATE", "100000", token)
+    codes["delete"] = send(url, "ONCALENDARENTRYDELETE", str(100000 + n - 1), token)
+    codes["declined"] = send(url, "ONCALENDARENTRYADD", str(100000 + n), token)
+    return codes
+
+def self_test(n: int) -> int:
+    os.environ.setdefault("SYNC_QPS", "100000")
+    os.environ.setdefault("SYNC_BURST", "100000")
+    os.environ.setdefault("WEBHOOK_ON_DELETE", "delete")
+    os.environ.setdefault("PIPELINE_LINGER_S", "0.2")
+    os.environ.setdefault("WEBHOOK_RETRY_S", "0.5")
+    tmp = tempfile.mkdtemp(prefix="fakehook-")
+    os.chdir(tmp)                               # out/ (store, ledger, métricas) isolado
+    from fake_calendar import FakeCalendar, build_service
+    import webhook
+    from ledger import Ledger
+
+    rest, cal = FakeRest(n), FakeCalendar()
+    rest_url, cal_url = rest.start(), cal.start()
+    token, ready, stop = "bench-token", {}, threading.Event()
+    t = threading.Thread(target=webhook.serve, kwargs=dict(
+        svc=build_service(cal_url), host="127.0.0.1", port=0, tokens=[token], rest_url=rest_url,
+        ready=lambda u: ready.setdefault("url", u), stop_event=stop), daemon=True)
+    t.start()
+    while "url" not in ready:
+        time.sleep(0.05)
+
+    t0 = time.monotonic()
+    rest.entries["100000"]["NAME"] += " (editado)"      # o UPDATE traz o nome novo
+    rest.fail_once.add("100001")                         # REST instável: o pedido volta para a fila
+    codes = fire(ready["url"], token, n)
+    declined = rest.entries[str(100000 + n)]["NAME"]
+    def settled():
+        live = [e for e in cal.events.values() if e.get("status") != "cancelled"]
+        return len(live) == n - 1 and any(e["summary"] == "Evento benchmark 1" for e in live)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline and not settled():   # espera o reprocessamento
+        time.sleep(0.1)
+    stop.set()
+    t.join()
+    elapsed = time.monotonic() - t0
+
+    ledger = Ledger()
+    synced = ledger.count("primary")
+    ledger.close()
+    from event_store import EventStore
+    store = EventStore(os.path.join("out", "events.sqlite"))
+    declined_stored = bool(store.get_many([str(100000 + n)]))
+    store.close()
+    live = [e for e in cal.events.values() if e.get("status") != "cancelled"]
+    names = {e["summary"] for e in live}
+    checks = {
+        "401 com token inválido": codes["bad_token"] == 401,
+        "200 para todos os webhooks": all(c == 200 for c in codes["adds"] + [codes["update"], codes["delete"],
+                                                                            codes["declined"]]),
+        f"{n - 1} evento(s) no Google": len(live) == n - 1 and synced == n - 1,
+        "update aplicado": "Evento benchmark 0 (editado)" in names,
+        "falha da REST reprocessada": "Evento benchmark 1" in names,
+        "convite recusado fora do Google e do store": declined not in names and not declined_stored,
+        "nada pendente ao encerrar": not os.path.exists(webhook.WEBHOOK_PENDING_PATH),
+    }
+    rest.stop()
+    cal.stop()
+    for name, okk in checks.items():
+        log(f"{'OK ' if okk else 'FALHOU'} {name}")
+    log(f"{n + 4} webhooks em {elapsed:.2f}s | REST: {rest.calls} chamadas | "
+        f"Google: {cal.http_calls} requisições HTTP ({cal.api_calls} operações)")
+    return 0 if all(checks.values()) else 1
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Remetente de webhooks Bitrix (agenda) para testes")
+    ap.add_argument("--self-test", action="store_true")
+    ap.add_argument("--receiver", default="http://127.0.0.1:8765/bitrix/webhook")
+    ap.add_argument("--token", default=os.getenv("BITRIX_APP_TOKEN", "").split(",")[0])
+    ap.add_argument("--n", type=int, default=20)
+    args = ap.parse_args()
+    if args.self_test:
+        return self_test(args.n)
+    rest = FakeRest(args.n)
+    log(f"REST em {rest.start()} (use como BITRIX_REST_URL do receptor)")
+    input("Enter para disparar… ")
+    log(json.dumps(fire(args.receiver, args.token, args.n)))
+    rest.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
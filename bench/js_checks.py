@@ -0,0 +1,141 @@
+# bench/js_checks.py
+# Confere os scripts que o bot injeta no navegador (resolução de link por
+# EVENT_ID, coleta do painel, prontidão das abas…) rodando-os no node contra um DOM mínimo, sem
+# Firefox. Cada verificação compara o resultado com o esperado.
+#
+#   python bench/js_checks.py
+import os, sys, json, shutil, subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR  = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+# DOM mínimo: elementos com atributos/href/texto; querySelector(All) por seletor exato
+DOM_SHIM = """
+const el = (o) => Object.assign({
+  _q: {}, _attrs: {}, href: '', textContent: '', innerText: '', parent: null,
+  getAttribute(k) { return k in this._attrs ? this._attrs[k] : null; },
+  querySelectorAll(s) { return this._q[s] || []; },
+  querySelector(s) { return (this._q[s] || [])[0] || null; },
+  closest(s) { let p = this; while (p && !(p._is || []).includes(s)) p = p.parent; return p; },
+}, o);
+const anchor = (eventId, title, card) => {
+  const a = el({href: 'https://portal.test/calendar/?EVENT_ID=' + eventId + '&EVENT_DATE=01.01.2030', textContent: title, parent: card});
+  card._q['LINK'] = [a];
+  return a;
+};
+"""
+
+def log(m):  print(f"[JSCHECK] {m}", flush=True)
+
+def run_node(setup: str, script: str, args: str, pick: str = "(r) => r"):
+    """
+    Roda `script` como corpo de função com `args` (expressão JS) depois de
+    `setup`; devolve pick(resultado) em JSON (elementos do DOM não serializam).
+    """
+    src = (DOM_SHIM + setup + f"\nconst __f = new Function({json.dumps(script)});\n"
+           f"const __r = ({pick})(__f(...[{args}]));\n"
+           f"console.log(JSON.stringify(__r === undefined ? null : __r));")
+    p = subprocess.run(["node", "-e", src], capture_output=True, text=True, timeout=30)
+    if p.returncode != 0:
+        raise RuntimeError(p.stderr.strip()[-500:])
+    return json.loads(p.stdout.strip().splitlines()[-1])
+
+PANEL = """
+const cards = [], anchors = [];
+for (const [key, ev] of [['d1', '123'], ['d2', '12'], ['d3', '1234']]) {
+  const card = el({_is: ['ITEM'], _attrs: {'data-id': key}, innerText: 'Você concordou em participar do evento ' + ev});
+  anchors.push(anchor(ev, 'Evento ' + ev, card)); cards.push(card);
+}
+const root = el({_q: {'LINK': anchors, 'ITEM': cards}});
+globalThis.document = {baseURI: 'https://portal.test/', querySelector: (s) => s === 'ROOT' ? root : null};
+"""
+
+def check_resolve(bot) -> dict:
+    js = bot.RESOLVE_NOTIFICATION_JS
+    res = {}
+    for name, (idx, eid, exp) in {
+        "resolve: índice certo": (1, "12", "12"),
+        "resolve: índice errado → varre": (0, "1234", "1234"),
+        "resolve: sem casar prefixo (12 ≠ 123)": (2, "12", "12"),
+        "resolve: id inexistente → null": (0, "999", None),
+    }.items():
+        href = run_node(PANEL, js, f"'ROOT', 'LINK', {idx}, '{eid}'", pick="(a) => a && a.href")
+        got_id = href.split("EVENT_ID=")[1].split("&")[0] if href else None
+        res[name] = (got_id == exp, f"{got_id!r} != {exp!r}")
+    return res
+
+def check_harvest(bot) -> dict:
+    got = run_node(PANEL, bot.HARVEST_NOTIFICATIONS_JS, "'ROOT', 'LINK', 'ITEM', ['data-id'], ['data-id:d3'], 2")
+    ids = [it["href"].split("EVENT_ID=")[1].split("&")[0] for it in got["items"]]
+    return {
+        "harvest: para na marca d'água": (ids == ["123", "12"] and got["stopped"], f"{ids} stopped={got['stopped']}"),
+        "harvest: chaves do topo": (got["top_keys"] == ["data-id:d1", "data-id:d2"], f"{got['top_keys']}"),
+    }
+
+# mesmo evento (123) de novo no topo, cards sem atributo de id: a coleta não pode parar nele
+PANEL_REPEAT = """
+const cards = [], anchors = [];
+for (const [key, ev] of [[null, '123'], ['d2', '12'], [null, '123'], ['d1', '123']]) {
+  const card = el({_is: ['ITEM'], _attrs: key ? {'data-id': key} : {}, innerText: 'Evento ' + ev});
+  anchors.push(anchor(ev, 'Evento ' + ev, card)); cards.push(card);
+}
+const root = el({_q: {'LINK': anchors, 'ITEM': cards}});
+globalThis.document = {baseURI: 'https://portal.test/', querySelector: (s) => s === 'ROOT' ? root : null};
+"""
+
+def check_harvest_repeat(bot) -> dict:
+    old_mark = "'href:https://portal.test/calendar/?EVENT_ID=123&EVENT_DATE=01.01.2030|Evento 123'"
+    got = run_node(PANEL_REPEAT, bot.HARVEST_NOTIFICATIONS_JS,
+                   f"'ROOT', 'LINK', 'ITEM', ['data-id'], ['data-id:d1', {old_mark}], 3")
+    ids = [it["href"].split("EVENT_ID=")[1].split("&")[0] for it in got["items"]]
+    return {
+        "harvest: evento repetido no topo sem id → segue até a marca": (
+            ids == ["123", "12", "123"] and got["stopped"], f"{ids} stopped={got['stopped']}"),
+        "harvest: marca só com chaves de id": (got["top_keys"] == ["data-id:d2"], f"{got['top_keys']}"),
+    }
+
+def tab_page(here: str, html: str, header: str = "", ready: str = "complete") -> str:
+    """Aba mostrando EVENT_ID=`here` com `html` e, opcionalmente, o cabeçalho de data/hora."""
+    return f"""
+globalThis.location = {{href: 'https://portal.test/calendar/?EVENT_ID={here}'}};
+const head = el({{textContent: {json.dumps(header)}}});
+globalThis.document = {{
+  readyState: '{ready}', documentElement: {{outerHTML: {json.dumps(html)}}},
+  querySelector: (s) => s === 'HEAD' && {json.dumps(bool(header))} ? head : null,
+}};
+"""
+
+def check_tab_ready(bot) -> dict:
+    js = bot.TAB_READY_JS
+    is_html = "(r) => r === null ? null : (r.startsWith('<') ? 'html' : r)"
+    json_of = lambda eid: f'<script>{{"ID":"{eid}","DATE_FROM":"01.01.2030 08:00:00"}}</script>'
+    res = {}
+    for name, (setup, eid, exp) in {
+        "tab: página anterior da aba → espera": (tab_page("111", json_of("111"), "1 de janeiro"), "222", None),
+        "tab: JSON de outro evento → espera": (tab_page("222", json_of("2222")), "222", None),
+        "tab: JSON do evento pedido → pronta": (tab_page("222", json_of("222")), "222", "html"),
+        "tab: só cabeçalho, carregada → pronta": (tab_page("222", "<div></div>", "1 de janeiro"), "222", "html"),
+        "tab: cabeçalho ainda carregando → espera": (tab_page("222", "<div></div>", "1 de janeiro", "loading"),
+                                                     "222", None),
+    }.items():
+        got = run_node(setup, js, f"'HEAD', '{eid}'", pick=is_html)
+        res[name] = (got == exp, f"{got!r} != {exp!r}")
+    return res
+
+CHECKS = [check_resolve, check_harvest, check_harvest_repeat, check_tab_ready]
+
+def main() -> int:
+    if not shutil.which("node"):
+        log("node indisponível; verificações puladas.")
+        return 0
+    import bot
+    failed = 0
+    for check in CHECKS:
+        for name, (ok, detail) in check(bot).items():
+            log(f"{'OK ' if ok else 'FALHOU'} {name}" + ("" if ok else f" ({detail})"))
+            failed += not ok
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
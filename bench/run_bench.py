@@ -0,0 +1,306 @@
+# bench/run_bench.py
+# Benchmark offline: portal Bitrix sintético + stand-in da Calendar API.
+# Cada cenário/tamanho roda em subprocesso próprio (pico de RSS isolado) e
+# vira uma linha em out/bench.jsonl; --baseline compara com um run anterior.
+#
+#   python bench/run_bench.py                         # sync, scrape e details, N=10,100,1000,5000
+#   python bench/run_bench.py --scenario sync --sizes 10,100
+#   python bench/run_bench.py --baseline out/bench_base.jsonl
+import os, sys, json, time, argparse, subprocess, tempfile, resource
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR  = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+DEFAULT_SIZES = "10,100,1000,5000"
+BENCH_OUT     = os.path.join(REPO_DIR, "out", "bench.jsonl")
+# Regressão: métrica pior que o baseline por mais que essa fração
+REGRESSION_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.20"))
+
+def log(m):  print(f"[BENCH] {m}", flush=True)
+def warn(m): print(f"[!]  {m}", flush=True)
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+def children_peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0, 1)
+
+# =========================
+# Cenário: sync
+# =========================
+def _bench_events(n: int) -> list:
+    base = datetime.now() + timedelta(days=1)
+    out = []
+    for i in range(n):
+        d = base + timedelta(days=i % 300)
+        hour = 8 + i % 9
+        out.append({
+            "titulo": f"Evento benchmark {i}", "id": str(100000 + i),
+            "data": d.strftime("%d/%m/%Y"), "inicio": f"{hour:02d}:00", "termino": f"{hour:02d}:45",
+            "link": f"https://bench.bitrix24.com.br/calendar/?EVENT_ID={100000 + i}",
+            "descricao": f"https://meet.example.test/ev-{i}" if i % 3 else "",
+        })
+    return out
+
+def scenario_sync(n: int) -> dict:
+    """Três passadas: fria (tudo insert), morna (nada mudou) e 10% alterado."""
+    os.environ.setdefault("SYNC_QPS", "100000")
+    os.environ.setdefault("SYNC_BURST", "100000")
+    from fake_calendar import FakeCalendar, build_service
+
+    fake = FakeCalendar()
+    url = fake.start()
+    try:
+        import sync_gcal
+        from event_store import EventStore
+
+        events = _bench_events(n)
+        os.makedirs("out", exist_ok=True)
+        store = EventStore(os.path.join("out", "events.sqlite"))
+        store.upsert_many(events)
+        store.close()
+
+        svc = build_service(url)
+        result = {}
+
+        def _pass(name):
+            calls0, http0 = fake.api_calls, fake.http_calls
+            t0 = time.perf_counter()
+            summary = sync_gcal.main(svc=svc) or {}
+            result[name] = {
+                "wall_s": round(time.perf_counter() - t0, 3),
+                "api_calls": fake.api_calls - calls0,
+                "http_requests": fake.http_calls - http0,
+                "created": summary.get("created", 0), "updated": summary.get("updated", 0),
+                "unchanged": summary.get("unchanged", 0), "failed": summary.get("failed", 0),
+            }
+
+        _pass("cold")
+        _pass("warm")
+        changed = events[::10]
+        for ev in changed:
+            ev["titulo"] += " (alterado)"
+        store = EventStore(os.path.join("out", "events.sqlite"))
+        store.upsert_many(changed)
+        store.close()
+        _pass("modify_10pct")
+    finally:
+        fake.stop()
+
+    return {
+        "wall_s": round(sum(p["wall_s"] for p in result.values()), 3),
+        "api_calls": sum(p["api_calls"] for p in result.values()),
+        "passes": result,
+    }
+
+# =========================
+# Cenário: scrape
+# =========================
+def _count_webdriver_commands():
+    """Conta comandos WebDriver enviados ao geckodriver."""
+    from selenium.webdriver.remote.remote_connection import RemoteConnection
+    counter = {"n": 0}
+    orig = RemoteConnection.execute
+
+    def execute(self, command, params):
+        counter["n"] += 1
+        return orig(self, command, params)
+    RemoteConnection.execute = execute
+    return counter
+
+def scenario_scrape(n: int) -> dict:
+    import shutil
+    if not shutil.which("geckodriver") and not shutil.which("firefox"):
+        return {"skipped": "Firefox/geckodriver indisponível"}
+    from fake_bitrix import FakeBitrix, bench_selectors, field_mismatches
+
+    with open(os.path.join(REPO_DIR, "selectors.json"), "r", encoding="utf-8") as f:
+        base_sel = json.load(f)
+    fake = FakeBitrix(base_sel, n)
+    url = fake.start()
+    try:
+        with open("selectors.json", "w", encoding="utf-8") as f:
+            json.dump(bench_selectors(base_sel, url), f, ensure_ascii=False, indent=2)
+        os.environ.setdefault("BITRIX_USER", "bench@example.test")
+        os.environ.setdefault("BITRIX_PASS", "bench")
+        os.environ.setdefault("NOTIF_MAX_ITEMS", str(n + 1))
+        os.environ.setdefault("NOTIF_MAX_PAGES", str(n // 20 + 5))
+        os.environ.setdefault("NOTIF_SETTLE_MS", "500")
+        os.environ.setdefault("LEAN_REPORT", "false")
+
+        counter = _count_webdriver_commands()
+        import bot   # lê selectors.json do cwd
+        t0 = time.perf_counter()
+        status = bot.main(force_refresh=True)
+        wall = time.perf_counter() - t0
+        store = bot.open_events_store()
+        try:
+            saved = {e["id"]: e for e in store.all()}
+        finally:
+            store.close()
+        # conta evento não basta: slider que falha cai no fallback do card e ainda grava
+        mismatches = field_mismatches(saved, n)
+    finally:
+        fake.stop()
+
+    return {
+        "status": status,
+        "wall_s": round(wall, 3),
+        "webdriver_commands": counter["n"],
+        "portal_requests": fake.requests,
+        "events_saved": len(saved),
+        "field_mismatches": len(mismatches),
+        "mismatch_examples": mismatches[:5],
+        "firefox_peak_rss_mb": children_peak_rss_mb(),
+    }
+
+# =========================
+# Cenário: details (DETAILS_BACKEND=http, sem Firefox)
+# =========================
+class _SessionDriver:
+    """O que fetch_details_http usa do WebDriver: cookies da sessão logada e o user agent."""
+    def __init__(self, host: str, cookie: str):
+        self.host, self.cookie = host, cookie
+
+    def get_cookies(self):
+        return [{"name": self.cookie, "value": "1", "domain": self.host, "path": "/"}]
+
+    def execute_script(self, script, *args):
+        return "bench"
+
+def scenario_details(n: int) -> dict:
+    from urllib.parse import urlparse
+    from fake_bitrix import FakeBitrix, SESSION_COOKIE, bench_selectors, event_fields, field_mismatches
+
+    with open(os.path.join(REPO_DIR, "selectors.json"), "r", encoding="utf-8") as f:
+        base_sel = json.load(f)
+    fake = FakeBitrix(base_sel, n)
+    url = fake.start()
+    try:
+        with open("selectors.json", "w", encoding="utf-8") as f:
+            json.dump(bench_selectors(base_sel, url), f, ensure_ascii=False, indent=2)
+        import bot   # lê selectors.json do cwd
+        evs = [event_fields(i) for i in range(n) if i % 4]      # as que casam com a frase-alvo
+        notifs = [{"id": ev["id"], "url": f"{url}calendar/?EVENT_ID={ev['id']}"} for ev in evs]
+        t0 = time.perf_counter()
+        details = bot.fetch_details_http(_SessionDriver(urlparse(url).hostname, SESSION_COOKIE), notifs)
+        wall = time.perf_counter() - t0
+    finally:
+        fake.stop()
+    # a página traz o JSON de outro evento antes do slider: confere que cada um leu o seu
+    saved = {ev["id"]: dict(details[ev["id"]], id=ev["id"], titulo=ev["titulo"]) for ev in evs if ev["id"] in details}
+    mismatches = field_mismatches(saved, n)
+    return {
+        "wall_s": round(wall, 3),
+        "portal_requests": fake.requests,
+        "events_saved": len(saved),
+        "field_mismatches": len(mismatches),
+        "mismatch_examples": mismatches[:5],
+    }
+
+SCENARIOS = {"sync": scenario_sync, "scrape": scenario_scrape, "details": scenario_details}
+
+# =========================
+# Execução
+# =========================
+def run_child(scenario: str, n: int):
+    """Modo filho: roda um cenário num diretório temporário e imprime uma linha JSON."""
+    with tempfile.TemporaryDirectory(prefix=f"bench-{scenario}-{n}-") as tmp:
+        os.chdir(tmp)
+        os.environ["METRICS_DIR"] = os.path.join(tmp, "out")
+        res = SCENARIOS[scenario](n)
+    res.update({"scenario": scenario, "n": n, "peak_rss_mb": peak_rss_mb()})
+    print("BENCH_RESULT " + json.dumps(res, ensure_ascii=False), flush=True)
+
+def run_one(scenario: str, n: int, verbose: bool) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", scenario, str(n)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if verbose:
+        sys.stdout.write(proc.stdout)
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    tail = (proc.stderr or proc.stdout).strip().splitlines()[-5:]
+    return {"scenario": scenario, "n": n, "error": " | ".join(tail) or f"exit {proc.returncode}"}
+
+def load_baseline(path: str) -> dict:
+    base = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except Exception:
+                continue
+            if "error" not in r and "skipped" not in r:
+                base[(r["scenario"], r["n"])] = r   # a última linha de cada par vale
+    return base
+
+def regressions(res: dict, base: dict) -> list:
+    ref = base.get((res["scenario"], res["n"]))
+    if not ref:
+        return []
+    out = []
+    for key in ("wall_s", "api_calls", "webdriver_commands", "peak_rss_mb"):
+        old, new = ref.get(key), res.get(key)
+        if not old or new is None:
+            continue
+        # chamadas/comandos são determinísticos: qualquer aumento conta
+        tol = 0.0 if key in ("api_calls", "webdriver_commands") else REGRESSION_TOLERANCE
+        if new > old * (1 + tol):
+            out.append(f"{key}: {old} → {new}")
+    return out
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark offline (Bitrix sintético + Calendar API local).")
+    ap.add_argument("--scenario", choices=["all", *SCENARIOS], default="all")
+    ap.add_argument("--sizes", default=DEFAULT_SIZES, help="Tamanhos N separados por vírgula.")
+    ap.add_argument("--baseline", help="bench.jsonl de referência para detectar regressões.")
+    ap.add_argument("--out", default=BENCH_OUT)
+    ap.add_argument("--verbose", action="store_true", help="Mostra a saída dos cenários.")
+    ap.add_argument("--child", nargs=2, metavar=("SCENARIO", "N"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(args.child[0], int(args.child[1]))
+        return 0
+
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    base = load_baseline(args.baseline) if args.baseline else {}
+    run_id = time.strftime("%Y-%m-%dT%H:%M:%S")
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+
+    found = []
+    with open(args.out, "a", encoding="utf-8") as f:
+        for sc in scenarios:
+            for n in sizes:
+                log(f"{sc} N={n}…")
+                res = run_one(sc, n, args.verbose)
+                res["run_id"] = run_id
+                f.write(json.dumps(res, ensure_ascii=False) + "\n")
+                f.flush()
+                if "error" in res:
+                    warn(f"{sc} N={n} falhou: {res['error']}")
+                    continue
+                if "skipped" in res:
+                    warn(f"{sc} N={n} pulado: {res['skipped']}")
+                    continue
+                extra = {"sync": lambda: f"api_calls={res['api_calls']}",
+                         "details": lambda: f"portal_requests={res['portal_requests']} salvos={res['events_saved']}",
+                         }.get(sc, lambda: f"webdriver={res['webdriver_commands']} "
+                                           f"firefox_rss={res['firefox_peak_rss_mb']}MB")()
+                log(f"{sc} N={n}: {res['wall_s']}s, {extra}, rss={res['peak_rss_mb']}MB")
+                if res.get("field_mismatches"):
+                    warn(f"{sc} N={n}: {res['field_mismatches']} campo(s) divergente(s), ex.: {res['mismatch_examples']}")
+                    found.append((sc, n, "field_mismatches"))
+                for r in regressions(res, base):
+                    warn(f"Regressão {sc} N={n}: {r}")
+                    found.append((sc, n, r))
+    log(f"Resultados em {args.out}")
+    return 1 if found else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,24 @@
 import os, json, time, traceback, re, unicodedata
 from datetime import datetime, timedelta
 
-from dotenv import load_dotenv
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.firefox.options import Options as FFOptions
 
+import ff_profile
+import lean_profile
+import metrics
+import preflight
+
 # =========================
 # Config / env
 # =========================
-load_dotenv()
+# O .env é lido pelo main.py antes de importar o bot; aqui só na execução direta
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
 
 BITRIX_URL  = os.getenv("BITRIX_URL", "").strip().strip('"')
 BITRIX_USER = os.getenv("BITRIX_USER", "").strip().strip('"')
@@ -19,22 +26,48 @@ BITRIX_PASS = os.getenv("BITRIX_PASS", "").strip().strip('"')
 HEADLESS    = os.getenv("HEADLESS", "true").lower() == "true"
 ENV_TZ      = os.getenv("TZ", "America/Sao_Paulo")
 
+# TTL do cache de enriquecimento (slider): eventos completos mais novos que isso não são reabertos
+ENRICH_TTL_HOURS = float(os.getenv("ENRICH_TTL_HOURS", "24"))
+
+# Carga do painel de notificações: rola enquanto surgirem itens novos
+NOTIF_MAX_ITEMS = int(os.getenv("NOTIF_MAX_ITEMS", "500"))
+NOTIF_MAX_PAGES = int(os.getenv("NOTIF_MAX_PAGES", "50"))
+NOTIF_SETTLE_MS = int(os.getenv("NOTIF_SETTLE_MS", "1500"))
+# Marca d'água do painel: para de rolar/colher ao chegar nas notificações já vistas;
+# a cada NOTIF_FULL_SWEEP_H horas uma varredura completa pega edições antigas
+NOTIF_HWM          = os.getenv("NOTIF_HWM", "true").lower() == "true"
+NOTIF_HWM_KEEP     = int(os.getenv("NOTIF_HWM_KEEP", "20"))
+NOTIF_FULL_SWEEP_H = float(os.getenv("NOTIF_FULL_SWEEP_H", "24"))
+
+# Backend de detalhes: "slider" (clica na UI), "http" (GET com cookies da sessão)
+# ou "tabs" (K abas na mesma sessão); nos dois últimos o que falhar segue pelo slider
+DETAILS_BACKEND      = os.getenv("DETAILS_BACKEND", "slider").strip().lower()
+HTTP_DETAILS_WORKERS = int(os.getenv("HTTP_DETAILS_WORKERS", "8"))
+HTTP_DETAILS_TIMEOUT = float(os.getenv("HTTP_DETAILS_TIMEOUT", "15"))
+TAB_POOL_SIZE        = max(1, int(os.getenv("TAB_POOL_SIZE", "4")))
+TAB_STALL_S          = float(os.getenv("TAB_STALL_S", "20"))   # aba sem resposta → evento vai para o serial
+# Espera total pela descrição no slider (todos os candidatos numa consulta só)
+DESC_WAIT_S          = float(os.getenv("DESC_WAIT_S", "3"))
+
 # FRASE-ALVO: só salvar notificações que contenham isso (case/acento-insensitive)
 TARGET_PHRASE = "você concordou em participar do evento"
 
-try:
-    from zoneinfo import ZoneInfo
-    NOW = datetime.now(ZoneInfo(ENV_TZ))
-except Exception:
-    NOW = datetime.now()
+def now_local():
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo(ENV_TZ))
+    except Exception:
+        return datetime.now()
 
 ROOT_DIR    = os.getcwd()
 OUT_DIR     = os.path.join(ROOT_DIR, "out")
 PROFILE_DIR = os.path.join(OUT_DIR, "ff-profile")
 SEL_PATH    = os.path.join(ROOT_DIR, "selectors.json")
 
-os.makedirs(OUT_DIR, exist_ok=True)
-os.makedirs(PROFILE_DIR, exist_ok=True)
+# Nada de I/O no import: diretórios e selectors.json só quando o scrape roda
+def ensure_dirs():
+    os.makedirs(OUT_DIR, exist_ok=True)
+    os.makedirs(PROFILE_DIR, exist_ok=True)
 
 # =========================
 # Selectors.json
@@ -42,10 +75,17 @@ os.makedirs(PROFILE_DIR, exist_ok=True)
 def load_selectors(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
-selectors = load_selectors(SEL_PATH)
+
+_selectors = None
+
+def get_selectors() -> dict:
+    global _selectors
+    if _selectors is None:
+        _selectors = load_selectors(SEL_PATH)
+    return _selectors
 
 def sget(*keys, default=""):
-    cur = selectors
+    cur = get_selectors()
     for k in keys:
         cur = cur.get(k, {})
     return cur if isinstance(cur, str) else default
@@ -79,7 +119,8 @@ URL_RE = re.compile(r"https?://[^\s<>\"']+", re.I)
 # =========================
 # Selenium / Firefox
 # =========================
-def make_driver():
+def make_driver(profile_dir=None):
+    """`profile_dir`: clone em tmpfs (PROFILE_MODE=tmpfs); sem ele usa o perfil persistente."""
     opts = FFOptions()
     if HEADLESS:
         os.environ["MOZ_HEADLESS"] = "1"
@@ -88,9 +129,13 @@ def make_driver():
         opts.set_preference("permissions.default.image", 2)
         opts.set_preference("dom.ipc.reportProcessHangs", False)
 
+    if lean_profile.LEAN_PROFILE:
+        lean_profile.apply_lean(opts, OUT_DIR)
+
     # Perfil persistente (cookies/sessão)
+    ensure_dirs()
     opts.add_argument("-profile")
-    opts.add_argument(PROFILE_DIR)
+    opts.add_argument(profile_dir or PROFILE_DIR)
 
     return webdriver.Firefox(options=opts)
 
@@ -144,26 +189,138 @@ def login_flow(driver, wait):
 # =========================
 EVENT_ID_RE = re.compile(r"[?&]EVENT_ID=(\d+)\b", re.I)
 
-def open_notifications(driver, wait):
+# Rola o painel e espera (MutationObserver) por itens novos; encerra quando a
+# lista fica estável por settleMs ou quando bate o limite de itens/páginas.
+# Chave estável de um item do painel: atributo de id (selectors.json
+# "notifications.key_attrs"). Sem ele a chave é vazia: o item nunca vira marca
+# nem para a coleta (link + título se repete quando o mesmo evento volta ao topo).
+NOTIF_KEY_JS = """
+const keyOf = (el, keyAttrs) => {
+  for (const attr of keyAttrs) { const v = el.getAttribute(attr); if (v) return attr + ':' + v; }
+  return '';
+};
+"""
+
+# Com marca d'água, para ao achar um item já visto (só testa os itens novos de cada página).
+LOAD_NOTIFICATIONS_JS = NOTIF_KEY_JS + """
+const root = arguments[0], itemSel = arguments[1], maxItems = arguments[2],
+      maxPages = arguments[3], settleMs = arguments[4], keyAttrs = arguments[5],
+      mark = new Set(arguments[6]), done = arguments[arguments.length - 1];
+const count = () => root.querySelectorAll(itemSel).length;
+let last = count(), scrolls = 0, pages = 0, timer = null, finished = false, checked = 0;
+const hitMark = () => {
+  if (!mark.size) return false;
+  const els = root.querySelectorAll(itemSel);
+  for (; checked < els.length; checked++) if (mark.has(keyOf(els[checked], keyAttrs))) return true;
+  return false;
+};
+const finish = (reason) => {
+  if (finished) return;
+  finished = true; obs.disconnect(); clearTimeout(timer);
+  done({items: count(), pages: pages, scrolls: scrolls, reason: reason});
+};
+const step = () => {
+  if (hitMark()) return finish('high_water');
+  if (count() >= maxItems) return finish('max_items');
+  if (scrolls >= maxPages) return finish('max_pages');
+  root.scrollTop = root.scrollHeight; scrolls++;
+  clearTimeout(timer); timer = setTimeout(() => finish('stable'), settleMs);
+};
+const obs = new MutationObserver(() => {
+  const n = count();
+  if (n > last) { last = n; pages++; step(); }
+});
+obs.observe(root, {childList: true, subtree: true});
+step();
+"""
+
+NOTIF_KEY_ATTRS_DEFAULT = ["data-id", "data-notify-id"]
+
+def notif_key_attrs() -> list:
+    """notifications.key_attrs do selectors.json: lista ou string separada por vírgula."""
+    raw = (get_selectors().get("notifications") or {}).get("key_attrs")
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    if isinstance(raw, list):
+        attrs = [a.strip() for a in raw if isinstance(a, str) and a.strip()]
+        if attrs:
+            return attrs
+    return list(NOTIF_KEY_ATTRS_DEFAULT)
+
+def load_all_notifications(driver, root, item_sel, mark=()):
+    """
+    Carrega o histórico do painel rolando só enquanto chegam itens novos e,
+    com `mark` (chaves já vistas), só até chegar nelas.
+    Retorna {"items", "pages", "scrolls", "reason"}.
+    """
+    mark = list(mark or ())
+    budget_s = (NOTIF_MAX_PAGES + 2) * NOTIF_SETTLE_MS / 1000.0 + 5
+    try:
+        prev_timeout_s = driver.timeouts.script
+    except Exception:
+        prev_timeout_s = 30          # padrão do WebDriver
+    try:
+        driver.set_script_timeout(budget_s)
+        return driver.execute_async_script(
+            LOAD_NOTIFICATIONS_JS, root, item_sel, NOTIF_MAX_ITEMS, NOTIF_MAX_PAGES, NOTIF_SETTLE_MS,
+            notif_key_attrs(), mark
+        ) or {}
+    except Exception as e:
+        log_warn(f"Carga assíncrona falhou ({e}); usando polling.")
+    finally:
+        # o driver é reaproveitado (daemon): o orçamento da carga não vale para os outros scripts
+        try:
+            driver.set_script_timeout(prev_timeout_s)
+        except Exception:
+            pass
+
+    # Fallback: polling da contagem de itens com um único script por rodada
+    count_js = "arguments[0].scrollTop = arguments[0].scrollHeight; return arguments[0].querySelectorAll(arguments[1]).length;"
+    mark_js = NOTIF_KEY_JS + """
+        const mark = new Set(arguments[3]);
+        return Array.from(arguments[0].querySelectorAll(arguments[1]))
+                    .some(el => mark.has(keyOf(el, arguments[2])));"""
+    last = driver.execute_script("return arguments[0].querySelectorAll(arguments[1]).length;", root, item_sel)
+    pages = scrolls = 0
+    reason = "max_pages"
+    while scrolls < NOTIF_MAX_PAGES:
+        if mark and driver.execute_script(mark_js, root, item_sel, notif_key_attrs(), mark):
+            reason = "high_water"; break
+        if last >= NOTIF_MAX_ITEMS:
+            reason = "max_items"; break
+        n = driver.execute_script(count_js, root, item_sel); scrolls += 1
+        deadline = time.monotonic() + NOTIF_SETTLE_MS / 1000.0
+        while n <= last and time.monotonic() < deadline:
+            time.sleep(0.1)
+            n = driver.execute_script("return arguments[0].querySelectorAll(arguments[1]).length;", root, item_sel)
+        if n <= last:
+            reason = "stable"; break
+        last, pages = n, pages + 1
+    return {"items": last, "pages": pages, "scrolls": scrolls, "reason": reason}
+
+def open_notifications(driver, wait, mark=()):
     icon_sel = sget("notifications", "icon", default='[class*="--o-notification"]')
     log(f"Abrindo painel de notificações… ({icon_sel})")
     icon = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, icon_sel)))
     icon.click()
 
     root_sel = sget("notifications", "root", default=".bx-im-content-notification__elements")
+    item_sel = sget("notifications", "item", default=".bx-im-content-notification-item__container")
     wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, root_sel)))
 
-    # scroll para tentar carregar tudo
+    # rola enquanto surgirem itens novos
+    info = {}
     try:
         root = driver.find_element(By.CSS_SELECTOR, root_sel)
-        for _ in range(4):
-            driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight;", root)
-            time.sleep(0.4)
-    except:
-        pass
+        info = load_all_notifications(driver, root, item_sel, mark)
+        log(f"Notificações carregadas: {info.get('items')} itens em {info.get('pages')} página(s) "
+            f"({info.get('scrolls')} rolagens, parada: {info.get('reason')}).")
+    except Exception as e:
+        log_warn(f"Não foi possível rolar o painel: {e}")
 
     driver.save_screenshot(os.path.join(OUT_DIR, "notifications.png"))
     log_ok("Painel de notificações aberto.")
+    return info
 
 def parse_from_notification_text(txt: str):
     """
@@ -181,43 +338,88 @@ def parse_from_notification_text(txt: str):
         return "", ""
     return f"{d:02d}/{mes:02d}/{a}", hhmm
 
-def collect_calendar_notifications(driver, include_we=True):
+# Uma única ida ao navegador: devolve os links de agenda com o texto do card
+# (painel é do mais novo para o mais antigo: para no primeiro item da marca) e
+# as chaves dos primeiros itens, que viram a próxima marca d'água.
+HARVEST_NOTIFICATIONS_JS = NOTIF_KEY_JS + """
+const root = document.querySelector(arguments[0]);
+const scope = root || document;
+const anchors = scope.querySelectorAll(arguments[1]);
+const itemSel = arguments[2], keyAttrs = arguments[3], mark = new Set(arguments[4]), keep = arguments[5];
+const out = [];
+let stopped = false;
+for (let i = 0; i < anchors.length; i++) {
+  const a = anchors[i];
+  const card = a.closest(itemSel);
+  if (card && mark.size && mark.has(keyOf(card, keyAttrs))) { stopped = true; break; }
+  const title = a.textContent || "";
+  out.push({href: a.href || "", title: title, card_text: card ? card.innerText : title, index: i});
+}
+const top = Array.from(scope.querySelectorAll(itemSel)).slice(0, keep)
+                 .map(el => keyOf(el, keyAttrs)).filter(k => k);
+return {in_root: !!root, items: out, stopped: stopped, top_keys: top};
+"""
+
+def collect_calendar_notifications(driver, mark=(), info=None):
+    """
+    Notificações de agenda com a frase-alvo, da mais nova até a marca d'água
+    (`mark`). Se `info` (dict) for passado, recebe "top_keys" e "stopped".
+    """
     root_sel = sget("notifications", "root",  default=".bx-im-content-notification__elements")
     link_sel = sget("notifications", "link_selector", default='a[href*="/calendar/?EVENT_ID="]')
     item_sel = sget("notifications", "item", default=".bx-im-content-notification-item__container")
-    item_cls = item_sel.strip(".")
 
-    try:
-        root = driver.find_element(By.CSS_SELECTOR, root_sel)
-        anchors = root.find_elements(By.CSS_SELECTOR, link_sel)
-    except Exception:
+    harvest = driver.execute_script(HARVEST_NOTIFICATIONS_JS, root_sel, link_sel, item_sel,
+                                    notif_key_attrs(), list(mark or ()), NOTIF_HWM_KEEP) or {}
+    if info is not None:
+        info["top_keys"] = harvest.get("top_keys") or []
+        info["stopped"] = bool(harvest.get("stopped"))
+    if not harvest.get("in_root"):
         log_warn("Contêiner de notificações não encontrado; procurando no DOM inteiro…")
-        anchors = driver.find_elements(By.CSS_SELECTOR, link_sel)
 
     results = []
     target_norm = _norm(TARGET_PHRASE)
-    for a in anchors:
-        href  = a.get_attribute("href") or ""
-        title = a.get_attribute("textContent") or a.text or ""
+    for it in harvest.get("items") or []:
+        href = it.get("href") or ""
         m = EVENT_ID_RE.search(href)
         if not m:
             continue
-
-        try:
-            card = a.find_element(By.XPATH, f'ancestor::*[contains(@class,"{item_cls}")]')
-            full_text = card.text or ""
-        except Exception:
-            full_text = title
-
+        full_text = it.get("card_text") or it.get("title") or ""
         if target_norm not in _norm(full_text):
             continue
-
-        rec = {"title": title.strip(), "id": m.group(1), "url": href, "full_text": full_text}
-        if include_we:
-            rec["_we"] = a
-        results.append(rec)
+        results.append({
+            "title": (it.get("title") or "").strip(),
+            "id": m.group(1),
+            "url": href,
+            "full_text": full_text,
+            "index": it.get("index"),
+        })
     return results
 
+# Link de uma notificação pelo EVENT_ID (compara o parâmetro da URL, sem regex):
+# tenta primeiro o índice da coleta e depois varre os links do painel.
+RESOLVE_NOTIFICATION_JS = """
+const scope = document.querySelector(arguments[0]) || document;
+const anchors = scope.querySelectorAll(arguments[1]);
+const id = String(arguments[3]);
+const idOf = (a) => {
+  try { return new URL(a.href, document.baseURI).searchParams.get('EVENT_ID'); } catch (e) { return null; }
+};
+const a = anchors[arguments[2]];
+if (a && idOf(a) === id) return a;
+for (const b of anchors) { if (idOf(b) === id) return b; }
+return null;
+"""
+
+def resolve_notification_element(driver, rec):
+    """
+    Resolve sob demanda o WebElement do link de uma notificação (só para quem
+    precisa de clique): tenta pelo índice da coleta e confere o EVENT_ID.
+    """
+    root_sel = sget("notifications", "root",  default=".bx-im-content-notification__elements")
+    link_sel = sget("notifications", "link_selector", default='a[href*="/calendar/?EVENT_ID="]')
+    return driver.execute_script(RESOLVE_NOTIFICATION_JS, root_sel, link_sel, rec.get("index") or 0, rec["id"])
+
 def parse_time_text(text: str):
     t = " ".join(text.split()).lower()
     hhmm = re.findall(r"\b(\d{1,2}:\d{2})\b", t)
@@ -231,7 +433,7 @@ def parse_time_text(text: str):
         if mes:
             return f"{d:02d}/{mes:02d}/{a}", inicio, termino
 
-    base = NOW.date()
+    base = now_local().date()
     if "depois de amanhã" in t:
         base = base + timedelta(days=2)
     elif "amanhã" in t:
@@ -243,21 +445,35 @@ def parse_time_text(text: str):
 
     return base.strftime("%d/%m/%Y"), inicio, termino
 
+CLOSE_SELECTORS = [".side-panel-close",
+                   ".calendar-slider-header .ui-btn-close",
+                   ".side-panel-pin-close"]
+
+_resolver = None
+
+def get_resolver():
+    """Estatísticas de seletores + cache negativo (out/selector_stats.json)."""
+    global _resolver
+    if _resolver is None:
+        from selector_resolver import SelectorResolver
+        _resolver = SelectorResolver(os.path.join(OUT_DIR, "selector_stats.json"))
+    return _resolver
+
 def close_slider_if_open(driver):
     try:
-        for sel in [".side-panel-close",
-                    ".calendar-slider-header .ui-btn-close",
-                    ".side-panel-pin-close"]:
-            btns = driver.find_elements(By.CSS_SELECTOR, sel)
-            if btns:
-                try:
-                    btns[0].click()
-                    WebDriverWait(driver, 5).until_not(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".calendar-slider-workarea"))
-                    )
-                    return
-                except Exception:
-                    pass
+        slider_sel = sget("event_view", "slider_root", default=".calendar-slider-workarea")
+        if not driver.find_elements(By.CSS_SELECTOR, slider_sel):
+            return
+        _, btn = get_resolver().probe(driver, "close_btn", CLOSE_SELECTORS)
+        if btn is None:
+            return
+        try:
+            btn.click()
+        except Exception:
+            driver.execute_script("arguments[0].click();", btn)
+        WebDriverWait(driver, 5).until_not(
+            EC.presence_of_element_located((By.CSS_SELECTOR, slider_sel))
+        )
     except Exception:
         pass
 
@@ -291,9 +507,20 @@ def _extract_detail_text(driver, desc_el):
     # 3) Sem URL: retorna o texto (limpo de espaços múltiplos)
     return " ".join(raw.split())
 
-def click_and_extract_details(driver, wait, link_element):
+def desc_selectors():
+    sels = [
+        sget("event_view", "desc", default=""),
+        "#calendar-slider-detail-description",
+        ".calendar-slider-detail-description",
+        "[id*='slider'][id*='detail'][id*='description']",
+        "[class*='slider'][class*='detail'][class*='description']",
+    ]
+    return [s for s in sels if s]  # remove vazios
+
+def click_and_extract_details(driver, wait, link_element, event_id=None):
     """
     Abre o slider do evento, lê data/horário e descrição, fecha o slider ao final.
+    Com `event_id`, um evento já visto sem descrição não espera por ela de novo.
     """
     close_slider_if_open(driver)
 
@@ -312,125 +539,502 @@ def click_and_extract_details(driver, wait, link_element):
     log(f"Detalhe do evento (texto horário): {time_text}")
 
     # ===== CAPTURA ROBUSTA DA DESCRIÇÃO =====
-    descricao = ""
-    desc_selectors = [
-        sget("event_view", "desc", default=""),
-        "#calendar-slider-detail-description",
-        ".calendar-slider-detail-description",
-        "[id*='slider'][id*='detail'][id*='description']",
-        "[class*='slider'][class*='detail'][class*='description']",
-    ]
-    desc_selectors = [s for s in desc_selectors if s]  # remove vazios
-
-    for css in desc_selectors:
-        try:
-            # espera curto; alguns eventos não têm descrição
-            desc_el = WebDriverWait(driver, 3).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, css))
-            )
-            descricao = _extract_detail_text(driver, desc_el)
-            if descricao:
-                break
-        except Exception:
-            continue
+    # todos os candidatos numa consulta JS, o que mais acertou primeiro; evento
+    # já sabido sem descrição só faz uma checagem imediata
+    res = get_resolver()
+    absent = event_id is not None and res.is_absent("desc", event_id)
+    _, desc_el = res.probe(driver, "desc", desc_selectors(),
+                           timeout=0.0 if absent else DESC_WAIT_S, need_content=True)
+    descricao = _extract_detail_text(driver, desc_el) if desc_el is not None else ""
+    if event_id is not None:
+        if descricao:
+            res.clear_absent("desc", event_id)
+        else:
+            res.mark_absent("desc", event_id)
 
     data, inicio, termino = parse_time_text(time_text)
     close_slider_if_open(driver)
     return {"data": data, "inicio": inicio, "termino": termino, "descricao": descricao}
 
+def fetch_details_http(driver, notifs):
+    """
+    Exporta os cookies do WebDriver uma vez e busca a página de cada evento
+    em paralelo. Retorna {id: detalhes} só para os que vieram completos;
+    os demais seguem pelo slider.
+    """
+    from http_details import make_session, fetch_all, parse_event_html
+
+    time_sel = sget("event_view", "time_text", default=".calendar-slider-sidebar-head-title")
+    sels = get_resolver().order("desc", desc_selectors())
+    try:
+        ua = driver.execute_script("return navigator.userAgent;") or ""
+    except Exception:
+        ua = ""
+    session = make_session(driver.get_cookies(), ua, pool_size=HTTP_DETAILS_WORKERS)
+    try:
+        res = fetch_all(
+            session,
+            [(n["id"], n["url"]) for n in notifs],
+            lambda html, eid: parse_event_html(html, time_sel, sels, parse_time_text, URL_RE, event_id=eid),
+            workers=HTTP_DETAILS_WORKERS,
+            timeout=HTTP_DETAILS_TIMEOUT,
+            is_login_page=lambda html: "b24net-login-enter-form" in html,
+        )
+    finally:
+        session.close()
+
+    out = {}
+    for eid, det in res.items():
+        if isinstance(det, Exception):
+            log_warn(f"HTTP falhou para ID={eid}: {det} (fallback: slider)")
+        elif det.get("data") and det.get("inicio"):
+            out[eid] = det
+        else:
+            log_warn(f"HTTP sem data/horário para ID={eid} (fallback: slider)")
+    log_ok(f"Detalhes via HTTP: {len(out)}/{len(notifs)}")
+    return out
+
+# Pronto quando a aba já está na página do EVENT_ID pedido (a anterior da aba
+# reaproveitada segue no ar até a navegação efetivar) e o JSON desse ID ou o
+# cabeçalho de data/hora já veio; devolve o HTML renderizado, "LOGIN" se a
+# sessão caiu, ou null se ainda carregando.
+TAB_READY_JS = r"""
+const sel = arguments[0], id = String(arguments[1]);
+if (document.querySelector('.b24net-login-enter-form')) return 'LOGIN';
+let here = null;
+try { here = new URL(location.href).searchParams.get('EVENT_ID'); } catch (e) {}
+if (here !== id) return null;
+const html = document.documentElement.outerHTML;
+if (new RegExp('"ID"\\s*:\\s*"?' + id + '(?!\\w)').test(html)) return html;
+const el = sel ? document.querySelector(sel) : null;
+if (el && el.textContent.trim() && document.readyState !== 'loading') return html;
+return null;
+"""
+
+def fetch_details_tabs(driver, notifs):
+    """
+    Abre TAB_POOL_SIZE abas na sessão logada, navega cada uma direto para a URL
+    do evento e verifica as abas em round-robin, lendo cada uma assim que fica
+    pronta (as esperas de rede se sobrepõem). Aba que passar de TAB_STALL_S
+    devolve o evento para a extração serial. Retorna {id: detalhes}.
+    """
+    from http_details import parse_event_html
+
+    time_sel = sget("event_view", "time_text", default=".calendar-slider-sidebar-head-title")
+    sels = get_resolver().order("desc", desc_selectors())
+    main_handle = driver.current_window_handle
+    pending = list(notifs)
+    tabs = {}          # handle -> (notif, t_inicio) ou None (livre)
+    out, stalled = {}, 0
+
+    def _assign(handle):
+        n = pending.pop(0)
+        driver.switch_to.window(handle)
+        # location.href não bloqueia como driver.get → as abas carregam em paralelo
+        driver.execute_script("window.location.href = arguments[0];", n["url"])
+        tabs[handle] = (n, time.monotonic())
+
+    try:
+        for _ in range(min(TAB_POOL_SIZE, len(pending))):
+            driver.switch_to.new_window("tab")
+            _assign(driver.current_window_handle)
+
+        while tabs:
+            progressed = False
+            for handle in list(tabs):
+                n, t0 = tabs[handle]
+                try:
+                    driver.switch_to.window(handle)
+                    html = driver.execute_script(TAB_READY_JS, time_sel, n["id"])
+                except Exception as e:
+                    log_warn(f"Aba perdida no evento ID={n['id']}: {e}")
+                    tabs.pop(handle)
+                    continue
+                if html == "LOGIN":
+                    raise RuntimeError("sessão expirada (página de login nas abas)")
+                if html is None:
+                    if time.monotonic() - t0 < TAB_STALL_S:
+                        continue
+                    stalled += 1
+                    log_warn(f"Aba travada no evento ID={n['id']} (>{TAB_STALL_S:.0f}s); vai para o serial.")
+                else:
+                    det = parse_event_html(html, time_sel, sels, parse_time_text, URL_RE, event_id=n["id"])
+                    if det.get("data") and det.get("inicio"):
+                        out[n["id"]] = det
+                    else:
+                        log_warn(f"Aba sem data/horário para ID={n['id']} (fallback: slider)")
+                progressed = True
+                if pending:
+                    _assign(handle)
+                else:
+                    tabs.pop(handle)
+            if not progressed:
+                time.sleep(0.25)
+    finally:
+        for handle in list(driver.window_handles):
+            if handle != main_handle:
+                try:
+                    driver.switch_to.window(handle)
+                    driver.close()
+                except Exception:
+                    pass
+        driver.switch_to.window(main_handle)
+    metrics.inc("tabs_stalled", stalled)
+    log_ok(f"Detalhes via abas ({TAB_POOL_SIZE}): {len(out)}/{len(notifs)} | travadas: {stalled}")
+    return out
+
 # =========================
 # Persistência
 # =========================
+EVENTS_DB   = os.path.join(OUT_DIR, "events.sqlite")
 EVENTS_JSON = os.path.join(OUT_DIR, "events.json")
 EVENTS_PY   = os.path.join(OUT_DIR, "events.py")
 
-def load_existing_events():
-    if not os.path.exists(EVENTS_JSON):
-        return []
+# Retenção do store (dias após a data do evento; 0 = nunca apagar) e export automático do JSON legado
+EVENTS_RETENTION_DAYS = int(os.getenv("EVENTS_RETENTION_DAYS", "90"))
+EXPORT_EVENTS_JSON    = os.getenv("EXPORT_EVENTS_JSON", "false").lower() == "true"
+
+def open_events_store():
+    """Abre out/events.sqlite (importa o events.json legado na primeira vez)."""
+    from event_store import open_store
+    ensure_dirs()
+    return open_store(EVENTS_DB, EVENTS_JSON)
+
+def save_events(store, new_items=()):
+    """
+    Upsert dos eventos extraídos + retenção; exporta events.json só se
+    configurado. No scrape os eventos já foram gravados por checkpoint e
+    `new_items` vem vazio: só retenção/exportação.
+    """
+    n = store.upsert_many(new_items) if new_items else 0
+    pruned = store.prune(EVENTS_RETENTION_DAYS)
+    msg = f"Store atualizado: {n} upsert(s), {pruned} removido(s) pela retenção, {store.count()} no total."
+    if EXPORT_EVENTS_JSON:
+        store.export_json(EVENTS_JSON, EVENTS_PY)
+        msg += " events.json / events.py exportados."
+    log_ok(msg)
+
+def export_events():
+    """Gera out/events.json e out/events.py a partir do store (compatibilidade)."""
+    store = open_events_store()
     try:
-        with open(EVENTS_JSON, "r", encoding="utf-8") as f:
+        n = store.export_json(EVENTS_JSON, EVENTS_PY)
+    finally:
+        store.close()
+    log_ok(f"events.json / events.py exportados ({n} itens).")
+    return n
+
+# Cache de enriquecimento: EVENT_ID -> epoch da última extração completa do slider
+ENRICH_CACHE = os.path.join(OUT_DIR, "enrich_cache.json")
+# durante o loop o cache é regravado a cada N eventos (e sempre ao sair); perder
+# o trecho final num crash só faz esses eventos passarem pelo slider de novo
+ENRICH_CACHE_FLUSH_EVERY = max(1, int(os.getenv("ENRICH_CACHE_FLUSH_EVERY", "20")))
+
+def load_enrich_cache():
+    try:
+        with open(ENRICH_CACHE, "r", encoding="utf-8") as f:
             data = json.load(f)
-        return data if isinstance(data, list) else []
+        return data if isinstance(data, dict) else {}
     except Exception:
-        return []
-
-def merge_events(existing, new_items):
-    """Mescla por 'id'. Mantém valores antigos quando o novo vier vazio."""
-    by_id = {str(e.get("id")): e for e in existing}
-    for n in new_items:
-        k = str(n.get("id"))
-        if k in by_id:
-            cur = by_id[k]
-            for key in ["titulo","link","data","inicio","termino","descricao"]:
-                val = n.get(key)
-                if val:
-                    cur[key] = val
-        else:
-            by_id[k] = n
-    return list(by_id.values())
+        return {}
+
+def write_enrich_cache(cache):
+    with open(ENRICH_CACHE, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+
+# Fila de retry do slider (no events.sqlite): backoff exponencial por evento que falhou
+SCRAPE_RETRY_BASE_MIN = float(os.getenv("SCRAPE_RETRY_BASE_MIN", "30"))
+SCRAPE_RETRY_MAX_H    = float(os.getenv("SCRAPE_RETRY_MAX_H", "24"))
+
+def scrape_retry_delay(attempts: int) -> float:
+    """Segundos até a próxima tentativa do slider após `attempts` falhas."""
+    return min(SCRAPE_RETRY_MAX_H * 3600, SCRAPE_RETRY_BASE_MIN * 60 * (2 ** (attempts - 1)))
+
+def is_enriched(ev) -> bool:
+    return bool(ev and all(ev.get(k) for k in ("data", "inicio", "termino")))
 
-def write_events_files(events_list):
-    with open(EVENTS_JSON, "w", encoding="utf-8") as f:
-        json.dump(events_list, f, ensure_ascii=False, indent=2)
-    py_content = "EVENTS = " + json.dumps(events_list, ensure_ascii=False, indent=2) + "\n"
-    with open(EVENTS_PY, "w", encoding="utf-8") as f:
-        f.write(py_content)
-    log_ok(f"events.json / events.py salvos ({len(events_list)} itens).")
+def is_fresh(cache, event_id, existing_ev, now_ts=None) -> bool:
+    """Evento já completo no store e extraído há menos de ENRICH_TTL_HOURS."""
+    ts = cache.get(str(event_id))
+    if not ts or not is_enriched(existing_ev):
+        return False
+    now_ts = now_ts if now_ts is not None else time.time()
+    return (now_ts - float(ts)) < ENRICH_TTL_HOURS * 3600
+
+# Marca d'água do painel: chaves das notificações do topo no último run bem-sucedido
+def _hwm_path():
+    return os.path.join(OUT_DIR, "notif_hwm.json")
+
+def load_hwm() -> dict:
+    try:
+        with open(_hwm_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+def notif_mark(force_refresh=False, retry_due=False):
+    """(chaves da marca, motivo) — chaves vazias = varredura completa."""
+    hwm = load_hwm()
+    if not NOTIF_HWM:
+        return [], "NOTIF_HWM=false"
+    if force_refresh:
+        return [], "force_refresh"
+    if retry_due:
+        # eventos da fila de retry do slider ficam abaixo da marca
+        return [], "fila de retry com eventos vencidos"
+    # marcas antigas guardavam link + título para itens sem atributo de id
+    keys = [k for k in hwm.get("keys") or [] if not str(k).startswith("href:")]
+    if not keys:
+        return [], "sem marca"
+    if time.time() - float(hwm.get("last_full_sweep") or 0) >= NOTIF_FULL_SWEEP_H * 3600:
+        return [], f"varredura completa periódica ({NOTIF_FULL_SWEEP_H:g} h)"
+    return keys, ""
+
+def save_hwm(top_keys, full_sweep: bool):
+    """Só depois de um run bem-sucedido: a marca nunca passa de itens não processados."""
+    hwm = load_hwm()
+    if top_keys:
+        hwm["keys"] = list(top_keys)
+    hwm["updated_at"] = time.time()
+    if full_sweep:
+        hwm["last_full_sweep"] = hwm["updated_at"]
+    tmp = _hwm_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(hwm, f, indent=2)
+    os.replace(tmp, _hwm_path())
+
+# =========================
+# Multi-conta
+# =========================
+def configure_account(user: str, password: str, out_dir: str, profile_dir: str = ""):
+    """
+    Reaponta credenciais e caminhos do módulo para uma conta (usado pelos
+    workers de accounts.py, um processo por conta).
+    """
+    global BITRIX_USER, BITRIX_PASS, OUT_DIR, PROFILE_DIR, EVENTS_DB, EVENTS_JSON, EVENTS_PY, ENRICH_CACHE, _resolver
+    BITRIX_USER, BITRIX_PASS = user, password
+    _resolver = None
+    OUT_DIR      = out_dir
+    PROFILE_DIR  = profile_dir or os.path.join(out_dir, "ff-profile")
+    EVENTS_DB    = os.path.join(OUT_DIR, "events.sqlite")
+    EVENTS_JSON  = os.path.join(OUT_DIR, "events.json")
+    EVENTS_PY    = os.path.join(OUT_DIR, "events.py")
+    ENRICH_CACHE = os.path.join(OUT_DIR, "enrich_cache.json")
+    ensure_dirs()
 
 # =========================
 # Main
 # =========================
-def main():
-    log(f"Headless={HEADLESS} | URL base={BITRIX_URL}")
-    driver = make_driver()
+def driver_alive(driver) -> bool:
+    """True se o WebDriver ainda responde (navegador/sessão geckodriver vivos)."""
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+def start_driver():
+    """
+    Sobe o Firefox (clonando o golden para tmpfs se PROFILE_MODE=tmpfs) e
+    reporta tamanho do perfil e tempo de partida. Devolve (driver, clone|None).
+    """
+    run_profile = None
+    if ff_profile.PROFILE_MODE == "tmpfs":
+        with metrics.phase("profile_clone"):
+            run_profile = ff_profile.prepare(PROFILE_DIR)
+    size_kb = ff_profile.dir_size(run_profile or PROFILE_DIR) // 1024
+    metrics.inc("profile_kb", size_kb)
+    t0 = time.perf_counter()
+    try:
+        with metrics.phase("make_driver"):
+            driver = make_driver(run_profile)
+    except Exception:
+        if run_profile:
+            ff_profile.discard(run_profile)
+        raise
+    log(f"Firefox pronto em {time.perf_counter() - t0:.1f}s (perfil {ff_profile.PROFILE_MODE}, {size_kb} KB)")
+    return driver, run_profile
+
+def _driver_cookies(driver):
+    """Cookies do WebDriver vivo (daemon); None → o preflight lê os do perfil."""
+    if driver is None:
+        return None
+    try:
+        return driver.get_cookies()
+    except Exception:
+        return None
+
+def _log_preflight_rates():
+    r = preflight.rates(OUT_DIR)
+    log(f"Preflight: {r['checks']} checagem(ns) | puladas {r['skips']} ({r['skip_rate']:.0%}) | "
+        f"runs completos {r['checks'] - r['skips']} ({r['full_run_rate']:.0%})")
+
+def _after_full_run(driver, target_url, pf_conf, pf):
+    metrics.inc("full_run")
+    if not preflight.PREFLIGHT:
+        return
+    preflight.record_full_run(target_url, PROFILE_DIR, OUT_DIR, pf_conf, _driver_cookies(driver),
+                              before=(pf or {}).get("signature"))
+    _log_preflight_rates()
+
+def main(force_refresh=False, driver=None, on_event=None):
+    """
+    Executa um ciclo de scrape e devolve o STATUS. Se `driver` for passado
+    (modo daemon), ele é reaproveitado e NÃO é fechado ao final. `on_event`
+    recebe cada evento assim que é enriquecido (pipeline do --all).
+    """
+    log(f"Headless={HEADLESS} | URL base={BITRIX_URL} | force_refresh={force_refresh}")
+    ensure_dirs()
+    target_url = get_selectors().get("login", {}).get("url") or BITRIX_URL
+    pf_conf = get_selectors().get("preflight", {})
+
+    # -------- Preflight: 1 GET com os cookies; sem mudança, nem abre o Firefox --------
+    pf = None
+    if preflight.PREFLIGHT and not force_refresh and target_url:
+        with metrics.phase("preflight"):
+            pf = preflight.check(target_url, PROFILE_DIR, OUT_DIR, pf_conf, _driver_cookies(driver))
+        if pf["skip"]:
+            metrics.inc("preflight_skipped")
+            log_ok(f"Preflight: nada mudou ({pf['reason']}); run completo dispensado.")
+            _log_preflight_rates()
+            print("STATUS=SKIPPED_UNCHANGED")
+            return "SKIPPED_UNCHANGED"
+        log(f"Preflight: run completo ({pf['reason']}).")
+
+    own_driver = driver is None
+    run_profile = None
+    if own_driver:
+        driver, run_profile = start_driver()
+    store = cache = None
+    enriched, finished = [], False
     try:
         wait = WebDriverWait(driver, 35)
 
-        target_url = selectors.get("login", {}).get("url") or BITRIX_URL
         if not target_url:
             raise RuntimeError("URL do Bitrix não definida (ver .env e selectors.json).")
 
         log(f"Abrindo: {target_url}")
-        driver.get(target_url)
+        with metrics.phase("page_load"):
+            driver.get(target_url)
 
-        if on_login_page(driver):
-            log("Tela de login detectada.")
-            login_flow(driver, wait)
-        else:
-            log("Login possivelmente já válido (sessão/cookies).")
+        with metrics.phase("login_flow"):
+            if on_login_page(driver):
+                log("Tela de login detectada.")
+                login_flow(driver, wait)
+            else:
+                log("Login possivelmente já válido (sessão/cookies).")
 
-        log("Aguardando área interna…")
-        WebDriverWait(driver, 40).until(lambda d: is_logged(d))
-        time.sleep(0.5)
+            log("Aguardando área interna…")
+            WebDriverWait(driver, 40).until(lambda d: is_logged(d))
+            time.sleep(0.5)
 
-        # -------- Notificações (filtradas pela frase-alvo) --------
-        open_notifications(driver, wait)
-        notif = collect_calendar_notifications(driver, include_we=True)
+        if lean_profile.LEAN_REPORT:
+            try:
+                rep = lean_profile.record_report(driver, OUT_DIR)
+                saved = f" | economia: {rep['saved_requests']} req, {rep['saved_bytes']} bytes" if "saved_bytes" in rep else ""
+                log(f"Carga da página: {rep['requests']} req, {rep['bytes']} bytes, "
+                    f"pronta em {rep['page_ready_ms']} ms (lean={rep['lean']}){saved}")
+            except Exception as e:
+                log_warn(f"Relatório de recursos indisponível: {e}")
 
-        log_ok(f"Notificações (COM a frase-alvo) encontradas: {len(notif)}")
+        # -------- Notificações (filtradas pela frase-alvo) --------
+        store = open_events_store()
+        now_ts = time.time()
+        retry_due = any(next_at <= now_ts for _, next_at in store.retry_state().values())
+        mark, sweep_reason = notif_mark(force_refresh, retry_due)
+        if sweep_reason:
+            log(f"Painel completo: {sweep_reason}.")
+            metrics.inc("full_sweep")
+        with metrics.phase("open_notifications"):
+            load_info = open_notifications(driver, wait, mark)
+        harvest_info = {}
+        with metrics.phase("collect_calendar_notifications"):
+            notif = collect_calendar_notifications(driver, mark, harvest_info)
+        metrics.inc("matched", len(notif))
+        metrics.inc("notif_loaded", int(load_info.get("items") or 0))
+        if harvest_info.get("stopped"):
+            metrics.inc("high_water_hit")
+
+        log_ok(f"Notificações (COM a frase-alvo) encontradas: {len(notif)}"
+               + (" (novas desde a marca d'água)" if mark else ""))
         for i, n in enumerate(notif, 1):
             print(f"[EVENTO {i}] ID={n['id']} | TÍTULO={n['title']}")
 
-        existing = load_existing_events()
         if not notif:
-            log_warn("Nenhuma notificação com a frase-alvo. Mantendo events.json atual.")
-            write_events_files(existing)
+            save_hwm(harvest_info.get("top_keys"), full_sweep=not mark)
+            _after_full_run(driver, target_url, pf_conf, pf)
+            if mark:
+                log_ok("Nada novo no painel desde o último run.")
+                print("STATUS=NO_NEW_NOTIFICATIONS")
+                return "NO_NEW_NOTIFICATIONS"
+            log_warn("Nenhuma notificação com a frase-alvo. Mantendo eventos atuais.")
             print("STATUS=NO_MATCHED_NOTIFICATIONS_KEEPING_PREVIOUS")
-            return
+            return "NO_MATCHED_NOTIFICATIONS_KEEPING_PREVIOUS"
 
         # Enriquecimento com slider + fallback do texto do card
-        enriched = []
+        existing_by_id = store.get_many(n["id"] for n in notif)
+        cache = load_enrich_cache()
+        cache_hits = 0
+        todo = []
         for idx, n in enumerate(notif, 1):
-            log(f"Extraindo detalhes do evento {idx}/{len(notif)} (ID={n['id']})…")
+            if not force_refresh and is_fresh(cache, n["id"], existing_by_id.get(n["id"])):
+                cache_hits += 1
+                log(f"Evento {idx}/{len(notif)} (ID={n['id']}) já enriquecido (cache); pulando slider.")
+                continue
+            todo.append(n)
+
+        # retoma primeiro o que um run interrompido deixou pendente
+        resumed = set(store.pending_ids())
+        if resumed:
+            todo.sort(key=lambda n: n["id"] not in resumed)
+            n_resumed = sum(1 for n in todo if n["id"] in resumed)
+            log(f"Retomando {n_resumed} evento(s) pendente(s) do run anterior.")
+            metrics.inc("resumed", n_resumed)
+        store.set_pending(n["id"] for n in todo)
+        retry_q = store.retry_state()
+
+        prefetched = {}
+        if DETAILS_BACKEND == "http" and todo:
+            try:
+                with metrics.phase("fetch_details_http"):
+                    prefetched = fetch_details_http(driver, todo)
+            except Exception as e:
+                log_warn(f"Backend HTTP indisponível ({e}); usando slider.")
+        elif DETAILS_BACKEND == "tabs" and todo:
+            try:
+                with metrics.phase("fetch_details_tabs"):
+                    prefetched = fetch_details_tabs(driver, todo)
+            except Exception as e:
+                log_warn(f"Pool de abas indisponível ({e}); usando slider.")
 
+        for idx, n in enumerate(todo, 1):
             fb_data, fb_inicio = parse_from_notification_text(n.get("full_text",""))
             fb_termino = _add_minutes(fb_inicio, 60) if fb_inicio else ""
 
-            details = {}
-            try:
-                details = click_and_extract_details(driver, wait, n["_we"])
-            except Exception as e:
-                log_warn(f"Não foi possível ler slider do evento ID={n['id']}: {e}")
+            details = prefetched.get(n["id"]) or {}
+            slider_tried, slider_error = False, None
+            attempts, next_at = retry_q.get(n["id"], (0, 0))
+            if not details and not force_refresh and next_at > time.time():
+                metrics.inc("retry_deferred")
+                log(f"Evento {idx}/{len(todo)} (ID={n['id']}) na fila de retry ({attempts} falha(s)); "
+                    f"slider adiado até {datetime.fromtimestamp(next_at):%d/%m %H:%M}, usando o card.")
+            elif not details:
+                log(f"Extraindo detalhes do evento {idx}/{len(todo)} (ID={n['id']})…")
+                slider_tried = True
+                try:
+                    link_el = resolve_notification_element(driver, n)
+                    if link_el is None:
+                        raise RuntimeError("link da notificação não encontrado no painel")
+                    with metrics.phase("click_and_extract_details"):
+                        details = click_and_extract_details(driver, wait, link_el, event_id=n["id"])
+                except Exception as e:
+                    if not driver_alive(driver):
+                        # navegador caiu: aborta; os pendentes ficam para o próximo run
+                        raise
+                    metrics.inc("slider_failed")
+                    slider_error = str(e) or type(e).__name__
+                    log_warn(f"Não foi possível ler slider do evento ID={n['id']}: {e}")
 
             data      = details.get("data")      or fb_data    or ""
             inicio    = details.get("inicio")    or fb_inicio  or ""
@@ -446,20 +1050,62 @@ def main():
                 "termino": termino,
                 "descricao": descricao,
             })
-
-        merged = merge_events(existing, enriched)
-        write_events_files(merged)
+            if details.get("data") and details.get("inicio") and details.get("termino"):
+                cache[n["id"]] = time.time()
+                if attempts:
+                    store.retry_clear(n["id"])
+            elif slider_tried:
+                a, nxt = store.retry_fail(n["id"], slider_error or "detalhes incompletos", scrape_retry_delay)
+                log_warn(f"ID={n['id']} na fila de retry (falha {a}); próxima tentativa "
+                         f"em {datetime.fromtimestamp(nxt):%d/%m %H:%M}.")
+            # checkpoint: evento gravado e fora da lista pendente antes do próximo slider
+            store.checkpoint(enriched[-1])
+            if idx % ENRICH_CACHE_FLUSH_EVERY == 0:
+                write_enrich_cache(cache)
+            if on_event is not None:
+                # registro mesclado do store (campo vazio mantém o valor antigo), o mesmo que o sync final lê
+                on_event(store.get_many([n["id"]])[n["id"]])
+
+        log_ok(f"Enriquecidos: {len(enriched)} | cache hits: {cache_hits}")
+        metrics.inc("enriched", len(enriched))
+        metrics.inc("cache_hits", cache_hits)
+        with metrics.phase("save_events"):
+            save_events(store)      # eventos já gravados por checkpoint: só retenção/exportação
+        finished = True
+        save_hwm(harvest_info.get("top_keys"), full_sweep=not mark)
+        _after_full_run(driver, target_url, pf_conf, pf)
         print("STATUS=OK_NOTIFICATIONS_AND_DETAILS")
+        return "OK_NOTIFICATIONS_AND_DETAILS"
 
     except Exception as e:
         log_err(f"Falha no fluxo: {e}")
         traceback.print_exc()
+        if enriched and not finished:
+            log_warn(f"{len(enriched)} evento(s) já gravados por checkpoint; o próximo run retoma os pendentes.")
         print("STATUS=FAIL")
+        return "FAIL"
     finally:
-        try:
-            driver.quit()
-        except Exception:
-            pass
+        if cache is not None:
+            try:
+                write_enrich_cache(cache)
+            except OSError as e:
+                log_warn(f"Falha ao gravar {ENRICH_CACHE}: {e}")
+        if store is not None:
+            store.close()
+        if _resolver is not None:
+            try:
+                _resolver.save()
+                log(f"Seletores → {_resolver.summary('desc')} | {_resolver.summary('close_btn')}")
+            except Exception as e:
+                log_warn(f"Falha ao salvar estatísticas de seletores: {e}")
+        if own_driver:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            if run_profile:
+                with metrics.phase("profile_writeback"):
+                    ff_profile.release(run_profile, PROFILE_DIR)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,140 @@
+# daemon.py
+# Modo daemon: mantém o Firefox logado e o client do Google vivos entre ciclos,
+# disparando scrape+sync conforme a agenda (DAEMON_SCHEDULE, formato cron).
+import os, time, random, signal, traceback
+from datetime import datetime, timedelta
+
+import runlock
+from scheduler import DEFAULT_SCHEDULE, parse_schedule, next_run
+
+DAEMON_SCHEDULE     = os.getenv("DAEMON_SCHEDULE", DEFAULT_SCHEDULE)
+DAEMON_RUN_ON_START = os.getenv("DAEMON_RUN_ON_START", "true").lower() == "true"
+# Após N ciclos seguidos com STATUS=FAIL o navegador é recriado mesmo se responder
+DAEMON_MAX_FAILS    = int(os.getenv("DAEMON_MAX_FAILS", "3"))
+
+def log(m):  print(f"[DAEMON] {m}", flush=True)
+def warn(m): print(f"[!]  {m}", flush=True)
+
+def _now():
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo(os.getenv("TZ", "America/Sao_Paulo")))
+    except Exception:
+        return datetime.now()
+
+class _State:
+    def __init__(self):
+        self.driver = None
+        self.profile = None      # clone em tmpfs do perfil (PROFILE_MODE=tmpfs)
+        self.svc = None
+        self.fails = 0
+        self.stop = False
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def _close_driver(state: _State):
+    import bot
+    import ff_profile
+    _quit(state.driver)
+    if state.profile:
+        ff_profile.release(state.profile, bot.PROFILE_DIR)
+    state.driver, state.profile = None, None
+
+def run_cycle(state: _State, force_refresh=False, reqs=None):
+    import metrics
+
+    metrics.start_run("daemon_cycle")
+    if reqs:
+        # disparos externos (cron/manual) que chegaram com o daemon no lock
+        metrics.observe("queue_delay", time.time() - min(r["requested_at"] for r in reqs))
+        metrics.inc("coalesced", sum(r.get("count", 1) for r in reqs))
+    try:
+        status = _cycle(state, force_refresh)
+    except Exception:
+        metrics.finish("FAIL")
+        raise
+    metrics.finish(status)
+    return status
+
+def _cycle(state: _State, force_refresh=False):
+    import bot
+    import sync_gcal
+
+    # --- navegador: recria só se morreu ou vem falhando seguidamente ---
+    if state.driver is not None and (not bot.driver_alive(state.driver) or state.fails >= DAEMON_MAX_FAILS):
+        warn("Navegador morto ou falhando; recriando WebDriver.")
+        _close_driver(state)
+        state.fails = 0
+    if state.driver is None:
+        log("Iniciando Firefox…")
+        state.driver, state.profile = bot.start_driver()
+
+    status = bot.main(force_refresh=force_refresh, driver=state.driver)
+    state.fails = state.fails + 1 if status == "FAIL" else 0
+    if state.profile and status != "FAIL":
+        # cookies renovados vão para o golden sem fechar o navegador
+        import ff_profile
+        ff_profile.write_back(state.profile, bot.PROFILE_DIR)
+
+    # --- Google: mantém o service; credenciais se renovam sozinhas no transporte ---
+    try:
+        if state.svc is None:
+            state.svc = sync_gcal.get_service()
+        sync_gcal.main(svc=state.svc)
+    except Exception as e:
+        warn(f"Sync falhou ({e}); o client do Google será recriado no próximo ciclo.")
+        traceback.print_exc()
+        state.svc = None
+    return status
+
+def run_daemon(force_refresh=False):
+    specs = parse_schedule(DAEMON_SCHEDULE)
+    state = _State()
+
+    def _stop(signum, frame):
+        log(f"Sinal {signum} recebido; encerrando após o ciclo atual.")
+        state.stop = True
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    lock = runlock.RunLock()
+    if not lock.acquire():
+        log(f"Outra execução em andamento ({lock.holder() or 'outro processo'}); aguardando o lock…")
+        while not state.stop and not lock.acquire():
+            time.sleep(5)
+        if state.stop:
+            return 0
+
+    log(f"Agenda: {DAEMON_SCHEDULE}")
+    try:
+        first = DAEMON_RUN_ON_START
+        while not state.stop:
+            reqs = lock.take_pending()
+            if not first and not reqs:
+                nxt = next_run(specs, _now()) + timedelta(seconds=random.uniform(0, runlock.RUN_JITTER_S))
+                log(f"Próximo ciclo: {nxt:%Y-%m-%d %H:%M:%S}")
+                while not state.stop and _now() < nxt and not lock.has_pending():
+                    time.sleep(min(5.0, max(0.5, (nxt - _now()).total_seconds())))
+                if state.stop:
+                    break
+                reqs = lock.take_pending()
+                if reqs:
+                    log(f"{sum(r.get('count', 1) for r in reqs)} disparo(s) externo(s) pendente(s); ciclo antecipado.")
+            first = False
+            t0 = time.monotonic()
+            try:
+                status = run_cycle(state, force_refresh=force_refresh, reqs=reqs)
+                log(f"Ciclo concluído em {time.monotonic() - t0:.1f}s (STATUS={status}).")
+            except Exception as e:
+                warn(f"Ciclo falhou: {e}")
+                traceback.print_exc()
+                state.fails += 1
+    finally:
+        if state.driver is not None:
+            _close_driver(state)
+        lock.release()
+    return 0
@@ -0,0 +1,208 @@
+# event_store.py
+# Store de eventos em SQLite: upsert por id, índice por data do evento,
+# retenção (apaga eventos antigos) e escrita transacional. Substitui a
+# reescrita completa de events.json/events.py a cada execução; o export
+# para events.json continua disponível para compatibilidade.
+import os, json, sqlite3, time
+from datetime import date, timedelta
+
+FIELDS = ("titulo", "link", "data", "inicio", "termino", "descricao")
+
+def _iso_date(data_br: str):
+    """'16/09/2025' -> '2025-09-16' (ou None)."""
+    try:
+        d, m, y = map(int, (data_br or "").split("/"))
+        return date(y, m, d).isoformat()
+    except Exception:
+        return None
+
+def _atomic_write(path: str, content: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class EventStore:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # o --webhook grava no mesmo arquivo que o scrape: espera o lock em vez de falhar
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id         TEXT PRIMARY KEY,
+                    titulo     TEXT NOT NULL DEFAULT '',
+                    link       TEXT NOT NULL DEFAULT '',
+                    data       TEXT NOT NULL DEFAULT '',
+                    inicio     TEXT NOT NULL DEFAULT '',
+                    termino    TEXT NOT NULL DEFAULT '',
+                    descricao  TEXT NOT NULL DEFAULT '',
+                    event_date TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_events_date ON events(event_date)")
+            # checkpoint do scrape: EVENT_IDs do run atual ainda não gravados
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS scrape_pending (
+                    id        TEXT PRIMARY KEY,
+                    queued_at REAL NOT NULL
+                )
+            """)
+            # fila de retry do slider: falhas por evento com backoff
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS scrape_retry (
+                    id         TEXT PRIMARY KEY,
+                    attempts   INTEGER NOT NULL,
+                    next_at    REAL NOT NULL,
+                    last_error TEXT NOT NULL DEFAULT ''
+                )
+            """)
+
+    # ---------- escrita ----------
+    def upsert_many(self, events):
+        """
+        Upsert por id numa única transação. Mantém valores antigos quando o
+        novo vier vazio (mesma regra do merge por id anterior).
+        """
+        with self.conn:
+            return self._upsert(events)
+
+    def _upsert(self, events) -> int:
+        now = time.time()
+        rows = []
+        for ev in events:
+            vals = [str(ev.get(k) or "") for k in FIELDS]
+            rows.append((str(ev.get("id")), *vals, _iso_date(ev.get("data")), now))
+        sets = ", ".join(f"{k} = COALESCE(NULLIF(excluded.{k}, ''), {k})" for k in FIELDS)
+        self.conn.executemany(f"""
+            INSERT INTO events (id, {", ".join(FIELDS)}, event_date, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET {sets},
+                event_date = COALESCE(excluded.event_date, event_date),
+                updated_at = excluded.updated_at
+        """, rows)
+        return len(rows)
+
+    def delete(self, event_id) -> bool:
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM events WHERE id=?", (str(event_id),))
+        return cur.rowcount > 0
+
+    def prune(self, retention_days: int) -> int:
+        """Remove eventos com data anterior a hoje - retention_days (0 = desligado)."""
+        if retention_days <= 0:
+            return 0
+        cutoff = (date.today() - timedelta(days=retention_days)).isoformat()
+        cutoff_ts = time.time() - retention_days * 86400
+        with self.conn:
+            cur = self.conn.execute(
+                "DELETE FROM events WHERE event_date < ? OR (event_date IS NULL AND updated_at < ?)",
+                (cutoff, cutoff_ts),
+            )
+            self.conn.execute("DELETE FROM scrape_retry WHERE id NOT IN (SELECT id FROM events)")
+        return cur.rowcount
+
+    # ---------- checkpoint do scrape ----------
+    def pending_ids(self) -> list:
+        """EVENT_IDs que um run anterior deixou sem gravar (ordem de enfileiramento)."""
+        return [r[0] for r in self.conn.execute("SELECT id FROM scrape_pending ORDER BY queued_at, rowid")]
+
+    def set_pending(self, ids):
+        """Substitui a lista pendente pelos EVENT_IDs que este run vai enriquecer."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute("DELETE FROM scrape_pending")
+            self.conn.executemany("INSERT OR IGNORE INTO scrape_pending (id, queued_at) VALUES (?, ?)",
+                                  [(str(i), now) for i in ids])
+
+    def checkpoint(self, ev):
+        """Grava um evento enriquecido e o tira da lista pendente numa transação só."""
+        with self.conn:
+            self._upsert([ev])
+            self.conn.execute("DELETE FROM scrape_pending WHERE id=?", (str(ev.get("id")),))
+
+    def retry_state(self) -> dict:
+        """EVENT_ID -> (tentativas, próximo epoch permitido) da fila de retry."""
+        return {r[0]: (r[1], r[2]) for r in self.conn.execute("SELECT id, attempts, next_at FROM scrape_retry")}
+
+    def retry_fail(self, event_id, error: str, delay_for) -> tuple:
+        """Registra mais uma falha; `delay_for(tentativas)` dá o backoff em segundos."""
+        row = self.conn.execute("SELECT attempts FROM scrape_retry WHERE id=?", (str(event_id),)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        next_at = time.time() + delay_for(attempts)
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO scrape_retry (id, attempts, next_at, last_error) VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET attempts=excluded.attempts, next_at=excluded.next_at,
+                    last_error=excluded.last_error
+            """, (str(event_id), attempts, next_at, (error or "")[:500]))
+        return attempts, next_at
+
+    def retry_clear(self, event_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM scrape_retry WHERE id=?", (str(event_id),))
+
+    # ---------- leitura ----------
+    def _row(self, r) -> dict:
+        return {"titulo": r[1], "id": r[0], "link": r[2], "data": r[3],
+                "inicio": r[4], "termino": r[5], "descricao": r[6]}
+
+    def get_many(self, ids) -> dict:
+        ids = [str(i) for i in ids]
+        out = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            q = f"SELECT id, {', '.join(FIELDS)} FROM events WHERE id IN ({','.join('?' * len(chunk))})"
+            for r in self.conn.execute(q, chunk):
+                out[r[0]] = self._row(r)
+        return out
+
+    def all(self, since: str = None) -> list:
+        """Eventos ordenados por data; `since` (AAAA-MM-DD) filtra pelo índice."""
+        q = f"SELECT id, {', '.join(FIELDS)} FROM events"
+        args = ()
+        if since:
+            q += " WHERE event_date >= ?"
+            args = (since,)
+        q += " ORDER BY event_date, inicio"
+        return [self._row(r) for r in self.conn.execute(q, args)]
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    # ---------- compatibilidade ----------
+    def import_json(self, json_path: str) -> int:
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return 0
+        return self.upsert_many(data) if isinstance(data, list) else 0
+
+    def export_json(self, json_path: str, py_path: str = None) -> int:
+        """Gera events.json (e events.py) a partir do store, com troca atômica dos arquivos."""
+        events = self.all()
+        payload = json.dumps(events, ensure_ascii=False, indent=2)
+        _atomic_write(json_path, payload)
+        if py_path:
+            _atomic_write(py_path, "EVENTS = " + payload + "\n")
+        return len(events)
+
+    def close(self):
+        self.conn.close()
+
+def open_store(db_path: str, legacy_json: str = None) -> EventStore:
+    """Abre o store; na primeira vez importa o events.json legado, se existir."""
+    fresh = not os.path.exists(db_path)
+    store = EventStore(db_path)
+    if fresh and legacy_json:
+        store.import_json(legacy_json)
+    return store
@@ -0,0 +1,113 @@
+# ff_profile.py
+# Perfil Firefox "golden": só cookies e storage do Bitrix ficam no volume
+# (out/ff-profile); cada execução roda numa cópia em tmpfs, e ao final os
+# cookies/storage renovados voltam para o golden com troca atômica do diretório.
+import os, time, glob, shutil, sqlite3, tempfile
+
+PROFILE_MODE = os.getenv("PROFILE_MODE", "persistent").strip().lower()   # persistent | tmpfs
+PROFILE_TMPFS_DIR = os.getenv("PROFILE_TMPFS_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+# O que o golden guarda (globs relativos ao perfil); o resto (cache, histórico, sessões) é descartado
+PROFILE_KEEP = [p.strip() for p in os.getenv(
+    "PROFILE_KEEP",
+    "cookies.sqlite,permissions.sqlite,cert9.db,prefs.js,user.js,webappsstore.sqlite,storage/default/*bitrix24*",
+).split(",") if p.strip()]
+
+def log(m):  print(f"[PROFILE] {m}", flush=True)
+def warn(m): print(f"[!]  {m}", flush=True)
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+def _copy_file(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if src.endswith(".sqlite"):
+        # backup do SQLite: snapshot consistente (inclui o WAL) mesmo com o Firefox aberto
+        try:
+            s, d = sqlite3.connect(f"file:{src}?mode=ro", uri=True), sqlite3.connect(dst)
+            try:
+                s.backup(d)
+                return
+            finally:
+                d.close()
+                s.close()
+        except sqlite3.Error:
+            # banco travado: copia o arquivo e o WAL como estão
+            if os.path.exists(src + "-wal"):
+                shutil.copy2(src + "-wal", dst + "-wal")
+    shutil.copy2(src, dst)
+
+def copy_kept(src_dir: str, dst_dir: str) -> int:
+    """Copia só os itens de PROFILE_KEEP; devolve quantos arquivos."""
+    n = 0
+    for pattern in PROFILE_KEEP:
+        for path in glob.glob(os.path.join(src_dir, pattern)):
+            rel = os.path.relpath(path, src_dir)
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    for f in files:
+                        if f.endswith(("-wal", "-shm", "-journal")):
+                            continue
+                        full = os.path.join(root, f)
+                        _copy_file(full, os.path.join(dst_dir, os.path.relpath(full, src_dir)))
+                        n += 1
+            elif not rel.endswith(("-wal", "-shm", "-journal")):
+                _copy_file(path, os.path.join(dst_dir, rel))
+                n += 1
+    return n
+
+def _recover(golden: str):
+    """Conclui uma troca interrompida (golden sumiu mas a cópia antiga ficou)."""
+    old = golden + ".old"
+    if not os.path.isdir(golden) and os.path.isdir(old):
+        os.rename(old, golden)
+        warn("Troca do perfil golden interrompida; versão anterior restaurada.")
+    shutil.rmtree(golden + ".new", ignore_errors=True)
+    shutil.rmtree(old, ignore_errors=True)
+
+def prepare(golden: str) -> str:
+    """Clona o golden para um diretório novo em tmpfs e devolve o caminho."""
+    _recover(golden)
+    os.makedirs(golden, exist_ok=True)
+    t0 = time.perf_counter()
+    run_dir = tempfile.mkdtemp(prefix="ff-run-", dir=PROFILE_TMPFS_DIR)
+    n = copy_kept(golden, run_dir)
+    log(f"Golden {dir_size(golden) // 1024} KB → {run_dir} ({n} arquivo(s) em "
+        f"{(time.perf_counter() - t0) * 1000:.0f} ms)")
+    return run_dir
+
+def write_back(run_dir: str, golden: str) -> bool:
+    """
+    Monta um golden novo com os itens mantidos do perfil em uso e troca o
+    diretório (rename). Pode rodar com o Firefox aberto (daemon).
+    """
+    if not os.path.exists(os.path.join(run_dir, "cookies.sqlite")):
+        warn("Perfil em uso sem cookies.sqlite; golden mantido.")
+        return False
+    new, old = golden + ".new", golden + ".old"
+    shutil.rmtree(new, ignore_errors=True)
+    copy_kept(run_dir, new)
+    if os.path.isdir(golden):
+        os.rename(golden, old)
+    os.rename(new, golden)
+    shutil.rmtree(old, ignore_errors=True)
+    return True
+
+def discard(run_dir: str):
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+def release(run_dir: str, golden: str):
+    """Depois do driver.quit(): grava de volta e apaga o clone."""
+    try:
+        t0 = time.perf_counter()
+        if write_back(run_dir, golden):
+            log(f"Cookies/storage gravados no golden ({dir_size(golden) // 1024} KB) em "
+                f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+    finally:
+        discard(run_dir)
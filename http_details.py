@@ -0,0 +1,187 @@
+# http_details.py
+# Backend alternativo de detalhes: busca /calendar/?EVENT_ID= por HTTP
+# reaproveitando os cookies da sessão do Selenium (sem abrir slider).
+import re, json
+from html import unescape
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Bitrix embute os dados do evento em JSON na página ("DATE_FROM":"16.09.2025 09:30:00")
+DATE_FROM_RE = re.compile(r'"DATE_FROM"\s*:\s*"(\d{2})\.(\d{2})\.(\d{4})\s+(\d{1,2}):(\d{2})', re.I)
+DATE_TO_RE   = re.compile(r'"DATE_TO"\s*:\s*"(\d{2})\.(\d{2})\.(\d{4})\s+(\d{1,2}):(\d{2})', re.I)
+DESC_RE      = re.compile(r'"DESCRIPTION"\s*:\s*"((?:[^"\\]|\\.)*)"', re.I)
+TAG_RE       = re.compile(r"<[^>]+>")
+# a página pode trazer outros eventos em JSON (lista lateral, próximos eventos):
+# só vale o objeto com "ID" igual ao EVENT_ID pedido
+ID_KEY_RE    = r'"ID"\s*:\s*"?{}(?!\w)'
+
+def event_block(html: str, event_id) -> str:
+    """Objeto JSON embutido (texto) que contém "ID": event_id, ou "" se não houver."""
+    for m in re.finditer(ID_KEY_RE.format(re.escape(str(event_id))), html):
+        # volta até a chave que abre o objeto e avança até a que o fecha
+        depth, start = 0, -1
+        for i in range(m.start() - 1, -1, -1):
+            c = html[i]
+            if c == "}":
+                depth += 1
+            elif c == "{":
+                if not depth:
+                    start = i
+                    break
+                depth -= 1
+        if start < 0:
+            continue
+        depth, in_str, esc = 0, False, False
+        for j in range(start, len(html)):
+            c = html[j]
+            if in_str:
+                if esc:
+                    esc = False
+                elif c == "\\":
+                    esc = True
+                elif c == '"':
+                    in_str = False
+            elif c == '"':
+                in_str = True
+            elif c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+                if not depth:
+                    return html[start:j + 1]
+    return ""
+
+class _SelectorText(HTMLParser):
+    """Coleta o texto do primeiro elemento que casa com um seletor simples (.classe ou #id)."""
+    VOID = {"br", "img", "input", "meta", "link", "hr", "wbr", "source", "area", "col", "base"}
+
+    def __init__(self, selector: str):
+        super().__init__(convert_charrefs=True)
+        self.kind, self.name = selector[0], selector[1:]
+        self.depth = 0          # >0 enquanto dentro do elemento alvo
+        self.done = False
+        self.parts = []
+        self.hrefs = []
+
+    def _match(self, attrs) -> bool:
+        a = dict(attrs)
+        if self.kind == "#":
+            return a.get("id") == self.name
+        return self.name in (a.get("class") or "").split()
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self.depth:
+            if tag == "a":
+                href = dict(attrs).get("href")
+                if href:
+                    self.hrefs.append(href)
+            if tag == "br":
+                self.parts.append("\n")
+            if tag not in self.VOID:
+                self.depth += 1
+        elif tag not in self.VOID and self._match(attrs):
+            self.depth = 1
+
+    def handle_endtag(self, tag):
+        if self.depth and not self.done and tag not in self.VOID:
+            self.depth -= 1
+            if not self.depth:
+                self.done = True
+
+    def handle_data(self, data):
+        if self.depth and not self.done:
+            self.parts.append(data)
+
+def select_text(html: str, selector: str):
+    """(texto, hrefs) do primeiro elemento que casa com `selector`, ou None."""
+    if not selector or selector[0] not in ".#" or not re.fullmatch(r"[.#][\w-]+", selector):
+        return None
+    p = _SelectorText(selector)
+    p.feed(html)
+    p.close()
+    if not p.parts and not p.done:
+        return None
+    return "".join(p.parts).strip(), p.hrefs
+
+def parse_event_html(html: str, time_sel: str, desc_sels, parse_time, url_re, event_id=None):
+    """
+    Extrai {"data","inicio","termino","descricao"} do HTML da página do evento.
+    Prioriza o JSON embutido (DATE_FROM/DATE_TO) do objeto com o `event_id`;
+    senão usa o texto do cabeçalho do slider renderizado no servidor, com a
+    mesma parse_time do bot.
+    """
+    data = inicio = termino = descricao = ""
+
+    block = event_block(html, event_id) if event_id is not None else html
+    mf, mt = DATE_FROM_RE.search(block), DATE_TO_RE.search(block)
+    if mf:
+        data   = f"{mf.group(1)}/{mf.group(2)}/{mf.group(3)}"
+        inicio = f"{int(mf.group(4)):02d}:{mf.group(5)}"
+        if mt:
+            termino = f"{int(mt.group(4)):02d}:{mt.group(5)}"
+    else:
+        found = select_text(html, time_sel)
+        if found and found[0]:
+            data, inicio, termino = parse_time(found[0])
+
+    for css in desc_sels:
+        found = select_text(html, css)
+        if not found:
+            continue
+        text, hrefs = found
+        m = url_re.search(text)
+        descricao = m.group(0).strip() if m else (hrefs[0].strip() if hrefs else " ".join(text.split()))
+        if descricao:
+            break
+    if not descricao:
+        md = DESC_RE.search(block)
+        if md:
+            try:
+                raw = json.loads(f'"{md.group(1)}"')
+            except ValueError:
+                raw = md.group(1)
+            text = unescape(TAG_RE.sub(" ", raw))
+            m = url_re.search(text)
+            descricao = m.group(0).strip() if m else " ".join(text.split())
+
+    return {"data": data, "inicio": inicio, "termino": termino, "descricao": descricao}
+
+def make_session(cookies, user_agent: str = "", pool_size: int = 8) -> requests.Session:
+    """Session com pool de conexões e os cookies exportados do WebDriver."""
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    if user_agent:
+        s.headers["User-Agent"] = user_agent
+    for c in cookies:
+        s.cookies.set(c["name"], c["value"], domain=c.get("domain") or "", path=c.get("path", "/"))
+    return s
+
+def fetch_all(session, jobs, parse, workers: int = 8, timeout: float = 15.0, is_login_page=None):
+    """
+    jobs: [(event_id, url)]. Busca em paralelo (no máximo `workers` simultâneos)
+    e devolve {event_id: detalhes | Exception}; parse(html, event_id).
+    """
+    def _one(eid, url):
+        r = session.get(url, timeout=timeout, allow_redirects=True)
+        r.raise_for_status()
+        if is_login_page and is_login_page(r.text):
+            raise RuntimeError("sessão expirada (página de login)")
+        return parse(r.text, eid)
+
+    out = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futs = {ex.submit(_one, eid, url): eid for eid, url in jobs}
+        for fut in as_completed(futs):
+            eid = futs[fut]
+            try:
+                out[eid] = fut.result()
+            except Exception as e:
+                out[eid] = e
+    return out
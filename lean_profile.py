@@ -0,0 +1,200 @@
+# lean_profile.py
+# Perfil "enxuto" do Firefox para o scrape headless: bloqueio de hosts de
+# terceiros via PAC, sem fontes/mídia/prefetch e sem serviços de fundo,
+# além de um relatório de requisições/bytes por execução.
+import os, json, time
+from urllib.parse import urlparse
+
+from metrics import append_jsonl, tail_jsonl
+
+LEAN_PROFILE = os.getenv("LEAN_PROFILE", "false").lower() == "true"
+LEAN_REPORT  = os.getenv("LEAN_REPORT", "true").lower() == "true"
+
+# Padrões no formato shExpMatch do PAC (ex.: "*.hotjar.com")
+DEFAULT_BLOCK_HOSTS = ",".join([
+    "*.google-analytics.com", "*.googletagmanager.com", "*.doubleclick.net",
+    "*.googlesyndication.com", "*.facebook.net", "*.facebook.com", "connect.facebook.net",
+    "mc.yandex.ru", "*.yandex.ru", "*.hotjar.com", "*.clarity.ms",
+    "*.youtube.com", "*.ytimg.com", "fonts.googleapis.com", "fonts.gstatic.com",
+])
+LEAN_BLOCK_HOSTS = [h.strip() for h in os.getenv("LEAN_BLOCK_HOSTS", DEFAULT_BLOCK_HOSTS).split(",") if h.strip()]
+# Se definido, vira allowlist: só esses hosts passam (o resto é bloqueado)
+LEAN_ALLOW_HOSTS = [h.strip() for h in os.getenv("LEAN_ALLOW_HOSTS", "").split(",") if h.strip()]
+
+# Proxy inexistente: conexão recusada na hora = requisição bloqueada
+_BLACKHOLE = "PROXY 127.0.0.1:9"
+
+LEAN_PREFS = {
+    # fontes e mídia
+    "gfx.downloadable_fonts.enabled": False,
+    "browser.display.use_document_fonts": 0,
+    "media.autoplay.default": 5,
+    "media.preload.default": 0,
+    "media.video_stats.enabled": False,
+    "permissions.default.image": 2,
+    # prefetch / conexões especulativas
+    "network.prefetch-next": False,
+    "network.dns.disablePrefetch": True,
+    "network.http.speculative-parallel-limit": 0,
+    "network.predictor.enabled": False,
+    "browser.urlbar.speculativeConnect.enabled": False,
+    # telemetria e relatórios
+    "toolkit.telemetry.enabled": False,
+    "toolkit.telemetry.unified": False,
+    "toolkit.telemetry.archive.enabled": False,
+    "datareporting.healthreport.uploadEnabled": False,
+    "datareporting.policy.dataSubmissionEnabled": False,
+    "browser.ping-centre.telemetry": False,
+    "browser.discovery.enabled": False,
+    # safe browsing (listas baixadas em segundo plano)
+    "browser.safebrowsing.malware.enabled": False,
+    "browser.safebrowsing.phishing.enabled": False,
+    "browser.safebrowsing.downloads.enabled": False,
+    "browser.safebrowsing.downloads.remote.enabled": False,
+    "browser.safebrowsing.blockedURIs.enabled": False,
+    # atualizações e serviços de fundo
+    "app.update.auto": False,
+    "app.update.enabled": False,
+    "extensions.update.enabled": False,
+    "extensions.getAddons.cache.enabled": False,
+    "network.captive-portal-service.enabled": False,
+    "network.connectivity-service.enabled": False,
+    "browser.newtabpage.enabled": False,
+    "browser.startup.homepage": "about:blank",
+    "browser.shell.checkDefaultBrowser": False,
+}
+
+def _js_list(items):
+    return json.dumps(items)
+
+def build_pac(block_hosts, allow_hosts) -> str:
+    """Gera o PAC: allowlist (se houver) > blocklist > DIRECT."""
+    return f"""function FindProxyForURL(url, host) {{
+  var allow = {_js_list(allow_hosts)};
+  var block = {_js_list(block_hosts)};
+  for (var i = 0; i < allow.length; i++) {{ if (shExpMatch(host, allow[i])) return "DIRECT"; }}
+  if (allow.length) return "{_BLACKHOLE}";
+  for (var j = 0; j < block.length; j++) {{ if (shExpMatch(host, block[j])) return "{_BLACKHOLE}"; }}
+  return "DIRECT";
+}}
+"""
+
+def apply_lean(opts, out_dir: str):
+    """Aplica prefs enxutas e o PAC de bloqueio nas FFOptions."""
+    for k, v in LEAN_PREFS.items():
+        opts.set_preference(k, v)
+
+    pac_path = os.path.join(out_dir, "lean.pac")
+    with open(pac_path, "w", encoding="utf-8") as f:
+        f.write(build_pac(LEAN_BLOCK_HOSTS, LEAN_ALLOW_HOSTS))
+    opts.set_preference("network.proxy.type", 2)
+    opts.set_preference("network.proxy.autoconfig_url", "file://" + os.path.abspath(pac_path).replace("\\", "/"))
+
+# =========================
+# Relatório
+# =========================
+_PERF_JS = """
+const nav = performance.getEntriesByType('navigation')[0] || {};
+const res = performance.getEntriesByType('resource').map(e => [e.name, e.initiatorType, e.transferSize || 0]);
+return {
+  page_ready_ms: Math.round(nav.domContentLoadedEventEnd || 0),
+  load_ms: Math.round(nav.loadEventEnd || 0),
+  nav_bytes: nav.transferSize || 0,
+  resources: res,
+};
+"""
+
+def _firefox_rss_kb(root_pid: int) -> int:
+    """Soma VmRSS da árvore de processos sob o geckodriver (só Linux; 0 se indisponível)."""
+    if not root_pid:
+        return 0
+    try:
+        children = {}
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(pid))
+            except Exception:
+                continue
+        total, stack = 0, list(children.get(root_pid, []))
+        while stack:
+            pid = stack.pop()
+            stack.extend(children.get(pid, []))
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1])
+                            break
+            except Exception:
+                continue
+        return total
+    except Exception:
+        return 0
+
+def _driver_pid(driver) -> int:
+    proc = getattr(getattr(driver, "service", None), "process", None)
+    return getattr(proc, "pid", 0) or 0
+
+def _last_baseline(path: str, report_path: str):
+    """
+    Último relatório sem perfil enxuto, para calcular a economia: out/lean_baseline.json
+    ou, se ainda não existir (instalações antigas), o fim do lean_report.jsonl.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    for line in reversed(tail_jsonl(report_path, 200)):
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        if not rec.get("lean"):
+            return rec
+    return None
+
+def _save_baseline(path: str, rec: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(rec, f)
+    os.replace(tmp, path)
+
+def record_report(driver, out_dir: str, lean: bool = LEAN_PROFILE):
+    """Coleta requisições/bytes da página atual e anexa em out/lean_report.jsonl."""
+    snap = driver.execute_script(_PERF_JS) or {}
+    first_host = urlparse(driver.current_url).hostname or ""
+    base = ".".join(first_host.split(".")[-3:])
+    resources = snap.get("resources") or []
+
+    third = [r for r in resources if base not in (urlparse(r[0]).hostname or "")]
+    rec = {
+        "ts": time.time(),
+        "lean": bool(lean),
+        "requests": len(resources) + 1,
+        "bytes": int(snap.get("nav_bytes") or 0) + sum(int(r[2]) for r in resources),
+        "third_party_requests": len(third),
+        "third_party_bytes": sum(int(r[2]) for r in third),
+        "fonts": sum(1 for r in resources if r[0].split("?")[0].endswith((".woff", ".woff2", ".ttf", ".otf"))),
+        "page_ready_ms": snap.get("page_ready_ms") or 0,
+        "load_ms": snap.get("load_ms") or 0,
+        "firefox_rss_kb": _firefox_rss_kb(_driver_pid(driver)),
+    }
+
+    path = os.path.join(out_dir, "lean_report.jsonl")
+    baseline_path = os.path.join(out_dir, "lean_baseline.json")
+    baseline = _last_baseline(baseline_path, path) if lean else None
+    if baseline:
+        rec["saved_requests"] = baseline["requests"] - rec["requests"]
+        rec["saved_bytes"] = baseline["bytes"] - rec["bytes"]
+        rec["saved_page_ready_ms"] = baseline["page_ready_ms"] - rec["page_ready_ms"]
+        rec["saved_rss_kb"] = baseline.get("firefox_rss_kb", 0) - rec["firefox_rss_kb"]
+
+    append_jsonl(path, rec)
+    if not lean:
+        _save_baseline(baseline_path, rec)
+    return rec
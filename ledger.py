@@ -0,0 +1,127 @@
+# ledger.py
+# Registro local do que já foi enviado ao Google Calendar:
+# (calendar_id, bitrix_id) -> gcal event id, etag e hash do body de build_body.
+import os, json, sqlite3, hashlib, time
+
+LEDGER_PATH = os.path.join("out", "sync_ledger.sqlite")
+# cron (--all/--sync/--reconcile) e o receptor --webhook escrevem no mesmo ledger:
+# WAL deixa as leituras correrem junto, e a escrita espera o lock até este tempo
+LEDGER_BUSY_TIMEOUT_S = float(os.getenv("LEDGER_BUSY_TIMEOUT_S", "30"))
+
+# Campos do body que o sync controla (os demais são do Google)
+BODY_KEYS = ("summary", "start", "end", "description", "location", "source", "extendedProperties")
+
+def body_hash(body: dict) -> str:
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def project_item(item: dict) -> dict:
+    """Reduz um evento do Google aos mesmos campos/formato de build_body."""
+    body = {}
+    for k in BODY_KEYS:
+        if k not in item:
+            continue
+        v = item[k]
+        if k in ("start", "end"):
+            v = {kk: v[kk] for kk in ("dateTime", "timeZone") if kk in v}
+        elif k == "extendedProperties":
+            bid = (v.get("private") or {}).get("bitrix_id")
+            if not bid:
+                continue
+            v = {"private": {"bitrix_id": str(bid)}}
+        elif k == "source":
+            v = {kk: v[kk] for kk in ("title", "url") if kk in v}
+        body[k] = v
+    return body
+
+def changed_fields(old: dict, new: dict) -> dict:
+    """Campos de `new` que diferem de `old`; campos removidos viram None (limpa no patch)."""
+    diff = {k: v for k, v in new.items() if old.get(k) != v}
+    for k in old:
+        if k not in new:
+            diff[k] = None
+    return diff
+
+class Ledger:
+    def __init__(self, path: str = LEDGER_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=LEDGER_BUSY_TIMEOUT_S)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ledger (
+                cal_id     TEXT NOT NULL,
+                bitrix_id  TEXT NOT NULL,
+                gcal_id    TEXT NOT NULL,
+                etag       TEXT,
+                body_hash  TEXT NOT NULL,
+                body_json  TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (cal_id, bitrix_id)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                cal_id     TEXT PRIMARY KEY,
+                sync_token TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_gcal ON ledger(cal_id, gcal_id)")
+        self.conn.commit()
+
+    def get(self, cal_id: str, bitrix_id: str):
+        row = self.conn.execute(
+            "SELECT gcal_id, etag, body_hash, body_json FROM ledger WHERE cal_id=? AND bitrix_id=?",
+            (cal_id, str(bitrix_id)),
+        ).fetchone()
+        if not row:
+            return None
+        return {"gcal_id": row[0], "etag": row[1], "body_hash": row[2], "body": json.loads(row[3])}
+
+    def find_by_gcal_id(self, cal_id: str, gcal_id: str):
+        """bitrix_id do evento do Google (eventos cancelados vêm sem extendedProperties)."""
+        row = self.conn.execute(
+            "SELECT bitrix_id FROM ledger WHERE cal_id=? AND gcal_id=?", (cal_id, gcal_id)
+        ).fetchone()
+        return row[0] if row else None
+
+    def rows(self, cal_id: str):
+        """[(bitrix_id, {gcal_id, etag, body_hash, body})] do calendário."""
+        return [
+            (r[0], {"gcal_id": r[1], "etag": r[2], "body_hash": r[3], "body": json.loads(r[4])})
+            for r in self.conn.execute(
+                "SELECT bitrix_id, gcal_id, etag, body_hash, body_json FROM ledger WHERE cal_id=?", (cal_id,)
+            )
+        ]
+
+    def get_sync_token(self, cal_id: str):
+        row = self.conn.execute("SELECT sync_token FROM sync_state WHERE cal_id=?", (cal_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_sync_token(self, cal_id: str, token):
+        self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?,?,?)", (cal_id, token, time.time()))
+
+    def put(self, cal_id: str, bitrix_id: str, gcal_id: str, etag: str, body: dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ledger VALUES (?,?,?,?,?,?,?)",
+            (cal_id, str(bitrix_id), gcal_id, etag, body_hash(body),
+             json.dumps(body, ensure_ascii=False, sort_keys=True), time.time()),
+        )
+
+    def delete(self, cal_id: str, bitrix_id: str):
+        self.conn.execute("DELETE FROM ledger WHERE cal_id=? AND bitrix_id=?", (cal_id, str(bitrix_id)))
+
+    def clear(self, cal_id: str):
+        self.conn.execute("DELETE FROM ledger WHERE cal_id=?", (cal_id,))
+
+    def count(self, cal_id: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM ledger WHERE cal_id=?", (cal_id,)).fetchone()[0]
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
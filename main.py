@@ -1,40 +1,150 @@
 # main.py
+import time
+_T0 = time.perf_counter()
+
 import sys
 import argparse
+import importlib
+
+def _load(module: str):
+    """Import sob demanda; o custo vira a fase import_<módulo> nas métricas."""
+    if module in sys.modules:
+        return sys.modules[module]
+    import metrics
+    with metrics.phase(f"import_{module}"):
+        return importlib.import_module(module)
 
-def run_scrape():
-    from bot import main as bot_main
-    return bot_main()
+def run_scrape(force_refresh=False):
+    return _load("bot").main(force_refresh=force_refresh)
 
 def run_sync():
-    from sync_gcal import main as sync_main
-    return sync_main()
+    return _load("sync_gcal").main()
+
+def run_all(force_refresh=False):
+    pipeline = _load("pipeline")
+    if pipeline.PIPELINE_STREAMING:
+        return pipeline.run_all(force_refresh=force_refresh)
+    status = run_scrape(force_refresh)
+    run_sync()
+    return status
+
+def run_reconcile():
+    return _load("reconcile").reconcile()
+
+def run_rebuild_ledger():
+    return _load("sync_gcal").rebuild_ledger()
+
+def run_daemon(force_refresh=False):
+    return _load("daemon").run_daemon(force_refresh=force_refresh)
+
+def run_webhook():
+    return _load("webhook").serve()
+
+def run_accounts(path, scrape=False, sync=False, force_refresh=False):
+    import accounts
+    accs = accounts.load_accounts(path)
+    if scrape:
+        accounts.scrape_all(accs, force_refresh=force_refresh)
+    if sync:
+        accounts.sync_all(accs)
+
+def run_export_events():
+    from bot import export_events
+    return export_events()
 
-def parse_args():
+def run_startup_report():
+    from startup_report import run_report
+    return run_report()
+
+def parse_args(argv=None):
     p = argparse.ArgumentParser(description="Bitrix → Google Calendar")
     g = p.add_mutually_exclusive_group(required=True)
     g.add_argument("--scrape", action="store_true", help="Coleta notificações no Bitrix e atualiza out/events.json")
     g.add_argument("--sync",   action="store_true", help="Sincroniza out/events.json com o Google Calendar")
     g.add_argument("--all",    action="store_true", help="Executa scrape e depois sync")
-    return p.parse_args()
+    g.add_argument("--daemon", action="store_true", help="Processo contínuo: mantém Firefox/Google vivos e roda conforme DAEMON_SCHEDULE")
+    g.add_argument("--webhook", action="store_true", help="Receptor HTTP dos webhooks de saída do Bitrix (agenda) com sync imediato")
+    g.add_argument("--reconcile", action="store_true", help="Reconciliação incremental (syncToken) com o Google Calendar")
+    g.add_argument("--export-events", action="store_true", help="Exporta out/events.sqlite para out/events.json e out/events.py")
+    g.add_argument("--rebuild-ledger", action="store_true", help="Reconstrói out/sync_ledger.sqlite a partir do Google Calendar")
+    g.add_argument("--startup-report", action="store_true", help="Mede o custo de import de cada modo (out/startup_report.json)")
+    p.add_argument("--force-refresh", action="store_true", help="Ignora o cache de enriquecimento e reabre o slider de todos os eventos")
+    p.add_argument("--accounts", metavar="ARQUIVO", nargs="?", const="accounts.json",
+                   help="Multi-conta: usa a lista de contas do arquivo (padrão accounts.json) com --scrape/--sync/--all")
+    return p.parse_args(argv)
 
-def main():
-    args = parse_args()
+def _run_kind(args) -> str:
+    for k in ("scrape", "sync", "all", "daemon", "webhook", "reconcile", "export_events", "rebuild_ledger"):
+        if getattr(args, k, False):
+            return k
+    return ""
+
+def _execute(args, req=None) -> int:
+    """Uma execução do modo pedido; `req` é o pedido coalescido que a originou."""
+    import metrics
+    metrics.start_run(_run_kind(args))
+    if req is None:
+        # do início do main.py até aqui: argparse + metrics (o interpretador fica de fora)
+        metrics.observe("startup", time.perf_counter() - _T0)
+    else:
+        metrics.observe("queue_delay", time.time() - req["requested_at"])
+        metrics.inc("coalesced", req.get("count", 1))
+        print(f"[MAIN] Execução pedida durante a anterior ({req.get('count', 1)} disparo(s)), "
+              f"na fila por {time.time() - req['requested_at']:.0f}s.", flush=True)
+    status = "OK"
     try:
-        if args.scrape:
-            run_scrape()
+        if args.accounts and (args.scrape or args.sync or args.all):
+            run_accounts(args.accounts, scrape=args.scrape or args.all,
+                         sync=args.sync or args.all, force_refresh=args.force_refresh)
+        elif args.scrape:
+            status = run_scrape(args.force_refresh) or status
         elif args.sync:
             run_sync()
         elif args.all:
-            run_scrape()
-            run_sync()
+            status = run_all(args.force_refresh) or status
+        elif args.daemon:
+            run_daemon(args.force_refresh)
+        elif args.webhook:
+            run_webhook()
+        elif args.reconcile:
+            run_reconcile()
+        elif args.export_events:
+            run_export_events()
+        elif args.rebuild_ledger:
+            run_rebuild_ledger()
         return 0
     except SystemExit as e:
         # se bot/sync usarem sys.exit, normaliza para 0
         return int(getattr(e, "code", 0) or 0)
     except Exception as e:
+        status = "FAIL"
         print(f"[MAIN][ERR] {e}")
         return 1
+    finally:
+        if not (args.daemon or args.webhook):
+            metrics.finish(status)
+
+def main():
+    args = parse_args()
+    # .env antes de qualquer módulo do projeto (as configs são lidas no import)
+    from dotenv import load_dotenv
+    load_dotenv()
+    if args.startup_report:
+        return 1 if run_startup_report().get("violations") else 0
+    if args.daemon or args.webhook:
+        # o daemon segura o lock a vida toda e atende os disparos como ciclos extras;
+        # o receptor de webhooks não usa o Firefox e convive com o backfill do cron
+        return _execute(args)
+    import runlock
+    rc = runlock.coordinate(lambda argv, req: _execute(parse_args(argv), req), sys.argv[1:])
+    if rc == runlock.COALESCED:
+        import metrics
+        metrics.start_run(_run_kind(args))
+        metrics.inc("overlap")
+        metrics.finish(runlock.COALESCED)
+        print("STATUS=COALESCED")
+        return 0
+    return rc
 
 if __name__ == "__main__":
     sys.exit(main())
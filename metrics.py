@@ -0,0 +1,145 @@
+# metrics.py
+# Tempos por fase e contadores por execução. Cada execução vira uma linha em
+# out/metrics.jsonl e o resumo (p50/p95 por fase nas últimas execuções) é
+# exportado como textfile do Prometheus em out/metrics.prom.
+import os, json, time, threading
+from contextlib import contextmanager
+
+METRICS_DIR    = os.getenv("METRICS_DIR", "out")
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "50"))   # execuções usadas no p50/p95
+# acima disso o .jsonl vira .jsonl.1 (substituindo o anterior) e recomeça
+METRICS_MAX_BYTES = int(float(os.getenv("METRICS_MAX_MB", "5")) * 1024 * 1024)
+PROM_PREFIX    = "bitrix2gcal"
+
+_lock = threading.Lock()
+_run = None
+
+def _new_run(kind: str = "") -> dict:
+    return {"kind": kind, "started_at": time.time(), "phases": {}, "counters": {}}
+
+def _current() -> dict:
+    global _run
+    if _run is None:
+        _run = _new_run()
+    return _run
+
+def start_run(kind: str):
+    global _run
+    with _lock:
+        _run = _new_run(kind)
+
+def observe(phase: str, seconds: float):
+    with _lock:
+        _current()["phases"].setdefault(phase, []).append(round(seconds, 4))
+
+def inc(name: str, n: int = 1):
+    with _lock:
+        c = _current()["counters"]
+        c[name] = c.get(name, 0) + n
+
+@contextmanager
+def phase(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0)
+
+def _quantile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    v = sorted(values)
+    idx = min(len(v) - 1, max(0, int(round(q * (len(v) - 1)))))
+    return v[idx]
+
+def append_jsonl(path: str, rec: dict, max_bytes: int = None):
+    """Anexa `rec` em `path`; passando de max_bytes, gira para path + ".1" (uma geração)."""
+    max_bytes = METRICS_MAX_BYTES if max_bytes is None else max_bytes
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        size = f.tell()
+    if max_bytes and size > max_bytes:
+        os.replace(path, path + ".1")
+
+def _tail(path: str, n: int, block: int = 64 * 1024) -> list:
+    """Últimas n linhas de `path` lendo do fim em blocos (sem carregar o arquivo)."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return []
+    with f:
+        f.seek(0, os.SEEK_END)
+        pos, data = f.tell(), b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", "replace").splitlines()
+    return [l for l in lines[-n:] if l.strip()] if n > 0 else []
+
+def tail_jsonl(path: str, n: int) -> list:
+    """Últimas n linhas de `path`, completando com path + ".1" logo depois de girar."""
+    lines = _tail(path, n)
+    if len(lines) < n:
+        lines = _tail(path + ".1", n - len(lines)) + lines
+    return lines
+
+def _recent_runs(path: str, window: int) -> list:
+    out = []
+    for line in tail_jsonl(path, window):
+        try:
+            out.append(json.loads(line))
+        except ValueError:
+            continue
+    return out
+
+def _write_prom(path: str, runs: list, last: dict):
+    per_phase = {}
+    for r in runs:
+        for ph, vals in (r.get("phases") or {}).items():
+            per_phase.setdefault(ph, []).extend(vals)
+
+    lines = [
+        f"# HELP {PROM_PREFIX}_phase_seconds Duração por fase nas últimas {len(runs)} execuções.",
+        f"# TYPE {PROM_PREFIX}_phase_seconds summary",
+    ]
+    for ph in sorted(per_phase):
+        vals = per_phase[ph]
+        for q in (0.5, 0.95):
+            lines.append(f'{PROM_PREFIX}_phase_seconds{{phase="{ph}",quantile="{q}"}} {_quantile(vals, q):.4f}')
+        lines.append(f'{PROM_PREFIX}_phase_seconds_sum{{phase="{ph}"}} {sum(vals):.4f}')
+        lines.append(f'{PROM_PREFIX}_phase_seconds_count{{phase="{ph}"}} {len(vals)}')
+
+    lines += [
+        f"# HELP {PROM_PREFIX}_run_counter Contadores da última execução.",
+        f"# TYPE {PROM_PREFIX}_run_counter gauge",
+    ]
+    for name, val in sorted((last.get("counters") or {}).items()):
+        lines.append(f'{PROM_PREFIX}_run_counter{{kind="{last.get("kind","")}",name="{name}"}} {val}')
+    lines += [
+        f"# TYPE {PROM_PREFIX}_last_run_timestamp_seconds gauge",
+        f'{PROM_PREFIX}_last_run_timestamp_seconds{{kind="{last.get("kind","")}"}} {last.get("finished_at", 0):.0f}',
+        f"# TYPE {PROM_PREFIX}_last_run_duration_seconds gauge",
+        f'{PROM_PREFIX}_last_run_duration_seconds{{kind="{last.get("kind","")}"}} {last.get("duration", 0):.3f}',
+    ]
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)   # o node_exporter nunca lê arquivo pela metade
+
+def finish(status: str = "", out_dir: str = None) -> dict:
+    """Fecha a execução atual: anexa em metrics.jsonl e reescreve metrics.prom."""
+    global _run
+    with _lock:
+        run, _run = _current(), None
+    out_dir = out_dir or METRICS_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    run["finished_at"] = time.time()
+    run["duration"] = round(run["finished_at"] - run["started_at"], 3)
+    run["status"] = status
+
+    jsonl = os.path.join(out_dir, "metrics.jsonl")
+    append_jsonl(jsonl, run)
+    _write_prom(os.path.join(out_dir, "metrics.prom"), _recent_runs(jsonl, METRICS_WINDOW), run)
+    return run
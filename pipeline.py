@@ -0,0 +1,111 @@
+# pipeline.py
+# --all em streaming: cada evento enriquecido pelo bot entra numa fila limitada
+# e uma thread consumidora já faz o upsert no Google enquanto o navegador
+# segue nos próximos sliders. No fim, um sync completo sobre o store mesclado
+# garante que nada ficou para trás (barato: o ledger pula o que já foi enviado).
+import os, time, queue, threading, traceback
+
+import metrics
+
+PIPELINE_STREAMING  = os.getenv("PIPELINE_STREAMING", "true").lower() == "true"
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "50"))   # backpressure no scrape
+PIPELINE_BATCH      = int(os.getenv("PIPELINE_BATCH", "10"))        # eventos por lote de sync
+PIPELINE_LINGER_S   = float(os.getenv("PIPELINE_LINGER_S", "2"))    # espera máx. para completar o lote
+
+_DONE = object()
+
+def log(m):  print(f"[PIPE] {m}", flush=True)
+def warn(m): print(f"[!]  {m}", flush=True)
+
+class SyncConsumer(threading.Thread):
+    """Consome eventos da fila e sincroniza em lotes pequenos."""
+    def __init__(self, svc, cal_ids=None, maxsize: int = PIPELINE_QUEUE_SIZE):
+        super().__init__(name="sync-consumer", daemon=True)
+        self.svc = svc
+        self.cal_ids = cal_ids
+        self.q = queue.Queue(maxsize=max(1, maxsize))
+        self.index_cache = {}
+        self.synced = 0
+        self.failed_batches = 0
+
+    def put(self, ev):
+        """Bloqueia se a fila estiver cheia (o scrape espera o sync)."""
+        self.q.put((time.monotonic(), dict(ev)))
+
+    def close(self):
+        self.q.put(_DONE)
+        self.join()
+
+    def _next_batch(self):
+        first = self.q.get()
+        if first is _DONE:
+            return None, True
+        batch, deadline = [first], time.monotonic() + PIPELINE_LINGER_S
+        while len(batch) < PIPELINE_BATCH:
+            try:
+                item = self.q.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def sync_batch(self, events, ledger):
+        """Upsert de um lote em todos os alvos (subclasses podem pré-processar)."""
+        import sync_gcal
+        sync_gcal._sync_targets(events, ledger, self.svc, sync_gcal.target_calendars(cal_ids=self.cal_ids),
+                                partial=True, index_cache=self.index_cache)
+
+    def run(self):
+        from ledger import Ledger
+
+        ledger = Ledger()   # conexão SQLite própria desta thread
+        try:
+            done = False
+            while not done:
+                batch, done = self._next_batch()
+                if not batch:
+                    continue
+                try:
+                    with metrics.phase("stream_sync_batch"):
+                        self.sync_batch([ev for _, ev in batch], ledger)
+                    now = time.monotonic()
+                    for t_in, _ in batch:
+                        metrics.observe("stream_latency", now - t_in)
+                    self.synced += len(batch)
+                except Exception as e:
+                    # fica para o sync final
+                    self.failed_batches += 1
+                    warn(f"Lote do pipeline falhou ({e}); será coberto pelo sync final.")
+                    traceback.print_exc()
+        finally:
+            ledger.close()
+
+def run_all(force_refresh=False):
+    """Scrape com sync concorrente; devolve o STATUS do scrape."""
+    import bot
+    import sync_gcal
+
+    try:
+        svc = sync_gcal.get_service()
+    except Exception as e:
+        warn(f"Client do Google indisponível ({e}); scrape sem streaming.")
+        status = bot.main(force_refresh=force_refresh)
+        sync_gcal.main()
+        return status
+
+    consumer = SyncConsumer(svc)
+    consumer.start()
+    t0 = time.monotonic()
+    try:
+        status = bot.main(force_refresh=force_refresh, on_event=consumer.put)
+    finally:
+        consumer.close()   # drena a fila antes do sync final
+    log(f"Streaming: {consumer.synced} evento(s) enviados durante o scrape "
+        f"({consumer.failed_batches} lote(s) com falha) em {time.monotonic() - t0:.1f}s.")
+    metrics.inc("streamed", consumer.synced)
+
+    # flush final: store mesclado completo (cache hits, lotes com falha, retry)
+    sync_gcal.main(svc=svc)
+    return status
@@ -0,0 +1,171 @@
+# preflight.py
+# Checagem barata antes do scrape: um GET com os cookies persistidos do perfil
+# Firefox lê o ID da notificação mais recente (e o contador). Se a assinatura
+# é a mesma do último run completo, o Firefox nem é aberto. Opt-in: só pula
+# com latest_id_re configurado — o contador sozinho volta ao mesmo valor
+# quando uma notificação chega e outra é lida.
+import os, re, json, time, shutil, sqlite3, tempfile
+from urllib.parse import urlparse
+
+PREFLIGHT         = os.getenv("PREFLIGHT", "false").lower() == "true"
+PREFLIGHT_TIMEOUT = float(os.getenv("PREFLIGHT_TIMEOUT", "10"))
+# Mesmo sem mudança, força um run completo se o último for mais velho que isso
+PREFLIGHT_MAX_AGE_H = float(os.getenv("PREFLIGHT_MAX_AGE_H", "6"))
+
+# Padrões (sobreponíveis em selectors.json → "preflight")
+DEFAULT_COUNTER_RE   = r'"(?:im-notify|notify(?:Counter|_counter)?|notifications?(?:Counter|_counter)?)"\s*:\s*"?(\d+)'
+DEFAULT_LATEST_ID_RE = ""
+LOGIN_MARKERS        = ("b24net-login-enter-form", "b24net-password-enter-form")
+
+def log(m):  print(f"[PREFLIGHT] {m}", flush=True)
+def warn(m): print(f"[!]  {m}", flush=True)
+
+def state_path(out_dir: str) -> str:
+    return os.path.join(out_dir, "preflight_state.json")
+
+def load_state(out_dir: str) -> dict:
+    try:
+        with open(state_path(out_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_state(out_dir: str, state: dict):
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = state_path(out_dir) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, state_path(out_dir))
+
+def profile_cookies(profile_dir: str, host: str) -> list:
+    """
+    Cookies do perfil (cookies.sqlite) válidos para `host`, no formato do
+    Selenium. Copia o banco (+ WAL) antes de ler: o Firefox pode estar com ele aberto.
+    """
+    src = os.path.join(profile_dir, "cookies.sqlite")
+    if not os.path.exists(src):
+        return []
+    now = time.time()
+    with tempfile.TemporaryDirectory(prefix="pf-cookies-") as tmp:
+        dst = os.path.join(tmp, "cookies.sqlite")
+        shutil.copy2(src, dst)
+        if os.path.exists(src + "-wal"):
+            shutil.copy2(src + "-wal", dst + "-wal")
+        con = sqlite3.connect(dst)
+        try:
+            rows = con.execute("SELECT host, name, value, path, expiry FROM moz_cookies").fetchall()
+        finally:
+            con.close()
+    out = []
+    for h, name, value, path, expiry in rows:
+        bare = h.lstrip(".")
+        if host != bare and not host.endswith("." + bare):
+            continue
+        exp = float(expiry or 0)
+        if exp > 1e11:          # versões novas do Firefox gravam em ms
+            exp /= 1000.0
+        if exp and exp < now:
+            continue
+        out.append({"name": name, "value": value, "domain": h, "path": path or "/"})
+    return out
+
+def signature_from_html(html: str, counter_re: str, latest_id_re: str) -> dict:
+    sig = {}
+    if counter_re:
+        m = re.search(counter_re, html)
+        if m:
+            sig["counter"] = int(m.group(1))
+    if latest_id_re:
+        ids = [int(x) for x in re.findall(latest_id_re, html) if str(x).isdigit()]
+        if ids:
+            sig["latest_id"] = max(ids)
+    return sig
+
+def fetch_signature(url: str, cookies: list, conf: dict) -> dict:
+    """GET único com os cookies; devolve a assinatura ou levanta RuntimeError."""
+    from http_details import make_session
+
+    session = make_session(cookies, conf.get("user_agent", ""), pool_size=1)
+    try:
+        r = session.get(conf.get("url") or url, timeout=PREFLIGHT_TIMEOUT, allow_redirects=True)
+        r.raise_for_status()
+        html = r.text
+    finally:
+        session.close()
+    if any(mk in html for mk in LOGIN_MARKERS):
+        raise RuntimeError("sessão expirada (página de login)")
+    sig = signature_from_html(html, conf.get("counter_re", DEFAULT_COUNTER_RE),
+                              conf.get("latest_id_re", DEFAULT_LATEST_ID_RE))
+    if not sig:
+        raise RuntimeError("contador/ID não encontrado na resposta")
+    return sig
+
+def check(url: str, profile_dir: str, out_dir: str, conf: dict = None, cookies: list = None) -> dict:
+    """
+    Decide se o run completo pode ser pulado.
+    Retorna {"skip": bool, "reason": str, "signature": dict|None}.
+    `cookies` (ex.: do WebDriver vivo no daemon) tem precedência sobre o perfil.
+    """
+    conf = conf or {}
+    state = load_state(out_dir)
+    state["checks"] = state.get("checks", 0) + 1
+    res = {"skip": False, "reason": "", "signature": None}
+    try:
+        if cookies is None:
+            cookies = profile_cookies(profile_dir, urlparse(conf.get("url") or url).hostname or "")
+        if not cookies:
+            res["reason"] = "sem cookies no perfil"
+        else:
+            sig = fetch_signature(url, cookies, conf)
+            res["signature"] = sig
+            last = state.get("signature")
+            age_h = (time.time() - state.get("full_run_at", 0)) / 3600.0
+            if "latest_id" not in sig:
+                res["reason"] = "sem ID da notificação mais recente (latest_id_re); o contador sozinho não pula"
+            elif last is None:
+                res["reason"] = "sem run completo anterior"
+            elif sig != last:
+                res["reason"] = f"mudou ({last} → {sig})"
+            elif age_h >= PREFLIGHT_MAX_AGE_H:
+                res["reason"] = f"último run completo há {age_h:.1f}h"
+            else:
+                res["skip"], res["reason"] = True, f"inalterado {sig}"
+    except Exception as e:
+        res["reason"] = f"preflight indisponível: {e}"
+    if res["skip"]:
+        state["skips"] = state.get("skips", 0) + 1
+    state["last_check_at"] = time.time()
+    save_state(out_dir, state)
+    return res
+
+def record_full_run(url: str, profile_dir: str, out_dir: str, conf: dict = None,
+                    cookies: list = None, before: dict = None):
+    """
+    Após um run completo bem-sucedido: relê a assinatura (abrir o painel pode
+    zerar o contador) e a grava como referência para os próximos preflights.
+    Se ela mudou para um contador não-zero durante o run, algo chegou depois
+    do scrape: grava a de antes (`before`) para o próximo run não ser pulado.
+    """
+    conf = conf or {}
+    state = load_state(out_dir)
+    state["full_runs"] = state.get("full_runs", 0) + 1
+    state["full_run_at"] = time.time()
+    try:
+        if cookies is None:
+            cookies = profile_cookies(profile_dir, urlparse(conf.get("url") or url).hostname or "")
+        sig = fetch_signature(url, cookies, conf) if cookies else None
+        if sig and before and sig != before and sig.get("counter", 0) != 0:
+            sig = before
+        state["signature"] = sig
+    except Exception as e:
+        warn(f"Preflight: assinatura pós-run indisponível ({e}); o próximo run será completo.")
+        state["signature"] = None
+    save_state(out_dir, state)
+    return state
+
+def rates(out_dir: str) -> dict:
+    st = load_state(out_dir)
+    checks, skips, full = st.get("checks", 0), st.get("skips", 0), st.get("full_runs", 0)
+    return {"checks": checks, "skips": skips, "full_runs": full,
+            "skip_rate": round(skips / checks, 3) if checks else 0.0,
+            "full_run_rate": round((checks - skips) / checks, 3) if checks else 1.0}
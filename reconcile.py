@@ -0,0 +1,224 @@
+# reconcile.py
+# Reconciliação incremental com o Google Calendar via nextSyncToken:
+# só busca o que mudou desde a última execução e aplica uma política por
+# bitrix_id para eventos apagados/movidos no Google e para eventos que
+# sumiram do lado do Bitrix.
+import os, json, time
+from datetime import datetime, timezone
+
+from dateutil import tz
+
+import sync_gcal
+from sync_gcal import log, ok, warn, err, build_body, run_batched, gcal_event_id, CAL_ID, TZ_NAME, EVENTS_PATH
+from ledger import project_item, changed_fields
+from runlock import file_lock
+
+# Políticas
+#  apagado no Google, ainda existe no Bitrix: recreate | flag
+#  movido/editado no Google:                  restore | accept | flag
+#  sumiu do Bitrix (futuro, ainda no Google): delete  | flag
+RECONCILE_ON_DELETED = os.getenv("RECONCILE_ON_DELETED", "recreate").strip().lower()
+RECONCILE_ON_MOVED   = os.getenv("RECONCILE_ON_MOVED", "flag").strip().lower()
+RECONCILE_ON_ORPHAN  = os.getenv("RECONCILE_ON_ORPHAN", "flag").strip().lower()
+FLAGS_PATH = os.path.join("out", "reconcile_flags.jsonl")
+
+def list_changes(svc, cal_id: str, sync_token):
+    """
+    Pagina events().list com syncToken (ou lista completa se não houver token
+    ou se o Google devolver 410). Retorna (itens, next_sync_token, full).
+    """
+    items, page_token, full = [], None, sync_token is None
+    while True:
+        kwargs = {"calendarId": cal_id, "maxResults": 2500, "pageToken": page_token, "singleEvents": True}
+        if sync_token:
+            kwargs["syncToken"] = sync_token
+        else:
+            kwargs["showDeleted"] = True
+        try:
+            resp = svc.events().list(**kwargs).execute()
+        except Exception as e:
+            # HttpError pelo status: o googleapiclient só é importado em get_service
+            if sync_token and str(getattr(getattr(e, "resp", None), "status", "")) == "410":
+                warn("syncToken expirado (410); refazendo sincronização completa.")
+                return list_changes(svc, cal_id, None)
+            raise
+        items.extend(resp.get("items", []))
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return items, resp.get("nextSyncToken"), full
+
+def _flag_key(rec: dict) -> str:
+    return json.dumps({k: v for k, v in rec.items() if k != "ts"}, ensure_ascii=False, sort_keys=True)
+
+# chaves já gravadas em FLAGS_PATH (relidas se o arquivo mudar por fora, ex.: --webhook)
+_flags_seen = {"size": -1, "keys": set()}
+
+def _known_flags() -> set:
+    try:
+        size = os.path.getsize(FLAGS_PATH)
+    except OSError:
+        size = 0
+    if size != _flags_seen["size"]:
+        keys = set()
+        if size:
+            with open(FLAGS_PATH, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        keys.add(_flag_key(json.loads(line)))
+                    except ValueError:
+                        continue
+        _flags_seen.update(size=size, keys=keys)
+    return _flags_seen["keys"]
+
+def _flag(kind: str, bitrix_id: str, cal_id: str, **extra) -> bool:
+    """Registra o caso em FLAGS_PATH uma vez só; devolve False se já estava sinalizado."""
+    rec = {"ts": time.time(), "kind": kind, "cal_id": cal_id, "bitrix_id": bitrix_id, **extra}
+    key = _flag_key(rec)
+    with file_lock(FLAGS_PATH + ".lock"):     # reconcile e --webhook gravam no mesmo arquivo
+        if key in _known_flags():
+            return False
+        with open(FLAGS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        _flags_seen["keys"].add(key)
+        _flags_seen["size"] = os.path.getsize(FLAGS_PATH)
+    warn(f"Sinalizado ({kind}): bitrix_id={bitrix_id}")
+    return True
+
+def _to_store_fields(item) -> dict:
+    """Converte start/end do Google de volta para data/inicio/termino do store."""
+    zone = tz.gettz(TZ_NAME)
+    st = datetime.fromisoformat(item["start"]["dateTime"]).astimezone(zone)
+    en = datetime.fromisoformat(item["end"]["dateTime"]).astimezone(zone)
+    return {"data": st.strftime("%d/%m/%Y"), "inicio": st.strftime("%H:%M"), "termino": en.strftime("%H:%M")}
+
+def _open_store(events_path: str):
+    db_path = os.path.join(os.path.dirname(events_path) or ".", "events.sqlite")
+    if not os.path.exists(db_path):
+        return None
+    from event_store import EventStore
+    return EventStore(db_path)
+
+def reconcile(svc=None, events_path=None, cal_id=None):
+    events_path = events_path or EVENTS_PATH
+    cal_id = cal_id or CAL_ID
+    svc = svc or sync_gcal.get_service()
+    by_id = {str(e["id"]): e for e in (sync_gcal.load_events(events_path) or [])}
+    store = _open_store(events_path)
+    ledger = sync_gcal.ledger_for(events_path)
+    stats = {"changes": 0, "recreated": 0, "restored": 0, "accepted": 0, "deleted": 0, "flagged": 0, "failed": 0}
+    try:
+        token = ledger.get_sync_token(cal_id)
+        items, next_token, full = list_changes(svc, cal_id, token)
+        stats["changes"] = len(items)
+        log(f"Reconciliação ({'completa' if full else 'incremental'}): {len(items)} alteração(ões) no Google.")
+
+        ops, plan = [], {}
+        for item in items:
+            bid = ((item.get("extendedProperties") or {}).get("private") or {}).get("bitrix_id") \
+                  or ledger.find_by_gcal_id(cal_id, item["id"])
+            if not bid:
+                continue
+            bid = str(bid)
+            row = ledger.get(cal_id, bid)
+            ev = by_id.get(bid)
+
+            if item.get("status") == "cancelled":
+                if row is None or row["gcal_id"] != item["id"]:
+                    continue
+                if ev is None:
+                    ledger.delete(cal_id, bid)          # sumiu dos dois lados
+                elif RECONCILE_ON_DELETED == "recreate":
+                    # mesmo id do cliente do sync: retry/crash antes do ledger.put dá 409, não duplicata
+                    body = build_body(ev)
+                    plan[bid] = ("recreate", body)
+                    ops.append((bid, svc.events().insert(calendarId=cal_id, body=dict(body, id=gcal_event_id(cal_id, bid)),
+                                                         supportsAttachments=False)))
+                else:
+                    stats["flagged"] += _flag("deleted_in_google", bid, cal_id, gcal_id=item["id"])
+                continue
+
+            remote = project_item(item)
+            if row is None or full:
+                # primeira vez (ou sync completo): só registra o estado atual do Google
+                if row is None:
+                    ledger.put(cal_id, bid, item["id"], item.get("etag"), remote)
+                else:
+                    ledger.put(cal_id, bid, item["id"], item.get("etag"), row["body"])
+                continue
+            if not changed_fields(row["body"], remote):
+                ledger.put(cal_id, bid, item["id"], item.get("etag"), row["body"])
+                continue
+
+            # alterado no Google (horário, título…)
+            if RECONCILE_ON_MOVED == "restore" and ev is not None:
+                body = build_body(ev)
+                req = svc.events().patch(calendarId=cal_id, eventId=item["id"], body=changed_fields(remote, body))
+                if item.get("etag"):
+                    req.headers["If-Match"] = item["etag"]
+                plan[bid] = ("restore", body)
+                ops.append((bid, req))
+            elif RECONCILE_ON_MOVED == "accept" and ev is not None and store is not None:
+                ev = {**ev, **_to_store_fields(item)}
+                store.upsert_many([ev])
+                ledger.put(cal_id, bid, item["id"], item.get("etag"), build_body(ev))
+                stats["accepted"] += 1
+            else:
+                ledger.put(cal_id, bid, item["id"], item.get("etag"), row["body"])
+                stats["flagged"] += _flag("changed_in_google", bid, cal_id, gcal_id=item["id"],
+                                          fields=sorted(changed_fields(row["body"], remote)))
+
+        # Sumiram do Bitrix: só eventos futuros (passados saem do store pela retenção)
+        if by_id:
+            now = datetime.now(timezone.utc)
+            for bid, row in ledger.rows(cal_id):
+                if bid in by_id or bid in plan:
+                    continue
+                start = ((row["body"].get("start") or {}).get("dateTime")) or ""
+                try:
+                    future = datetime.fromisoformat(start) > now
+                except ValueError:
+                    future = False
+                if not future:
+                    continue
+                if RECONCILE_ON_ORPHAN == "delete":
+                    plan[bid] = ("delete", None)
+                    ops.append((bid, svc.events().delete(calendarId=cal_id, eventId=row["gcal_id"])))
+                else:
+                    stats["flagged"] += _flag("removed_in_bitrix", bid, cal_id, gcal_id=row["gcal_id"])
+
+        ledger.commit()   # não segurar o lock de escrita do ledger durante a rede
+        results = run_batched(svc, ops) if ops else {}
+        conflicts = [bid for bid, (kind, _) in plan.items() if kind == "recreate" and
+                     str(getattr(getattr(results.get(bid, (None, None))[1], "resp", None), "status", "")) == "409"]
+        if conflicts:
+            # o id já existe (o próprio evento cancelado ou um insert anterior): restaura com update
+            results.update(run_batched(svc, [
+                (bid, svc.events().update(calendarId=cal_id, eventId=gcal_event_id(cal_id, bid),
+                                          body=dict(plan[bid][1], status="confirmed")))
+                for bid in conflicts]))
+        for bid, (kind, body) in plan.items():
+            resp, exc = results.get(bid, (None, None))
+            if exc is not None:
+                err(f"Reconciliação '{kind}' falhou (bitrix_id={bid}): {exc}")
+                stats["failed"] += 1
+                continue
+            if kind == "delete":
+                ledger.delete(cal_id, bid)
+                stats["deleted"] += 1
+            else:
+                resp = resp or {}
+                gcal_id = resp.get("id") or (gcal_event_id(cal_id, bid) if kind == "recreate" else None)
+                ledger.put(cal_id, bid, gcal_id, resp.get("etag"), body)
+                stats["recreated" if kind == "recreate" else "restored"] += 1
+
+        # Escritas acima também entram no próximo delta; o ledger já reflete o estado
+        if next_token:
+            ledger.set_sync_token(cal_id, next_token)
+        ledger.commit()
+    finally:
+        ledger.close()
+        if store is not None:
+            store.close()
+
+    ok("Reconciliação → " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+    return stats
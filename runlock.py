@@ -0,0 +1,173 @@
+# runlock.py
+# Coordena execuções sobre o mesmo out/ (perfil do Firefox, store, ledger):
+# lock exclusivo em out/.run.lock. Um disparo que chega com outra execução em
+# andamento não sobe um segundo navegador — vira um pedido em out/.run.pending
+# e o dono do lock roda mais uma vez ao terminar (pedidos iguais se fundem).
+import os, json, time, random
+from contextlib import contextmanager
+
+# mesma base dos dados que ele protege (bot.OUT_DIR, EVENTS_PATH, métricas…): o out/ do diretório atual
+RUN_LOCK_DIR = os.getenv("RUN_LOCK_DIR", os.path.join(os.getcwd(), "out"))
+RUN_JITTER_S = float(os.getenv("RUN_JITTER_S", "0"))   # atraso aleatório antes de disputar o lock
+
+COALESCED = "COALESCED"
+
+try:
+    import fcntl
+
+    def _lock(fh, blocking: bool):
+        fcntl.flock(fh, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+
+    def _unlock(fh):
+        fcntl.flock(fh, fcntl.LOCK_UN)
+except ImportError:   # Windows (scrap.bat)
+    import msvcrt
+
+    def _lock(fh, blocking: bool):
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+    def _unlock(fh):
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+def log(m):  print(f"[LOCK] {m}", flush=True)
+
+@contextmanager
+def file_lock(path: str):
+    """Lock exclusivo (bloqueante) em `path` para um read-modify-write curto entre processos."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+", encoding="utf-8") as fh:
+        _lock(fh, True)
+        try:
+            yield
+        finally:
+            _unlock(fh)
+
+class RunLock:
+    def __init__(self, lock_dir: str = None):
+        lock_dir = lock_dir or RUN_LOCK_DIR
+        os.makedirs(lock_dir, exist_ok=True)
+        self.path = os.path.join(lock_dir, ".run.lock")
+        self.pending_path = os.path.join(lock_dir, ".run.pending")
+        self.fh = None
+
+    # ---------- lock da execução ----------
+    def acquire(self, blocking: bool = False) -> bool:
+        if self.fh is not None:
+            return True
+        fh = open(self.path, "a+", encoding="utf-8")
+        try:
+            _lock(fh, blocking)
+        except OSError:
+            fh.close()
+            return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write(json.dumps({"pid": os.getpid(), "since": time.time()}))
+        fh.flush()
+        self.fh = fh
+        return True
+
+    def release(self):
+        if self.fh is None:
+            return
+        try:
+            _unlock(self.fh)
+        finally:
+            self.fh.close()
+            self.fh = None
+
+    def holder(self) -> str:
+        """Quem está com o lock (para o log); vazio se não der para ler."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            return f"pid {info['pid']} há {time.time() - info['since']:.0f}s"
+        except Exception:
+            return ""
+
+    # ---------- pedidos acumulados ----------
+    def _pending_guard(self):
+        return file_lock(self.pending_path + ".lock")
+
+    def _read_pending(self) -> dict:
+        try:
+            with open(self.pending_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    def request(self, argv: list):
+        """Registra um pedido de nova execução; o mesmo argv se funde no pedido existente."""
+        key = " ".join(argv)
+        with self._pending_guard():
+            reqs = self._read_pending()
+            r = reqs.setdefault(key, {"args": list(argv), "requested_at": time.time(), "count": 0})
+            r["count"] += 1
+            tmp = self.pending_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(reqs, f)
+            os.replace(tmp, self.pending_path)
+
+    def has_pending(self) -> bool:
+        return os.path.exists(self.pending_path)
+
+    def take_pending(self) -> list:
+        """Consome os pedidos (mais antigo primeiro)."""
+        if not self.has_pending():
+            return []
+        with self._pending_guard():
+            reqs = self._read_pending()
+            try:
+                os.remove(self.pending_path)
+            except FileNotFoundError:
+                pass
+        return sorted(reqs.values(), key=lambda r: r.get("requested_at", 0))
+
+def jitter(max_s: float = None):
+    max_s = RUN_JITTER_S if max_s is None else max_s
+    if max_s > 0:
+        d = random.uniform(0, max_s)
+        log(f"Jitter de partida: {d:.1f}s")
+        time.sleep(d)
+
+def coordinate(run, argv: list, lock: RunLock = None):
+    """
+    Executa run(argv, pedido) com o lock exclusivo. Se outra execução tiver o
+    lock, registra o pedido e devolve COALESCED; o dono roda os pedidos
+    acumulados ao terminar (pedido = None na execução própria). Devolve o
+    resultado da primeira execução feita por este processo.
+    """
+    lock = lock or RunLock()
+    jitter()
+    if lock.acquire():
+        queue = [None]
+    else:
+        lock.request(argv)
+        log(f"Execução em andamento ({lock.holder() or 'outro processo'}); "
+            f"pedido registrado para rodar logo após.")
+        # o dono pode ter liberado entre o acquire e o pedido
+        if not lock.acquire():
+            return COALESCED
+        queue = lock.take_pending()
+
+    result, first = COALESCED, True
+    try:
+        while True:
+            for req in queue:
+                out = run(req["args"] if req else argv, req)
+                if first:
+                    result, first = out, False
+            queue = lock.take_pending()
+            if queue:
+                continue
+            lock.release()
+            # pedido que chegou entre o take_pending e o release
+            if not lock.has_pending() or not lock.acquire():
+                break
+            queue = lock.take_pending()
+    finally:
+        lock.release()
+    return result
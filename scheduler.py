@@ -0,0 +1,56 @@
+# scheduler.py
+# Agenda no formato do cron (5 campos) para o modo daemon.
+# Várias linhas separadas por ";", ex.: "*/15 8-17 * * 1-5;0 18 * * 1-5"
+from datetime import datetime, timedelta
+
+# Mesma agenda de docker/app.cron (horário comercial + 18:00)
+DEFAULT_SCHEDULE = "*/15 8-17 * * 1-5;0 18 * * 1-5"
+
+_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]  # min hora dia mês dia-da-semana
+
+def _parse_field(field: str, lo: int, hi: int) -> set:
+    out = set()
+    for part in field.split(","):
+        step, stepped = 1, "/" in part
+        if stepped:
+            part, step_s = part.split("/", 1)
+            step = int(step_s)
+        if part == "*":
+            a, b = lo, hi
+        elif "-" in part:
+            a, b = map(int, part.split("-", 1))
+        else:
+            a = int(part)
+            b = hi if stepped else a       # "a/step" = "a-max/step", como no cron
+        if a < lo or b > hi or a > b or step < 1:
+            raise ValueError(f"campo cron inválido: {field!r}")
+        out.update(range(a, b + 1, step))
+    return out
+
+def parse_cron(expr: str):
+    """'*/15 8-17 * * 1-5' -> tupla de 5 sets. Dia da semana: 0/7 = domingo."""
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError(f"expressão cron precisa de 5 campos: {expr!r}")
+    spec = [_parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _RANGES)]
+    if 7 in spec[4]:
+        spec[4] = (spec[4] - {7}) | {0}
+    return tuple(spec)
+
+def parse_schedule(text: str):
+    return [parse_cron(line) for line in text.split(";") if line.strip()]
+
+def matches(spec, dt: datetime) -> bool:
+    minute, hour, dom, month, dow = spec
+    return (dt.minute in minute and dt.hour in hour and dt.day in dom
+            and dt.month in month and ((dt.weekday() + 1) % 7) in dow)
+
+def next_run(specs, after: datetime) -> datetime:
+    """Próximo minuto estritamente após `after` que casa com alguma linha."""
+    t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = t + timedelta(days=366)
+    while t < limit:
+        if any(matches(s, t) for s in specs):
+            return t
+        t += timedelta(minutes=1)
+    raise ValueError("agenda sem próxima execução no próximo ano")
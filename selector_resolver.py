@@ -0,0 +1,103 @@
+# selector_resolver.py
+# Resolve grupos de seletores candidatos (descrição, botão de fechar…) com uma
+# única consulta JS por tentativa, priorizando o candidato que mais acertou em
+# execuções anteriores, e lembra por EVENT_ID quando o elemento não existe.
+# Estatísticas ficam em out/selector_stats.json.
+import os, json, time
+
+SELECTOR_ABSENT_TTL_H = float(os.getenv("SELECTOR_ABSENT_TTL_H", "24"))
+SELECTOR_POLL_S       = 0.2
+
+# Primeiro candidato presente (e, com needContent, com texto ou link) → [índice, elemento]
+PROBE_JS = """
+const sels = arguments[0], needContent = arguments[1];
+for (let i = 0; i < sels.length; i++) {
+  let el = null;
+  try { el = document.querySelector(sels[i]); } catch (e) { continue; }
+  if (!el) continue;
+  if (needContent && !((el.innerText || '').trim() || el.querySelector('a[href]'))) continue;
+  return [i, el];
+}
+return null;
+"""
+
+class SelectorResolver:
+    def __init__(self, path: str):
+        self.path = path
+        self.data = {"groups": {}, "absent": {}}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            self.data["groups"] = loaded.get("groups", {})
+            self.data["absent"] = loaded.get("absent", {})
+        except Exception:
+            pass
+
+    # ---------- estatísticas ----------
+    def _group(self, group: str) -> dict:
+        return self.data["groups"].setdefault(group, {"hits": {}, "misses": 0, "probes": 0})
+
+    def order(self, group: str, candidates) -> list:
+        """Candidatos do grupo com os que mais acertaram primeiro (empate mantém a ordem)."""
+        hits = self._group(group)["hits"]
+        cands = [c for c in dict.fromkeys(candidates) if c]
+        return sorted(cands, key=lambda c: -hits.get(c, 0))
+
+    def record(self, group: str, selector):
+        g = self._group(group)
+        g["probes"] += 1
+        if selector:
+            g["hits"][selector] = g["hits"].get(selector, 0) + 1
+        else:
+            g["misses"] += 1
+
+    # ---------- cache negativo ----------
+    def is_absent(self, group: str, key) -> bool:
+        ts = self.data["absent"].get(group, {}).get(str(key))
+        return bool(ts) and (time.time() - ts) < SELECTOR_ABSENT_TTL_H * 3600
+
+    def mark_absent(self, group: str, key):
+        self.data["absent"].setdefault(group, {})[str(key)] = time.time()
+
+    def clear_absent(self, group: str, key):
+        self.data["absent"].get(group, {}).pop(str(key), None)
+
+    # ---------- resolução ----------
+    def probe(self, driver, group: str, candidates, timeout: float = 0.0, need_content: bool = False):
+        """
+        Procura todos os candidatos numa consulta JS só, repetindo até `timeout`.
+        Devolve (seletor, elemento) ou (None, None); o resultado entra nas estatísticas.
+        """
+        cands = self.order(group, candidates)
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            try:
+                found = driver.execute_script(PROBE_JS, cands, need_content)
+            except Exception:
+                found = None
+            if found:
+                sel = cands[int(found[0])]
+                self.record(group, sel)
+                return sel, found[1]
+            if time.monotonic() >= deadline:
+                self.record(group, None)
+                return None, None
+            time.sleep(SELECTOR_POLL_S)
+
+    def prune(self):
+        cutoff = time.time() - SELECTOR_ABSENT_TTL_H * 3600
+        for group, keys in self.data["absent"].items():
+            self.data["absent"][group] = {k: ts for k, ts in keys.items() if ts >= cutoff}
+
+    def summary(self, group: str) -> str:
+        g = self._group(group)
+        best = max(g["hits"].items(), key=lambda kv: kv[1])[0] if g["hits"] else "-"
+        return f"{group}: {sum(g['hits'].values())} acerto(s), {g['misses']} ausência(s), melhor={best}"
+
+    def save(self):
+        self.prune()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
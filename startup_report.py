@@ -0,0 +1,83 @@
+# startup_report.py
+# Custo de import por modo: roda `python -X importtime` num processo limpo para
+# cada módulo de entrada, agrupa o tempo por pacote e confere que o sync não
+# carrega Selenium e o scrape não carrega as libs do Google.
+import os, sys, json, time, subprocess
+
+REPORT_PATH = os.path.join("out", "startup_report.json")
+
+GOOGLE_PKGS = ("googleapiclient", "google", "google_auth_oauthlib", "google_auth_httplib2", "httplib2")
+
+# módulo de entrada -> pacotes que ele NÃO deve importar (o client do Google só
+# em get_service, na primeira escrita; o Selenium só no scrape)
+ENTRYPOINTS = {
+    "sync_gcal": ("selenium", *GOOGLE_PKGS),
+    "reconcile": ("selenium", *GOOGLE_PKGS),
+    "webhook":   ("selenium", *GOOGLE_PKGS),
+    "bot":       GOOGLE_PKGS,
+    "daemon":    (),
+    "accounts":  (),
+}
+
+def log(m):  print(f"[STARTUP] {m}", flush=True)
+def warn(m): print(f"[!]  {m}", flush=True)
+
+def parse_importtime(stderr: str) -> list:
+    """Linhas do -X importtime → [(módulo, self_us, cumulative_us, profundidade)]."""
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2][1:].rstrip()   # 1 espaço após o "|", depois 2 por nível
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        out.append((name.strip(), int(parts[0]), int(parts[1]), depth))
+    return out
+
+def measure(module: str, python: str = sys.executable) -> dict:
+    t0 = time.perf_counter()
+    proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=os.getcwd())
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        return {"module": module, "error": (proc.stderr.strip().splitlines() or ["?"])[-1]}
+    rows = parse_importtime(proc.stderr)
+    by_pkg = {}
+    for name, self_us, _, _ in rows:
+        root = name.split(".")[0]
+        by_pkg[root] = by_pkg.get(root, 0) + self_us
+    total = next((cum for name, _, cum, depth in reversed(rows) if name == module and depth == 0), 0)
+    loaded = {name.split(".")[0] for name, _, _, _ in rows}
+    return {
+        "module": module,
+        "import_ms": round(total / 1000, 1),
+        "process_ms": round(wall * 1000, 1),
+        "top_packages": [{"package": p, "ms": round(us / 1000, 1)}
+                         for p, us in sorted(by_pkg.items(), key=lambda kv: -kv[1])[:8]],
+        "forbidden_loaded": sorted(loaded & set(ENTRYPOINTS.get(module, ()))),
+    }
+
+def run_report(modules=None, path: str = REPORT_PATH) -> dict:
+    modules = modules or list(ENTRYPOINTS)
+    base = measure("os")   # custo do interpretador + site, sem o projeto
+    report = {"ts": time.time(), "python": sys.version.split()[0],
+              "interpreter_ms": base.get("process_ms"), "modules": [], "violations": []}
+    for mod in modules:
+        r = measure(mod)
+        report["modules"].append(r)
+        if "error" in r:
+            warn(f"{mod}: import falhou ({r['error']})")
+            continue
+        top = ", ".join(f"{p['package']}={p['ms']}ms" for p in r["top_packages"][:4])
+        log(f"{mod}: import {r['import_ms']} ms (processo {r['process_ms']} ms) | {top}")
+        if r["forbidden_loaded"]:
+            report["violations"].append({"module": mod, "loaded": r["forbidden_loaded"]})
+            warn(f"{mod} carregou {', '.join(r['forbidden_loaded'])} no import.")
+    log(f"Interpretador sem o projeto: {report['interpreter_ms']} ms")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    log(f"Relatório em {path}")
+    return report
@@ -0,0 +1,253 @@
+# sync_executor.py
+# Executor das escritas no Google Calendar: pool de workers (ou batch HTTP),
+# token bucket ajustado à cota da Calendar API, backoff exponencial com
+# jitter para erros retentáveis e fila de retry persistida entre execuções.
+import os, json, time, random, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from runlock import file_lock
+
+SYNC_EXECUTOR    = os.getenv("SYNC_EXECUTOR", "pool").strip().lower()   # pool | batch
+SYNC_WORKERS     = max(1, int(os.getenv("SYNC_WORKERS", "4")))
+# Calendar API: ~600 req/min por usuário → 10/s; margem de segurança
+SYNC_QPS         = float(os.getenv("SYNC_QPS", "8"))
+SYNC_BURST       = int(os.getenv("SYNC_BURST", "10"))
+SYNC_MAX_RETRIES = int(os.getenv("SYNC_MAX_RETRIES", "5"))
+SYNC_BACKOFF_S   = float(os.getenv("SYNC_BACKOFF_S", "1.0"))
+SYNC_BACKOFF_MAX = float(os.getenv("SYNC_BACKOFF_MAX", "32"))
+RETRY_QUEUE_PATH = os.path.join("out", "sync_retry_queue.json")
+
+RETRYABLE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "backendError", "internalError"}
+
+def log(m): print(f"[EXEC] {m}", flush=True)
+
+def is_retryable(exc) -> bool:
+    # sob demanda: importar o executor (sync_gcal, webhook) não carrega o googleapiclient
+    from googleapiclient.errors import HttpError
+    if isinstance(exc, HttpError):
+        status = int(getattr(exc.resp, "status", 0) or 0)
+        if status == 429 or status >= 500:
+            return True
+        if status == 403:
+            try:
+                errors = json.loads(exc.content.decode("utf-8")).get("error", {}).get("errors", [])
+            except Exception:
+                errors = []
+            return any(e.get("reason") in RETRYABLE_REASONS for e in errors)
+        return False
+    # falhas de rede (timeout, conexão resetada)
+    return isinstance(exc, (OSError, TimeoutError))
+
+def backoff_delay(attempt: int) -> float:
+    """Backoff exponencial com full jitter."""
+    return random.uniform(0, min(SYNC_BACKOFF_MAX, SYNC_BACKOFF_S * (2 ** attempt)))
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(0.1, rate)
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n: int = 1):
+        """Cobra os `n` tokens; acima da capacidade (batch grande), em parcelas de até `capacity`."""
+        while n > 0:
+            take = min(n, self.capacity)
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= take:
+                    self.tokens -= take
+                    n -= take
+                    continue
+                wait = (take - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ExecStats:
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.lock = threading.Lock()
+        self.t0 = time.monotonic()
+
+    def add(self, requests=0, retries=0, gave_up=0):
+        with self.lock:
+            self.requests += requests
+            self.retries += retries
+            self.gave_up += gave_up
+
+    def report(self) -> dict:
+        elapsed = max(1e-6, time.monotonic() - self.t0)
+        return {"requests": self.requests, "seconds": round(elapsed, 2),
+                "rps": round(self.requests / elapsed, 2), "retries": self.retries, "gave_up": self.gave_up}
+
+_local = threading.local()
+
+def _thread_http(svc):
+    """httplib2 não é thread-safe: um transporte autorizado por thread."""
+    http = getattr(_local, "http", None)
+    if http is None:
+        import httplib2
+        import google_auth_httplib2
+        base = getattr(svc, "_http", None)
+        # httplib2.Http também tem .credentials (basic auth) — só AuthorizedHttp carrega o OAuth
+        if isinstance(base, google_auth_httplib2.AuthorizedHttp):
+            http = google_auth_httplib2.AuthorizedHttp(base.credentials, http=httplib2.Http())
+        else:
+            http = httplib2.Http()
+        _local.http = http
+    return http
+
+def execute_pool(svc, ops, limiter: TokenBucket, stats: ExecStats, workers: int = SYNC_WORKERS):
+    def _one(req):
+        attempt = 0
+        while True:
+            limiter.acquire()
+            stats.add(requests=1)
+            t0 = time.perf_counter()
+            try:
+                resp = req.execute(http=_thread_http(svc))
+                metrics.observe("api_call", time.perf_counter() - t0)
+                return resp, None
+            except Exception as e:
+                metrics.observe("api_call", time.perf_counter() - t0)
+                if is_retryable(e) and attempt < SYNC_MAX_RETRIES:
+                    stats.add(retries=1)
+                    time.sleep(backoff_delay(attempt))
+                    attempt += 1
+                    continue
+                if is_retryable(e):
+                    stats.add(gave_up=1)
+                return None, e
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futs = {rid: ex.submit(_one, req) for rid, req in ops}
+        for rid, fut in futs.items():
+            results[rid] = fut.result()
+    return results
+
+def execute_batch(svc, ops, limiter: TokenBucket, stats: ExecStats, batch_size: int):
+    results, pending, attempt = {}, list(ops), 0
+    while pending:
+        round_results = {}
+
+        def _cb(request_id, response, exception):
+            round_results[request_id] = (response, exception)
+
+        for i in range(0, len(pending), batch_size):
+            chunk = pending[i:i + batch_size]
+            limiter.acquire(len(chunk))
+            stats.add(requests=len(chunk))
+            batch = svc.new_batch_http_request(callback=_cb)
+            for rid, req in chunk:
+                batch.add(req, request_id=rid)
+            try:
+                with metrics.phase("api_batch"):
+                    batch.execute()
+            except Exception as e:
+                for rid, _ in chunk:
+                    round_results.setdefault(rid, (None, e))
+
+        retry = [(rid, req) for rid, req in pending
+                 if round_results.get(rid, (None, None))[1] is not None and is_retryable(round_results[rid][1])]
+        results.update(round_results)
+        if not retry or attempt >= SYNC_MAX_RETRIES:
+            stats.add(gave_up=len(retry))
+            break
+        stats.add(retries=len(retry))
+        time.sleep(backoff_delay(attempt))
+        attempt += 1
+        pending = retry
+    return results
+
+def run_ops(svc, ops, batch_size: int = 50):
+    """
+    Executa [(request_id, http_request)] e devolve {request_id: (resposta, exceção|None)}.
+    SYNC_EXECUTOR=pool usa workers paralelos; batch usa batch HTTP.
+    """
+    if not ops:
+        return {}
+    limiter, stats = TokenBucket(SYNC_QPS, SYNC_BURST), ExecStats()
+    if SYNC_EXECUTOR == "batch":
+        results = execute_batch(svc, ops, limiter, stats, batch_size)
+    else:
+        results = execute_pool(svc, ops, limiter, stats)
+    rep = stats.report()
+    log(f"{SYNC_EXECUTOR}: {rep['requests']} req em {rep['seconds']}s ({rep['rps']} req/s), "
+        f"retries={rep['retries']}, desistências={rep['gave_up']}")
+    run_ops.last_report = rep
+    metrics.inc("api_requests", rep["requests"])
+    metrics.inc("api_retries", rep["retries"])
+    return results
+run_ops.last_report = {}
+
+class RetryQueue:
+    """
+    Eventos que ainda falharam (erro retentável) — reprocessados primeiro no
+    próximo run. O arquivo é compartilhado entre o cron e o --webhook: save()
+    relê sob lock e aplica só as mudanças deste processo.
+    """
+    def __init__(self, path: str = RETRY_QUEUE_PATH):
+        self.path = path
+        self.items = self._load()
+        self._ops = []
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+            return items if isinstance(items, dict) else {}
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _key(cal_id, bitrix_id):
+        return f"{cal_id}|{bitrix_id}"
+
+    def __contains__(self, key):
+        return self._key(*key) in self.items
+
+    @staticmethod
+    def _apply(items: dict, op):
+        kind, arg = op
+        if kind == "add":
+            k, error, ts = arg
+            cur = items.get(k, {"attempts": 0})
+            items[k] = {"attempts": cur["attempts"] + 1, "last_error": error[:300], "ts": ts}
+        elif kind == "remove":
+            items.pop(arg, None)
+        else:   # prune: (cal_ids, presentes)
+            cal_ids, present = arg
+            for k in [k for k in items if k.split("|", 1)[0] in cal_ids and k.split("|", 1)[1] not in present]:
+                del items[k]
+
+    def _do(self, op):
+        self._apply(self.items, op)
+        self._ops.append(op)
+
+    def add(self, cal_id, bitrix_id, error: str):
+        self._do(("add", (self._key(cal_id, bitrix_id), error, time.time())))
+
+    def remove(self, cal_id, bitrix_id):
+        self._do(("remove", self._key(cal_id, bitrix_id)))
+
+    def prune(self, cal_ids, present):
+        """Tira dos calendários `cal_ids` os eventos que não estão em `present`."""
+        self._do(("prune", (set(cal_ids), set(present))))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with file_lock(self.path + ".lock"):
+            items = self._load()
+            for op in self._ops:
+                self._apply(items, op)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(items, f, indent=2)
+            os.replace(tmp, self.path)
+        self.items, self._ops = items, []
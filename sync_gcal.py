@@ -1,22 +1,36 @@
 # sync_gcal.py
-import os, json, re
-from datetime import datetime
+import os, json, re, hashlib
+from datetime import datetime, timedelta, timezone
 from dateutil import tz
 from dotenv import load_dotenv
 
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+# googleapiclient/google-auth são importados sob demanda (ver get_service):
+# o scrape e os runs sem mudanças não pagam esse custo de import
+
+from ledger import Ledger, LEDGER_PATH, body_hash, project_item, changed_fields
+from sync_executor import run_ops, is_retryable, RetryQueue, RETRY_QUEUE_PATH
+import metrics
 
 # ========= Config =========
 load_dotenv()
 EVENTS_PATH = os.path.join("out", "events.json")
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 CAL_ID = os.getenv("GOOGLE_CALENDAR_ID", "primary")
+# Fan-out: vários calendários de destino (pessoal, equipe, sala…) separados por vírgula
+CAL_IDS = [c.strip() for c in os.getenv("GOOGLE_CALENDAR_IDS", "").split(",") if c.strip()]
 TZ_NAME = os.getenv("TZ", "America/Sao_Paulo")
 
+# Janela de busca do índice (dias antes/depois de agora) e tamanho do batch HTTP
+# (a Calendar API aceita até 50 chamadas por batch)
+SYNC_WINDOW_PAST_DAYS   = int(os.getenv("SYNC_WINDOW_PAST_DAYS", "30"))
+SYNC_WINDOW_FUTURE_DAYS = int(os.getenv("SYNC_WINDOW_FUTURE_DAYS", "365"))
+SYNC_BATCH_SIZE         = max(1, min(int(os.getenv("SYNC_BATCH_SIZE", "50")), 50))
+
+# Access token só é renovado quando faltar menos que isso para expirar
+TOKEN_REFRESH_MARGIN_S = int(os.getenv("TOKEN_REFRESH_MARGIN_S", "300"))
+# Discovery document vendorizado (opcional); sem ele usa o embarcado no googleapiclient
+GCAL_DISCOVERY_DOC     = os.getenv("GCAL_DISCOVERY_DOC", "").strip()
+
 def log(m): print(f"[SYNC] {m}", flush=True)
 def ok(m):  print(f"[OK]  {m}", flush=True)
 def warn(m):print(f"[!]  {m}", flush=True)
@@ -25,21 +39,51 @@ def err(m): print(f"[ERR] {m}", flush=True)
 URL_RE = re.compile(r"https?://[^\s<>\"']+", re.I)
 
 # ========= Auth =========
-def get_service():
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
+def get_service(token_path="token.json", creds_path="credentials.json"):
+    with metrics.phase("get_service"):
+        return _get_service(token_path, creds_path)
+
+# Credenciais por token_path, carregadas uma vez por processo (daemon / multi-conta)
+_creds_cache = {}
+
+def _near_expiry(creds) -> bool:
+    if not creds.token:
+        return True
+    if creds.expiry is None:
+        return False
+    # google-auth guarda expiry como UTC "naive"
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return (creds.expiry - now).total_seconds() < TOKEN_REFRESH_MARGIN_S
+
+def load_credentials(token_path="token.json", creds_path="credentials.json"):
+    creds = _creds_cache.get(token_path)
+    if creds is None and os.path.exists(token_path):
+        from google.oauth2.credentials import Credentials
+        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    if creds is None or _near_expiry(creds):
+        if creds and creds.refresh_token:
+            from google.auth.transport.requests import Request
             creds.refresh(Request())
         else:
-            if not os.path.exists("credentials.json"):
-                raise RuntimeError("credentials.json não encontrado.")
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+            if not os.path.exists(creds_path):
+                raise RuntimeError(f"{creds_path} não encontrado.")
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(creds_path, SCOPES)
             creds = flow.run_local_server(port=0)
-        with open("token.json", "w") as f:
+        with open(token_path, "w") as f:
             f.write(creds.to_json())
-    return build("calendar", "v3", credentials=creds)
+    _creds_cache[token_path] = creds
+    return creds
+
+def _get_service(token_path, creds_path):
+    creds = load_credentials(token_path, creds_path)
+    if GCAL_DISCOVERY_DOC:
+        from googleapiclient.discovery import build_from_document
+        with open(GCAL_DISCOVERY_DOC, "r", encoding="utf-8") as f:
+            return build_from_document(f.read(), credentials=creds)
+    from googleapiclient.discovery import build
+    # discovery estático (sem GET ao discovery service) e sem cache em disco
+    return build("calendar", "v3", credentials=creds, static_discovery=True, cache_discovery=False)
 
 # ========= Helpers =========
 def to_rfc3339(date_br: str, time_hm: str, tz_name: str) -> str:
@@ -84,54 +128,305 @@ def build_body(ev):
     body["description"] = "\n".join(desc_lines)
     return body
 
-def find_existing_by_bitrix_id(svc, cal_id, bitrix_id: str):
-    resp = svc.events().list(
-        calendarId=cal_id,
-        privateExtendedProperty=f"bitrix_id={bitrix_id}",
-        singleEvents=True,
-        timeMin="1970-01-01T00:00:00Z",
-        timeMax="2100-01-01T00:00:00Z",
-        maxResults=2500
-    ).execute()
-    items = resp.get("items", [])
-    return items[0] if items else None
+def gcal_event_id(cal_id: str, bitrix_id: str) -> str:
+    """
+    id do evento no Google gerado pelo cliente (base32hex: 0-9a-v; hex serve):
+    um insert repetido (resposta perdida, retry) dá 409 em vez de duplicar.
+    """
+    return hashlib.sha1(f"{cal_id}|{bitrix_id}".encode("utf-8")).hexdigest()
+
+# ========= Índice / batch =========
+def sync_window(now=None):
+    """(timeMin, timeMax) em RFC3339 UTC conforme SYNC_WINDOW_*_DAYS."""
+    now = now or datetime.now(timezone.utc)
+    t_min = now - timedelta(days=SYNC_WINDOW_PAST_DAYS)
+    t_max = now + timedelta(days=SYNC_WINDOW_FUTURE_DAYS)
+    return t_min.isoformat().replace("+00:00", "Z"), t_max.isoformat().replace("+00:00", "Z")
+
+def in_window(body, time_min: str, time_max: str) -> bool:
+    start = body["start"]["dateTime"]
+    if not start:
+        return False
+    st = datetime.fromisoformat(start).astimezone(timezone.utc)
+    lo = datetime.fromisoformat(time_min.replace("Z", "+00:00"))
+    hi = datetime.fromisoformat(time_max.replace("Z", "+00:00"))
+    return lo <= st < hi
+
+def fetch_bitrix_index(svc, cal_id, time_min: str, time_max: str) -> dict:
+    """
+    Pagina uma única vez por todos os eventos da janela e monta
+    {bitrix_id -> evento} com os que têm extendedProperties.private.bitrix_id.
+    """
+    index, pages, page_token = {}, 0, None
+    while True:
+        req = svc.events().list(
+            calendarId=cal_id,
+            singleEvents=True,
+            showDeleted=False,
+            timeMin=time_min,
+            timeMax=time_max,
+            maxResults=2500,
+            pageToken=page_token,
+            fields="nextPageToken,items(id,etag,status,summary,description,location,source,start,end,extendedProperties)",
+        )
+        with metrics.phase("api_call"):
+            resp = req.execute()
+        pages += 1
+        for item in resp.get("items", []):
+            bid = ((item.get("extendedProperties") or {}).get("private") or {}).get("bitrix_id")
+            if bid and str(bid) not in index:
+                index[str(bid)] = item
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            break
+    log(f"Índice carregado: {len(index)} eventos com bitrix_id ({pages} página(s), {time_min} → {time_max}).")
+    return index
+
+def run_batched(svc, ops, batch_size: int = SYNC_BATCH_SIZE):
+    """Executa ops [(request_id, http_request)] pelo executor (pool/batch, com rate limit e retry)."""
+    return run_ops(svc, ops, batch_size=batch_size)
+
+def rebuild_ledger(svc=None, cal_id=None):
+    """Repopula o ledger de cal_id (padrão CAL_ID) a partir dos eventos com bitrix_id no calendário."""
+    cal_id = cal_id or CAL_ID
+    svc = svc or get_service()
+    time_min, time_max = sync_window()
+    index = fetch_bitrix_index(svc, cal_id, time_min, time_max)
+    ledger = Ledger()
+    try:
+        ledger.clear(cal_id)
+        for bitrix_id, item in index.items():
+            ledger.put(cal_id, bitrix_id, item["id"], item.get("etag"), project_item(item))
+    finally:
+        ledger.close()
+    ok(f"Ledger reconstruído: {len(index)} eventos ({cal_id}).")
+    return len(index)
+
+def load_events(events_path: str) -> list:
+    """Lê do store (events.sqlite ao lado de events.json) ou, na falta dele, do events.json."""
+    db_path = os.path.join(os.path.dirname(events_path) or ".", "events.sqlite")
+    if os.path.exists(db_path):
+        from event_store import EventStore
+        store = EventStore(db_path)
+        try:
+            return store.all()
+        finally:
+            store.close()
+    if not os.path.exists(events_path):
+        return None
+    with open(events_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def ledger_for(events_path: str) -> Ledger:
+    """
+    Ledger ao lado do store: out/sync_ledger.sqlite ou, no multi-conta,
+    out/accounts/<nome>/ — contas diferentes não compartilham (cal_id, bitrix_id).
+    """
+    return Ledger(os.path.join(os.path.dirname(events_path) or ".", os.path.basename(LEDGER_PATH)))
+
+def retry_queue_for(ledger: Ledger) -> RetryQueue:
+    """Fila de retry no mesmo diretório do ledger (mesmo escopo por conta)."""
+    return RetryQueue(os.path.join(os.path.dirname(ledger.path) or ".", os.path.basename(RETRY_QUEUE_PATH)))
 
 # ========= Main =========
-def main():
-    log(f"Calendar ID: {CAL_ID} | TZ={TZ_NAME}")
-    if not os.path.exists(EVENTS_PATH):
-        err(f"{EVENTS_PATH} não encontrado.")
-        return
-    with open(EVENTS_PATH, "r", encoding="utf-8") as f:
-        events = json.load(f)
+def target_calendars(cal_id=None, cal_ids=None) -> list:
+    """Alvos do sync: `cal_ids` > `cal_id` > GOOGLE_CALENDAR_IDS > GOOGLE_CALENDAR_ID."""
+    if cal_ids:
+        return list(dict.fromkeys(cal_ids))
+    if cal_id:
+        return [cal_id]
+    return CAL_IDS or [CAL_ID]
+
+def main(svc=None, events_path=None, cal_id=None, cal_ids=None):
+    """
+    Sincroniza events.json e devolve o resumo (dict). `svc` permite reaproveitar
+    o client (daemon / multi-conta); `events_path`/`cal_id` sobrepõem o .env.
+    Com vários alvos (`cal_ids` ou GOOGLE_CALENDAR_IDS) o resumo traz os totais
+    e, em "targets", o resumo de cada calendário.
+    """
+    events_path = events_path or EVENTS_PATH
+    targets = target_calendars(cal_id, cal_ids)
+    log(f"Calendar ID: {', '.join(targets)} | TZ={TZ_NAME} | batch={SYNC_BATCH_SIZE}")
+    events = load_events(events_path)
+    if events is None:
+        err(f"{events_path} não encontrado.")
+        return None
     if not isinstance(events, list) or not events:
-        warn("events.json vazio ou inválido; nada para sincronizar.")
-        return
+        warn("Nenhum evento (store/events.json vazio ou inválido); nada para sincronizar.")
+        return None
+
+    ledger = ledger_for(events_path)
+    try:
+        per_target = _sync_targets(events, ledger, svc, targets)
+    finally:
+        ledger.close()
+    if len(targets) == 1:
+        return per_target[targets[0]]
+    total = _empty_summary()
+    for sm in per_target.values():
+        for k in total:
+            total[k] += sm[k]
+    total["executor"] = next((sm["executor"] for sm in per_target.values() if sm["executor"]), {})
+    total["targets"] = per_target
+    return total
 
-    svc = get_service()
-    created = skipped = 0
+def _sync_events(events, ledger, svc=None, cal_id=None, partial=False, index_cache=None):
+    """Sync para um calendário só; devolve o resumo dele (ver _sync_targets)."""
+    cal_id = cal_id or CAL_ID
+    return _sync_targets(events, ledger, svc, [cal_id], partial, index_cache)[cal_id]
 
+def _empty_summary():
+    return {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+
+def _sync_targets(events, ledger, svc=None, cal_ids=None, partial=False, index_cache=None):
+    """
+    Sincroniza `events` com cada calendário de `cal_ids`. O corpo de cada evento
+    é montado uma vez; ledger e índice da janela são por calendário; as escritas
+    de todos os alvos vão juntas para o executor (mesmos batches/pool).
+
+    `partial=True`: `events` é só uma parte do store (pipeline do --all), então
+    a fila de retry não é podada pelos ausentes. `index_cache` (dict) guarda o
+    índice da janela por calendário entre chamadas para não relistar a cada lote.
+    Devolve {cal_id: resumo}.
+    """
+    cal_ids = list(dict.fromkeys(cal_ids or [CAL_ID]))
+    summary = {c: _empty_summary() for c in cal_ids}
+    time_min, time_max = sync_window()
+
+    retry_q = retry_queue_for(ledger)
+    # quem falhou no run anterior (em qualquer alvo) vai primeiro
+    events = sorted(events, key=lambda e: not any(
+        (c, str(e.get("id", "")).strip()) in retry_q for c in cal_ids))
+
+    # 1) Sem rede: monta cada corpo uma vez e separa, por alvo, o que não mudou
+    built, seen = [], set()
     for ev in events:
         if not all(ev.get(k) for k in ("titulo","id","data","inicio","termino")):
             warn(f"Incompleto, pulando: {ev}")
             continue
-
         bitrix_id = str(ev["id"]).strip()
-        try:
-            existing = find_existing_by_bitrix_id(svc, CAL_ID, bitrix_id)
-            if existing:
-                log(f"Já existe (skip): {ev['titulo']} (bitrix_id={bitrix_id})")
-                skipped += 1
+        if bitrix_id in seen:
+            for c in cal_ids:
+                summary[c]["skipped"] += 1
+            continue
+        seen.add(bitrix_id)
+        body = build_body(ev)
+        built.append((bitrix_id, ev, body, body_hash(body)))
+
+    todo = {c: {} for c in cal_ids}
+    for bitrix_id, ev, body, h in built:
+        for c in cal_ids:
+            row = ledger.get(c, bitrix_id)
+            if row and row["body_hash"] == h:
+                summary[c]["unchanged"] += 1
                 continue
+            todo[c][bitrix_id] = (ev, body, row)
+
+    ops, plan, adopted = [], {}, []
+    if any(todo.values()):
+        # 2) Só consulta o Google (índice da janela) nos alvos com eventos fora do ledger
+        svc = svc or get_service()
+        for c in cal_ids:
+            index = {}
+            if any(row is None for _, _, row in todo[c].values()):
+                if index_cache is not None and c in index_cache:
+                    index = index_cache[c]
+                else:
+                    index = fetch_bitrix_index(svc, c, time_min, time_max)
+                    if index_cache is not None:
+                        index_cache[c] = index
 
-            body = build_body(ev)
-            svc.events().insert(calendarId=CAL_ID, body=body, supportsAttachments=False).execute()
-            ok(f"Criado: {ev['titulo']} ({ev['data']} {ev['inicio']}-{ev['termino']})")
-            created += 1
-        except HttpError as e:
-            err(f"Falha ao sincronizar '{ev.get('titulo','')}' (bitrix_id={bitrix_id}): {e}")
+            for bitrix_id, (ev, body, row) in todo[c].items():
+                if row is None and bitrix_id in index:
+                    item = index[bitrix_id]
+                    row = {"gcal_id": item["id"], "etag": item.get("etag"), "body": project_item(item)}
+
+                rid = f"{c}|{bitrix_id}"
+                if row is not None:
+                    diff = changed_fields(row["body"], body)
+                    if not diff:
+                        adopted.append((c, bitrix_id, row["gcal_id"], row["etag"], body))
+                        summary[c]["unchanged"] += 1
+                        continue
+                    req = svc.events().patch(calendarId=c, eventId=row["gcal_id"], body=diff)
+                    if row["etag"]:
+                        req.headers["If-Match"] = row["etag"]   # patch condicional
+                    plan[rid] = ("patch", c, bitrix_id, ev, body, row["gcal_id"])
+                    ops.append((rid, req))
+                    continue
+
+                if not in_window(body, time_min, time_max):
+                    # fora da janela o índice não garante ausência → não arriscar duplicar
+                    log(f"Fora da janela de sync (skip): {ev['titulo']} (bitrix_id={bitrix_id}, {c})")
+                    summary[c]["skipped"] += 1
+                    continue
+
+                gid = gcal_event_id(c, bitrix_id)
+                plan[rid] = ("insert", c, bitrix_id, ev, body, gid)
+                ops.append((rid, svc.events().insert(calendarId=c, body=dict(body, id=gid), supportsAttachments=False)))
+
+    # Já existiam iguais no Google: só registra. Grava antes das escritas para o
+    # lock de escrita do ledger não ficar preso durante a rede (--webhook concorrente)
+    for row in adopted:
+        ledger.put(*row)
+    ledger.commit()
+
+    # 3) Escritas de todos os alvos num único passe do executor
+    results = run_batched(svc, ops) if ops else {}
+    conflicts = [rid for rid, p in plan.items() if p[0] == "insert" and
+                 str(getattr(getattr(results.get(rid, (None, None))[1], "resp", None), "status", "")) == "409"]
+    if conflicts:
+        # o id já existe: insert anterior cuja resposta se perdeu, ou evento apagado no
+        # Google (cancelado continua ocupando o id) → sobrescreve/restaura com update
+        results.update(run_batched(svc, [
+            (rid, svc.events().update(calendarId=plan[rid][1], eventId=plan[rid][5],
+                                      body=dict(plan[rid][4], status="confirmed")))
+            for rid in conflicts]))
+    for rid, (kind, c, bitrix_id, ev, body, gcal_id) in plan.items():
+        resp, exc = results.get(rid, (None, None))
+        if exc is not None:
+            status = getattr(getattr(exc, "resp", None), "status", None)
+            if kind == "patch" and str(status) == "412":
+                # etag desatualizado: evento mudou no Google; o próximo run relê do índice
+                ledger.delete(c, bitrix_id)
+                warn(f"Conflito de etag (412) em '{ev['titulo']}' (bitrix_id={bitrix_id}, {c}); será reavaliado.")
+            else:
+                err(f"Falha ao sincronizar '{ev.get('titulo','')}' (bitrix_id={bitrix_id}, {c}): {exc}")
+                if is_retryable(exc):
+                    retry_q.add(c, bitrix_id, str(exc))
+            summary[c]["failed"] += 1
+            continue
+
+        retry_q.remove(c, bitrix_id)
+        resp = resp or {}
+        ledger.put(c, bitrix_id, resp.get("id") or gcal_id, resp.get("etag"), body)
+        suffix = f" → {c}" if len(cal_ids) > 1 else ""
+        if kind == "insert":
+            ok(f"Criado: {ev['titulo']} ({ev['data']} {ev['inicio']}-{ev['termino']}){suffix}")
+            summary[c]["created"] += 1
+        else:
+            ok(f"Atualizado: {ev['titulo']} ({ev['data']} {ev['inicio']}-{ev['termino']}){suffix}")
+            summary[c]["updated"] += 1
+    ledger.commit()
+    if ops or not partial:
+        if not partial:
+            retry_q.prune(cal_ids, {str(e.get("id", "")).strip() for e in events})
+        retry_q.save()
+        if retry_q.items:
+            warn(f"Fila de retry: {len(retry_q.items)} evento(s) para o próximo run.")
 
-    log(f"Resumo → criados={created}, pulados={skipped}")
+    for c, sm in summary.items():
+        prefix = f"[{c}] " if len(cal_ids) > 1 else ""
+        log(f"{prefix}Resumo → criados={sm['created']}, atualizados={sm['updated']}, inalterados={sm['unchanged']}, "
+            f"pulados={sm['skipped']}, falhas={sm['failed']}")
+        for k, v in sm.items():
+            metrics.inc(k, v)
+        sm["executor"] = dict(run_ops.last_report) if ops else {}
+    return summary
 
 if __name__ == "__main__":
-    main()
+    import sys
+    if "--rebuild-ledger" in sys.argv:
+        rebuild_ledger()
+    else:
+        main()
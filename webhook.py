@@ -0,0 +1,442 @@
+# webhook.py
+# Modo receptor (--webhook): recebe os webhooks de saída do Bitrix24 para a
+# agenda (ONCALENDARENTRYADD/UPDATE/DELETE), confere o application_token,
+# busca o evento pela REST (calendar.event.getbyid) e empurra o registro no
+# mesmo formato do scrape direto para o store e o sync. O scrape via Selenium
+# vira só backfill ocasional.
+import os, re, hmac, json, time, queue, signal, threading
+from html import unescape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl
+
+import requests
+
+import metrics
+from pipeline import SyncConsumer, PIPELINE_QUEUE_SIZE
+
+WEBHOOK_HOST      = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT      = int(os.getenv("WEBHOOK_PORT", "8765"))
+WEBHOOK_PATH      = os.getenv("WEBHOOK_PATH", "/bitrix/webhook")
+# application_token do webhook de saída (vários separados por vírgula, ex.: um por portal)
+BITRIX_APP_TOKENS = [t.strip() for t in os.getenv("BITRIX_APP_TOKEN", "").split(",") if t.strip()]
+# Webhook de entrada para a REST, ex.: https://empresa.bitrix24.com.br/rest/1/abc123/
+BITRIX_REST_URL   = os.getenv("BITRIX_REST_URL", "").strip()
+# Evento apagado no Bitrix: delete (apaga no Google) | flag (só registra, como o reconcile)
+WEBHOOK_ON_DELETE = os.getenv("WEBHOOK_ON_DELETE", "flag").strip().lower()
+WEBHOOK_METRICS_S = float(os.getenv("WEBHOOK_METRICS_S", "300"))   # grava metrics.jsonl a cada N s
+REST_TIMEOUT      = float(os.getenv("BITRIX_REST_TIMEOUT", "10"))
+WEBHOOK_INDEX_TTL_S = 600   # o índice da janela no Google é relistado depois disso
+# Pedido que falhou (REST ou Google) volta para a fila após WEBHOOK_RETRY_S, dobrando a cada falha
+WEBHOOK_RETRY_S       = float(os.getenv("WEBHOOK_RETRY_S", "30"))
+WEBHOOK_RETRY_MAX_S   = float(os.getenv("WEBHOOK_RETRY_MAX_S", "1800"))
+WEBHOOK_RETRY_ATTEMPTS = int(os.getenv("WEBHOOK_RETRY_ATTEMPTS", "10"))
+WEBHOOK_PENDING_PATH  = os.path.join("out", "webhook_pending.json")   # pedidos em espera ao encerrar
+# Status de participação do usuário da REST que entram no Google (Y = aceito, como a
+# frase-alvo do scrape; H = organizador, N = recusado, Q = sem resposta)
+WEBHOOK_MEETING_STATUS = [s.strip().upper() for s in os.getenv("WEBHOOK_MEETING_STATUS", "Y").split(",") if s.strip()]
+
+EVENTS = {"ONCALENDARENTRYADD": "upsert", "ONCALENDARENTRYUPDATE": "upsert", "ONCALENDARENTRYDELETE": "delete"}
+
+# "16.09.2025 09:30:00", "16/09/2025 09:30", "2025-09-16T09:30:00-03:00"
+BR_DT_RE  = re.compile(r"(\d{2})[./](\d{2})[./](\d{4})(?:\s+(\d{1,2}):(\d{2}))?")
+ISO_DT_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})(?:[T\s](\d{2}):(\d{2}))?")
+TAG_RE    = re.compile(r"<[^>]+>|\[/?\w+(?:=[^\]]*)?\]")   # HTML e BBCode da descrição
+
+def log(m):  print(f"[HOOK] {m}", flush=True)
+def warn(m): print(f"[!]  {m}", flush=True)
+
+# ---------- payload ----------
+def parse_form(body: bytes) -> dict:
+    """Form do Bitrix ('data[FIELDS][ID]=1&auth[application_token]=…') → dict aninhado."""
+    out = {}
+    for key, val in parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True):
+        parts = [key.split("[", 1)[0]] + re.findall(r"\[([^\]]*)\]", key)
+        node = out
+        for p in parts[:-1]:
+            node = node.setdefault(p, {})
+            if not isinstance(node, dict):
+                break
+        else:
+            node[parts[-1]] = val
+    return out
+
+def parse_payload(body: bytes, content_type: str) -> dict:
+    if "json" in (content_type or ""):
+        data = json.loads(body.decode("utf-8") or "{}")
+        return data if isinstance(data, dict) else {}
+    return parse_form(body)
+
+def verify_token(payload: dict, tokens=None) -> bool:
+    token = str((payload.get("auth") or {}).get("application_token") or "")
+    return bool(token) and any(hmac.compare_digest(token, t) for t in (tokens or BITRIX_APP_TOKENS))
+
+def entry_id(payload: dict) -> str:
+    data = payload.get("data") or {}
+    fields = data.get("FIELDS") if isinstance(data.get("FIELDS"), dict) else {}
+    return str(data.get("id") or data.get("ID") or fields.get("ID") or fields.get("id") or "").strip()
+
+# ---------- normalização ----------
+def _split_dt(value: str):
+    """('16/09/2025', '09:30') a partir do formato do portal ou ISO."""
+    value = str(value or "")
+    m = BR_DT_RE.search(value)
+    if m:
+        d, mo, y, hh, mm = m.groups()
+        return f"{d}/{mo}/{y}", (f"{int(hh):02d}:{mm}" if hh else "")
+    m = ISO_DT_RE.search(value)
+    if m:
+        y, mo, d, hh, mm = m.groups()
+        return f"{d}/{mo}/{y}", (f"{hh}:{mm}" if hh else "")
+    return "", ""
+
+def _clean_text(text: str) -> str:
+    text = TAG_RE.sub(" ", unescape(str(text or "")))
+    return "\n".join(" ".join(line.split()) for line in text.splitlines() if line.strip())
+
+def normalize_entry(entry: dict, domain: str = "") -> dict:
+    """Evento da REST → registro do store ({titulo,id,link,data,inicio,termino,descricao})."""
+    eid = str(entry.get("ID") or entry.get("id") or "").strip()
+    data, inicio = _split_dt(entry.get("DATE_FROM"))
+    _, termino = _split_dt(entry.get("DATE_TO"))
+    if str(entry.get("DT_SKIP_TIME", "N")).upper() == "Y":
+        inicio = termino = ""                        # dia inteiro: o sync só trata eventos com horário
+    descricao = _clean_text(entry.get("DESCRIPTION"))
+    location = str(entry.get("LOCATION") or "").strip()
+    if location.startswith("http") and location not in descricao:
+        descricao = "\n".join(x for x in (descricao, location) if x)
+    return {
+        "titulo": str(entry.get("NAME") or "").strip(),
+        "id": eid,
+        "link": f"https://{domain}/calendar/?EVENT_ID={eid}" if domain and eid else "",
+        "data": data,
+        "inicio": inicio,
+        "termino": termino,
+        "descricao": descricao,
+    }
+
+def rest_user_id(rest_url: str) -> str:
+    """ID do usuário dono do webhook de entrada (…/rest/<id>/<token>/)."""
+    m = re.search(r"/rest/(\d+)/", rest_url or "")
+    return m.group(1) if m else ""
+
+def attendance(entry: dict, user_id: str = "") -> str:
+    """
+    Status de participação do usuário da REST no evento: MEETING_STATUS ou,
+    sem ele, o do usuário em ATTENDEE_LIST. Evento que não é reunião conta como organizador.
+    """
+    status = str(entry.get("MEETING_STATUS") or "").upper()
+    if not status and user_id:
+        for a in entry.get("ATTENDEE_LIST") or []:
+            if isinstance(a, dict) and str(a.get("id")) == user_id:
+                status = str(a.get("status") or "").upper()
+    if not status and str(entry.get("IS_MEETING") or "N").upper() != "Y":
+        status = "H"
+    return status
+
+def fetch_entry(session, rest_url: str, eid: str) -> dict:
+    """calendar.event.getbyid pela REST; {} se o evento não existir mais."""
+    r = session.get(rest_url.rstrip("/") + "/calendar.event.getbyid.json", params={"id": eid}, timeout=REST_TIMEOUT)
+    r.raise_for_status()
+    result = r.json().get("result")
+    return result if isinstance(result, dict) else {}
+
+# ---------- sync ----------
+class WebhookSync(SyncConsumer):
+    """
+    SyncConsumer que recebe pedidos do webhook ({id, _action, _domain}):
+    busca e normaliza na REST, grava no store e sincroniza o lote; deletes
+    seguem WEBHOOK_ON_DELETE. Tudo na thread do consumidor (o client do
+    Google e as conexões SQLite ficam numa thread só).
+
+    Não há sync final como no --all: um pedido que falha volta para a fila
+    com backoff (defer) e o que ainda estiver esperando ao encerrar fica em
+    WEBHOOK_PENDING_PATH para o próximo start.
+    """
+    def __init__(self, svc, cal_ids=None, rest_url: str = None, events_db: str = None):
+        super().__init__(svc, cal_ids, maxsize=PIPELINE_QUEUE_SIZE)
+        self.name = "webhook-sync"
+        self.rest_url = rest_url if rest_url is not None else BITRIX_REST_URL
+        self.user_id = rest_user_id(self.rest_url)
+        self.events_db = events_db or os.path.join("out", "events.sqlite")
+        self.session = requests.Session()
+        self.store = None
+        self.deleted = 0
+        self.index_at = time.monotonic()
+        self.deferred = {}          # id -> (pedido, timer)
+        self.dropped = 0
+        self.closing = False
+        self.retry_lock = threading.Lock()
+
+    # ---------- reprocessamento ----------
+    def defer(self, req: dict, error):
+        """Agenda `req` de novo com backoff; desiste após WEBHOOK_RETRY_ATTEMPTS."""
+        req = dict(req, _attempts=req.get("_attempts", 0) + 1)
+        eid = req["id"]
+        if req["_attempts"] > WEBHOOK_RETRY_ATTEMPTS:
+            self.dropped += 1
+            metrics.inc("webhook_dropped")
+            warn(f"EVENT_ID={eid}: {req['_attempts'] - 1} tentativa(s) sem sucesso ({error}); fica para o scrape.")
+            return
+        delay = min(WEBHOOK_RETRY_MAX_S, WEBHOOK_RETRY_S * 2 ** (req["_attempts"] - 1))
+        metrics.inc("webhook_retried")
+        warn(f"EVENT_ID={eid} falhou ({error}); nova tentativa em {delay:g}s.")
+        with self.retry_lock:
+            self._cancel(eid)
+            timer = None
+            if not self.closing:
+                timer = threading.Timer(delay, self._requeue, args=(eid,))
+                timer.daemon = True
+                timer.start()
+            self.deferred[eid] = (req, timer)
+
+    def _cancel(self, eid: str):
+        req, timer = self.deferred.pop(eid, (None, None))
+        if timer is not None:
+            timer.cancel()
+        return req
+
+    def _requeue(self, eid: str):
+        with self.retry_lock:
+            if self.closing or eid not in self.deferred:
+                return
+            req, _ = self.deferred.pop(eid)
+            try:
+                self.q.put_nowait((time.monotonic(), req))
+            except queue.Full:
+                timer = threading.Timer(1.0, self._requeue, args=(eid,))
+                timer.daemon = True
+                timer.start()
+                self.deferred[eid] = (req, timer)
+
+    def close(self):
+        with self.retry_lock:
+            self.closing = True
+            for _, timer in self.deferred.values():
+                if timer is not None:
+                    timer.cancel()
+        super().close()
+        self.save_pending()
+
+    def save_pending(self, path: str = None):
+        path = path or WEBHOOK_PENDING_PATH
+        reqs = [req for req, _ in self.deferred.values()]
+        if not reqs:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(reqs, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        warn(f"{len(reqs)} pedido(s) com falha guardados em {path} para o próximo start.")
+
+    def load_pending(self, path: str = None) -> int:
+        path = path or WEBHOOK_PENDING_PATH
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                reqs = json.load(f)
+            os.remove(path)
+        except (OSError, ValueError):
+            return 0
+        reqs = [r for r in reqs if isinstance(r, dict) and r.get("id") and r.get("_action")]
+        for req in reqs:
+            self.put(req)
+        if reqs:
+            log(f"{len(reqs)} pedido(s) pendentes do run anterior reenfileirados.")
+        return len(reqs)
+
+    def sync_batch(self, events, ledger):
+        from event_store import EventStore
+        import sync_gcal
+
+        if self.store is None:
+            self.store = EventStore(self.events_db)
+        if time.monotonic() - self.index_at > WEBHOOK_INDEX_TTL_S:
+            # o --all do cron também grava no Google; não confiar num índice velho
+            self.index_cache.clear()
+            self.index_at = time.monotonic()
+        latest = {}
+        for req in events:
+            latest[req["id"]] = req                  # vários webhooks do mesmo evento no lote → um só
+        with self.retry_lock:
+            for eid in latest:
+                self._cancel(eid)                    # pedido novo substitui o que esperava retry
+        upserts, deletes = [], []          # deletes: (pedido, motivo do flag)
+        for eid, req in latest.items():
+            if req["_action"] == "delete":
+                deletes.append((req, "removed_in_bitrix"))
+                continue
+            if not self.rest_url:
+                warn(f"BITRIX_REST_URL não definido; evento {eid} fica para o scrape.")
+                continue
+            try:
+                entry = fetch_entry(self.session, self.rest_url, eid)
+            except (requests.RequestException, ValueError) as e:
+                self.defer(req, f"REST: {e}")
+                continue
+            if not entry:
+                deletes.append((req, "removed_in_bitrix"))
+                continue
+            status = attendance(entry, self.user_id)
+            if status not in WEBHOOK_MEETING_STATUS:
+                # mesmo filtro do scrape (só convites aceitos): recusado/sem resposta sai como um delete
+                metrics.inc("webhook_not_accepted")
+                log(f"EVENT_ID={eid} com participação {status or '?'}; fora do Google.")
+                deletes.append((req, "declined_in_bitrix"))
+                continue
+            rec = normalize_entry(entry, req.get("_domain", ""))
+            old = self.store.get_many([eid]).get(eid)
+            if old and old.get("link"):
+                rec["link"] = old["link"]            # mesmo link do scrape → corpo igual no Google
+            upserts.append((req, rec))
+
+        if upserts:
+            self.store.upsert_many([rec for _, rec in upserts])
+            targets = sync_gcal.target_calendars(cal_ids=self.cal_ids)
+            try:
+                per_target = sync_gcal._sync_targets([rec for _, rec in upserts], ledger, self.svc, targets,
+                                                     partial=True, index_cache=self.index_cache)
+            except Exception as e:
+                self.failed_batches += 1
+                for req, _ in upserts:
+                    self.defer(req, f"sync: {e}")
+            else:
+                if any(sm["failed"] for sm in per_target.values()):
+                    # erros retentáveis ficam na fila de retry do sync; sem sync final, reprocessa aqui
+                    retry_q = sync_gcal.retry_queue_for(ledger)
+                    for req, _ in upserts:
+                        if any((c, req["id"]) in retry_q for c in targets):
+                            self.defer(req, "sync: erro retentável no Google")
+        for req, kind in deletes:
+            self.store.delete(req["id"])
+            try:
+                self.delete_entry(req["id"], ledger, kind)
+            except Exception as e:
+                # o retry busca de novo na REST: se o convite voltar a ser aceito, não apaga
+                self.defer(req, f"delete: {e}")
+
+    def delete_entry(self, eid: str, ledger, kind: str = "removed_in_bitrix"):
+        import sync_gcal
+        for c in sync_gcal.target_calendars(cal_ids=self.cal_ids):
+            row = ledger.get(c, eid)
+            if row is None:
+                continue
+            if WEBHOOK_ON_DELETE != "delete":
+                from reconcile import _flag
+                _flag(kind, eid, c, gcal_id=row["gcal_id"])
+                continue
+            try:
+                self.svc.events().delete(calendarId=c, eventId=row["gcal_id"]).execute()
+            except Exception as e:
+                if str(getattr(getattr(e, "resp", None), "status", "")) not in ("404", "410"):
+                    raise
+            ledger.delete(c, eid)
+            ledger.commit()          # antes do próximo alvo (rede)
+            self.deleted += 1
+            sync_gcal.ok(f"Removido: bitrix_id={eid} ({c})")
+        ledger.commit()
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            if self.store is not None:
+                self.store.close()
+
+# ---------- servidor ----------
+def make_handler(consumer: SyncConsumer, tokens=None, path: str = None):
+    path = path or WEBHOOK_PATH
+
+    class H(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def _reply(self, status: int, body: str = "ok"):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            # health check (docker/proxy)
+            self._reply(200 if urlparse(self.path).path == path else 404)
+
+        def do_POST(self):
+            if urlparse(self.path).path != path:
+                return self._reply(404, "not found")
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = parse_payload(self.rfile.read(length), self.headers.get("Content-Type", ""))
+            except ValueError:
+                metrics.inc("webhook_rejected")
+                return self._reply(400, "payload inválido")
+            if not verify_token(payload, tokens):
+                metrics.inc("webhook_rejected")
+                warn(f"Webhook com application_token inválido de {self.client_address[0]}")
+                return self._reply(401, "token inválido")
+            action = EVENTS.get(str(payload.get("event") or "").upper())
+            eid = entry_id(payload)
+            if not action or not eid:
+                metrics.inc("webhook_ignored")
+                return self._reply(200, "ignorado")
+            metrics.inc("webhook_received")
+            domain = str((payload.get("auth") or {}).get("domain") or "")
+            consumer.put({"id": eid, "_action": action, "_domain": domain})
+            log(f"{payload.get('event')} EVENT_ID={eid}")
+            self._reply(200)
+
+    return H
+
+def serve(svc=None, host: str = None, port: int = None, tokens=None, rest_url: str = None,
+          events_db: str = None, ready=None, stop_event=None):
+    """
+    Sobe o receptor e bloqueia até SIGTERM/SIGINT (ou `stop_event`). `ready`
+    (callable) recebe a URL do webhook quando o servidor estiver ouvindo.
+    """
+    tokens = tokens or BITRIX_APP_TOKENS
+    if not tokens:
+        raise RuntimeError("BITRIX_APP_TOKEN não definido; o receptor não aceita webhooks sem token.")
+    if svc is None:
+        import sync_gcal
+        svc = sync_gcal.get_service()
+
+    consumer = WebhookSync(svc, rest_url=rest_url, events_db=events_db)
+    consumer.start()
+    consumer.load_pending()
+    httpd = ThreadingHTTPServer((host or WEBHOOK_HOST, WEBHOOK_PORT if port is None else port),
+                                make_handler(consumer, tokens))
+    threading.Thread(target=httpd.serve_forever, name="webhook-http", daemon=True).start()
+    url = f"http://{httpd.server_address[0]}:{httpd.server_port}{WEBHOOK_PATH}"
+    log(f"Ouvindo em {url} (delete={WEBHOOK_ON_DELETE}, REST={'sim' if (rest_url or BITRIX_REST_URL) else 'não'})")
+
+    stop_event = stop_event or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        def _stop(signum, frame):
+            log(f"Sinal {signum} recebido; encerrando.")
+            stop_event.set()
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+    if ready is not None:
+        ready(url)
+
+    metrics.start_run("webhook")
+    last_flush = time.monotonic()
+    try:
+        while not stop_event.wait(1.0):
+            if time.monotonic() - last_flush >= WEBHOOK_METRICS_S:
+                metrics.finish("OK")
+                metrics.start_run("webhook")
+                last_flush = time.monotonic()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        consumer.close()          # drena o que já foi aceito
+        metrics.inc("webhook_synced", consumer.synced)
+        metrics.finish("OK" if not (consumer.failed_batches or consumer.deferred or consumer.dropped) else "PARTIAL")
+        log(f"Encerrado: {consumer.synced} pedido(s) processados, {consumer.deleted} removido(s), "
+            f"{consumer.failed_batches} lote(s) com falha, {len(consumer.deferred)} pendente(s), "
+            f"{consumer.dropped} descartado(s).")
+    return 0